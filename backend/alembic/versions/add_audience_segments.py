@@ -0,0 +1,30 @@
+"""Add audience segment to raffles and indexes for segment queries
+
+Revision ID: add_audience_001
+Revises: add_display_type_001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_audience_001'
+down_revision = 'add_display_type_001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('raffles', sa.Column('audience', sa.JSON(), nullable=True))
+
+    # Индексы для сегментов аудитории
+    op.create_index('ix_participants_raffle_user', 'participants', ['raffle_id', 'user_id'])
+    op.create_index('ix_participants_user_joined', 'participants', ['user_id', 'joined_at'])
+    op.create_index('ix_winners_user_id', 'winners', ['user_id'])
+    op.create_index('ix_winners_raffle_position', 'winners', ['raffle_id', 'position'])
+
+def downgrade():
+    op.drop_index('ix_winners_raffle_position', table_name='winners')
+    op.drop_index('ix_winners_user_id', table_name='winners')
+    op.drop_index('ix_participants_user_joined', table_name='participants')
+    op.drop_index('ix_participants_raffle_user', table_name='participants')
+    op.drop_column('raffles', 'audience')
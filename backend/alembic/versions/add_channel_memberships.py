@@ -0,0 +1,30 @@
+"""Add channel_memberships index
+
+Revision ID: add_channel_memberships_001
+Revises: add_participant_verification_001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_channel_memberships_001'
+down_revision = 'add_participant_verification_001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'channel_memberships',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('channel', sa.String(), nullable=False),
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('status', sa.String()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint('channel', 'telegram_id', name='uq_channel_memberships_channel_user'),
+    )
+    op.create_index('ix_channel_memberships_id', 'channel_memberships', ['id'])
+
+def downgrade():
+    op.drop_index('ix_channel_memberships_id', table_name='channel_memberships')
+    op.drop_table('channel_memberships')
@@ -0,0 +1,20 @@
+"""Persist the last published event seq of a draw
+
+Revision ID: add_draw_state_event_seq_001
+Revises: unique_winners_position_001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_draw_state_event_seq_001'
+down_revision = 'unique_winners_position_001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('draw_states', sa.Column('event_seq', sa.Integer(), server_default='0'))
+
+def downgrade():
+    op.drop_column('draw_states', 'event_seq')
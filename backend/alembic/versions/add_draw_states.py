@@ -0,0 +1,30 @@
+"""Add draw_states for crash-recoverable draws
+
+Revision ID: add_draw_states_001
+Revises: add_channel_memberships_001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_draw_states_001'
+down_revision = 'add_channel_memberships_001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'draw_states',
+        sa.Column('raffle_id', sa.Integer(), sa.ForeignKey('raffles.id'), primary_key=True),
+        sa.Column('phase', sa.String(), nullable=False),
+        sa.Column('plan', sa.JSON()),
+        sa.Column('round_seq', sa.Integer(), server_default='0'),
+        sa.Column('completed_positions', sa.JSON()),
+        sa.Column('deadline', sa.Float()),
+        sa.Column('owner', sa.String()),
+        sa.Column('heartbeat', sa.Float(), nullable=False),
+    )
+
+def downgrade():
+    op.drop_table('draw_states')
@@ -0,0 +1,23 @@
+"""Add subscription_verified to participants
+
+Revision ID: add_participant_verification_001
+Revises: add_audience_001
+Create Date: 2026-10-18 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_participant_verification_001'
+down_revision = 'add_audience_001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Условно принятые участники (Telegram был недоступен при вступлении)
+    op.add_column('participants', sa.Column('subscription_verified', sa.Boolean(), server_default=sa.true()))
+    op.create_index('ix_participants_subscription_verified', 'participants', ['subscription_verified'])
+
+def downgrade():
+    op.drop_index('ix_participants_subscription_verified', table_name='participants')
+    op.drop_column('participants', 'subscription_verified')
@@ -0,0 +1,28 @@
+"""Add pending_notices for the new raffle digest
+
+Revision ID: add_pending_notices_001
+Revises: add_draw_state_event_seq_001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'add_pending_notices_001'
+down_revision = 'add_draw_state_event_seq_001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'pending_notices',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('raffle_id', sa.Integer()),
+        sa.Column('data', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.Float(), nullable=False),
+    )
+    op.create_index('ix_pending_notices_raffle_id', 'pending_notices', ['raffle_id'])
+
+def downgrade():
+    op.drop_index('ix_pending_notices_raffle_id', table_name='pending_notices')
+    op.drop_table('pending_notices')
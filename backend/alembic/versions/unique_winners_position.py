@@ -0,0 +1,23 @@
+"""Make (raffle_id, position) unique on winners
+
+Revision ID: unique_winners_position_001
+Revises: add_draw_states_001
+Create Date: 2026-10-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'unique_winners_position_001'
+down_revision = 'add_draw_states_001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Один план розыгрыша даже при нескольких воркерах: второй insert падает на индексе
+    op.drop_index('ix_winners_raffle_position', table_name='winners')
+    op.create_index('ix_winners_raffle_position', 'winners', ['raffle_id', 'position'], unique=True)
+
+def downgrade():
+    op.drop_index('ix_winners_raffle_position', table_name='winners')
+    op.create_index('ix_winners_raffle_position', 'winners', ['raffle_id', 'position'])
@@ -55,14 +55,15 @@ else:
 logger.info(f"Using database: {DATABASE_URL.split('@')[0] if '@' in DATABASE_URL else DATABASE_URL}")
 
 # Создаем engine
+engine_options = {
+    "echo": False,  # Отключаем для production
+    "pool_pre_ping": True
+}
+# У пулов SQLite нет pool_size/max_overflow: с ними файл SQLite подменялся базой в памяти
+if not DATABASE_URL.startswith("sqlite"):
+    engine_options.update(pool_size=5, max_overflow=10)
 try:
-    engine = create_async_engine(
-        DATABASE_URL,
-        echo=False,  # Отключаем для production
-        pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=10
-    )
+    engine = create_async_engine(DATABASE_URL, **engine_options)
 except Exception as e:
     logger.error(f"Failed to create engine: {e}")
     # Fallback на SQLite
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
@@ -9,13 +9,21 @@ from datetime import datetime
 from .database import init_db
 from .routers import raffles, users, admin, websocket
 from .services.raffle import RaffleService
+from .services.notifications import NotificationService
 from .websocket_manager import manager  # Импортируем из нового файла
 import logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "DEBUG").upper())
+
+# Как часто проверять розыгрыши, у которых пора начинать отрисовку (секунды)
+RAFFLE_CHECK_INTERVAL = float(os.getenv("RAFFLE_CHECK_INTERVAL", "60"))
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    # Подписываемся на шину WebSocket-событий (Redis при нескольких воркерах)
+    await manager.start()
+    # Продолжаем розыгрыши, прерванные рестартом
+    await RaffleService.recover_interrupted_draws()
     # Start background task for checking raffles
     task = asyncio.create_task(check_expired_raffles())
     yield
@@ -25,6 +33,7 @@ async def lifespan(app: FastAPI):
         await task
     except asyncio.CancelledError:
         pass
+    await manager.stop()
 
 app = FastAPI(lifespan=lifespan, title="Telegram Raffle API")
 
@@ -64,11 +73,15 @@ app.include_router(websocket.router, prefix="/api/ws", tags=["websocket"])
 async def check_expired_raffles():
     while True:
         try:
-            # Check for expired raffles every minute
+            # Check for expired raffles every RAFFLE_CHECK_INTERVAL seconds
+            await RaffleService.verify_provisional_participants()
             await RaffleService.check_and_start_draws()
+            await RaffleService.recover_interrupted_draws()
+            # Дайджест, оставшийся в БД после рестарта или от упавшего воркера
+            NotificationService.schedule_digest()
         except Exception as e:
             print(f"Error in background task: {e}")
-        await asyncio.sleep(60)
+        await asyncio.sleep(RAFFLE_CHECK_INTERVAL)
 
 @app.get("/")
 async def root():
@@ -78,13 +91,5 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
-# WebSocket endpoint for raffle wheel
-@app.websocket("/ws/raffle/{raffle_id}")
-async def websocket_endpoint(websocket: WebSocket, raffle_id: int):
-    await manager.connect(websocket, raffle_id)
-    try:
-        while True:
-            data = await websocket.receive_text()
-            # Handle incoming messages if needed
-    except WebSocketDisconnect:
-        manager.disconnect(websocket, raffle_id)
\ No newline at end of file
+# Старый адрес WebSocket розыгрыша обслуживает тот же обработчик, что и /api/ws/{raffle_id}
+app.add_api_websocket_route("/ws/raffle/{raffle_id}", websocket.websocket_endpoint)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Float, BigInteger
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Float, BigInteger, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, true
 from .database import Base
 
 class User(Base):
@@ -37,6 +37,7 @@ class Raffle(Base):
     draw_started = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     display_type = Column(String, default="slot")
+    audience = Column(JSON, nullable=True)  # Сегмент аудитории для анонсов, None — все
     participants = relationship("Participant", back_populates="raffle")
     winners = relationship("Winner", back_populates="raffle")
 
@@ -48,10 +49,18 @@ class Participant(Base):
     raffle_id = Column(Integer, ForeignKey("raffles.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
     joined_at = Column(DateTime(timezone=True), server_default=func.now())
+    # False — принят условно, подписку проверим позже (Telegram был недоступен)
+    subscription_verified = Column(Boolean, default=True, server_default=true(), index=True)
     
     raffle = relationship("Raffle", back_populates="participants")
     user = relationship("User", back_populates="participations")
 
+    # Индексы для сегментов аудитории
+    __table_args__ = (
+        Index("ix_participants_raffle_user", "raffle_id", "user_id"),
+        Index("ix_participants_user_joined", "user_id", "joined_at"),
+    )
+
 class Winner(Base):
     __tablename__ = "winners"
     
@@ -65,6 +74,11 @@ class Winner(Base):
     raffle = relationship("Raffle", back_populates="winners")
     user = relationship("User", back_populates="wins")
 
+    __table_args__ = (
+        Index("ix_winners_user_id", "user_id"),
+        Index("ix_winners_raffle_position", "raffle_id", "position", unique=True),
+    )
+
 class Admin(Base):
     __tablename__ = "admins"
     
@@ -72,4 +86,41 @@ class Admin(Base):
     id = Column(Integer, primary_key=True, index=True)
     telegram_id = Column(BigInteger, unique=True, index=True)  # Изменено на BigInteger
     username = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ChannelMembership(Base):
+    """Индекс подписок на каналы, наполняемый ботом из chat_member updates"""
+    __tablename__ = "channel_memberships"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    channel = Column(String, nullable=False)  # username канала без @, в нижнем регистре
+    telegram_id = Column(BigInteger, nullable=False)
+    status = Column(String)  # creator, administrator, member, restricted, left, kicked
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint("channel", "telegram_id", name="uq_channel_memberships_channel_user"),
+    )
+
+class DrawState(Base):
+    """Ход розыгрыша вне памяти процесса: после рестарта воркера розыгрыш продолжается с места остановки"""
+    __tablename__ = "draw_states"
+    
+    raffle_id = Column(Integer, ForeignKey("raffles.id"), primary_key=True)
+    phase = Column(String, nullable=False)  # countdown, starting, spinning, revealed, failed
+    plan = Column(JSON)  # [[место, индекс в списке по Telegram ID], ...] в порядке розыгрыша
+    round_seq = Column(Integer, default=0)
+    completed_positions = Column(JSON, default=list)  # объявленные места
+    event_seq = Column(Integer, default=0)  # seq последнего опубликованного события розыгрыша
+    deadline = Column(Float)  # конец текущей фазы, unix-время
+    owner = Column(String)  # воркер, который ведёт розыгрыш
+    heartbeat = Column(Float, nullable=False)  # последнее обновление, unix-время
+
+class PendingNotice(Base):
+    """Анонс нового розыгрыша, ждущий дайджеста: переживает рестарт, отправляет его один воркер"""
+    __tablename__ = "pending_notices"
+
+    id = Column(Integer, primary_key=True)
+    raffle_id = Column(Integer, index=True)  # без FK: удаление розыгрыша просто снимает анонс
+    data = Column(JSON, nullable=False)  # данные для сообщения, как в notify_new_raffle
+    created_at = Column(Float, nullable=False)  # unix-время постановки в очередь
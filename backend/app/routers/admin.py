@@ -8,10 +8,15 @@ from datetime import datetime
 import aiohttp
 import logging
 from ..database import get_db
-from ..models import Raffle, User, Admin, Winner, Participant
-from ..schemas import RaffleCreate, Raffle as RaffleSchema
-from ..services.telegram import TelegramService
+from ..models import Raffle, User, Admin, Winner, Participant, DrawState, PendingNotice
+from ..schemas import RaffleCreate, Raffle as RaffleSchema, ChannelMemberUpdate
+from ..services.telegram import bot_api_url, bot_file_url
+from ..services.notifications import NotificationService
+from ..services.membership import MembershipService
 from ..utils.auth import get_current_admin
+from ..utils.cache import raffle_snapshots
+from ..websocket_manager import manager
+from ..services.admission import admission
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
@@ -30,6 +35,10 @@ async def create_raffle(
     """Create new raffle"""
     from ..config import parse_moscow_time, convert_to_utc
     
+    audience = raffle_data.audience
+    if audience and audience.type == "raffle_participants" and not audience.raffle_id:
+        raise HTTPException(status_code=400, detail="Audience segment requires raffle_id")
+    
     # Конвертируем дату из московского времени в UTC для хранения
     raffle_dict = raffle_data.dict()
         # Исправляем URL изображения если оно есть
@@ -75,37 +84,27 @@ async def create_raffle(
     db.add(raffle)
     await db.commit()
     await db.refresh(raffle)
+    # на случай, если кто-то подключался к этому id до создания (закешировано None)
+    raffle_snapshots.invalidate(raffle.id)
     
     # Постинг в каналы для публикации
     if raffle_data.post_channels:
         await post_to_channels(raffle, raffle_data.post_channels)
     
     # Notify ONLY users with notifications enabled
-    users_result = await db.execute(
-        select(User).where(User.notifications_enabled == True)
-    )
-    users = users_result.scalars().all()
-
-    if users:
-        user_ids = [user.telegram_id for user in users]
-        
-        # For notifications, format the date back to Moscow time
-        from ..config import convert_from_utc
-        # Конвертируем UTC время обратно в московское для уведомлений
-        moscow_time_for_notification = convert_from_utc(raffle.end_date)
-        
-        notification_data = raffle_data.dict()
-        notification_data['end_date'] = moscow_time_for_notification.strftime('%d.%m.%Y в %H:%M МСК')
-        notification_data['id'] = raffle.id
-        # Передаем полный URL изображения
-        notification_data['photo_url'] = raffle.photo_url
-        
-        # Send notifications
-        await TelegramService.notify_new_raffle(
-            raffle.id,
-            user_ids,
-            notification_data
-        )
+    # For notifications, format the date back to Moscow time
+    from ..config import convert_from_utc
+    # Конвертируем UTC время обратно в московское для уведомлений
+    moscow_time_for_notification = convert_from_utc(raffle.end_date)
+    
+    notification_data = raffle_data.dict()
+    notification_data['end_date'] = moscow_time_for_notification.strftime('%d.%m.%Y в %H:%M МСК')
+    notification_data['id'] = raffle.id
+    # Передаем полный URL изображения
+    notification_data['photo_url'] = raffle.photo_url
+    
+    # Send notifications (сразу или через дайджест)
+    await NotificationService.notify_new_raffle(raffle.id, notification_data)
     
     return raffle
 
@@ -140,7 +139,7 @@ async def post_to_channels(raffle: Raffle, channels: List[str]):
     for channel in channels:
         channel = channel.replace('@', '')
         try:
-            url = f"https://api.telegram.org/bot{BOT_TOKEN}/"
+            url = bot_api_url()
             
             # Если есть фото И это полный URL
             if raffle.photo_url and raffle.photo_url.startswith('http'):
@@ -207,7 +206,7 @@ async def upload_telegram_photo(
     """Download photo from Telegram and save it"""
     try:
         # Get file info from Telegram
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getFile"
+        url = bot_api_url("getFile")
         async with aiohttp.ClientSession() as session:
             async with session.post(url, json={"file_id": file_id}) as response:
                 data = await response.json()
@@ -218,7 +217,7 @@ async def upload_telegram_photo(
                 file_path = data["result"]["file_path"]
                 
         # Download file
-        download_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
+        download_url = bot_file_url(file_path)
         async with aiohttp.ClientSession() as session:
             async with session.get(download_url) as response:
                 if response.status != 200:
@@ -274,14 +273,29 @@ async def delete_raffle(
     if not raffle:
         raise HTTPException(status_code=404, detail="Raffle not found")
 
-    # Удаляем каскадом: winners → participants → raffle
+    # Удаляем каскадом: draw state, анонс → winners → participants → raffle
+    await db.execute(delete(DrawState).where(DrawState.raffle_id == raffle_id))
+    # ещё не разосланный анонс удалённого розыгрыша
+    await db.execute(delete(PendingNotice).where(PendingNotice.raffle_id == raffle_id))
     await db.execute(delete(Winner).where(Winner.raffle_id == raffle_id))
     await db.execute(delete(Participant).where(Participant.raffle_id == raffle_id))
     await db.delete(raffle)
     await db.commit()
+    raffle_snapshots.invalidate(raffle_id)
     return {"status": "success"}
 
 
+@router.post("/channel-members")
+async def update_channel_members(
+    updates: List[ChannelMemberUpdate],
+    current_admin: Admin = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Принять пачку chat_member обновлений от бота в индекс подписок"""
+    applied = await MembershipService.apply_updates(db, updates)
+    return {"status": "success", "applied": applied}
+
+
 @router.get("/statistics")
 async def get_statistics(
     current_admin: Admin = Depends(get_current_admin),
@@ -315,5 +329,35 @@ async def get_statistics(
         "total_users": total_users,
         "active_users": active_users,
         "total_raffles": total_raffles,
-        "active_raffles": active_raffles
-    }
\ No newline at end of file
+        "active_raffles": active_raffles,
+        "notification_digest": NotificationService.digest_stats
+    }
+
+@router.get("/ws/connections")
+async def get_ws_connections(
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """WebSocket connection gauges of the worker that served the request"""
+    gauges = manager.connection_gauges()
+    return {
+        "worker": os.getpid(),
+        "live": sum(g["live"] for g in gauges.values()),
+        "idle": sum(g["idle"] for g in gauges.values()),
+        "reaped": sum(g["reaped"] for g in gauges.values()),
+        "admission": admission.stats(),
+        "raffles": gauges
+    }
+
+@router.get("/ws/metrics")
+async def get_ws_metrics(
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Viewers, messages, bytes, send latency and evictions of the worker that served the request"""
+    return manager.metrics_report()
+
+@router.get("/ws/actors")
+async def get_ws_actors(
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """Raffle actors of the worker that served the request: connections, mailbox and approximate memory"""
+    return {"worker": os.getpid(), **manager.actors.memory_report()}
@@ -1,17 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_
-from typing import List
+from typing import Dict, List, Optional
 from datetime import datetime, timezone
+import asyncio
+import json
+import os
 
 from ..database import get_db
 from ..models import Raffle, Participant, User, Winner
 from ..schemas import Raffle as RaffleSchema, RaffleWithWinners
-from ..services.telegram import TelegramService
+from ..services.membership import MembershipService
+from ..services.draw_protocol import participant_entry, roster_hash, normalize_protocol
 from ..utils.auth import get_current_user
+from ..utils.cache import raffle_snapshots, raffle_winner_events, raffle_rosters
+from ..database import async_session_maker
+from ..websocket_manager import manager
+from .websocket import load_raffle_snapshot, load_cached_winner_events, load_complete_event, load_revealed_positions
 
 router = APIRouter()
 
+# Сколько секунд запрос на участие может ждать Telegram
+JOIN_LATENCY_BUDGET = float(os.getenv("JOIN_LATENCY_BUDGET", "3"))
+# reject — отказать сразу, provisional — принять условно и проверить позже
+JOIN_DEGRADED_MODE = os.getenv("JOIN_DEGRADED_MODE", "reject")
+# Сколько секунд long-poll /live/state ждёт новых событий
+LIVE_POLL_TIMEOUT = float(os.getenv("LIVE_POLL_TIMEOUT", "25"))
+# Как часто SSE-поток шлёт keepalive-комментарий, чтобы прокси не закрыли его
+LIVE_STREAM_KEEPALIVE = float(os.getenv("LIVE_STREAM_KEEPALIVE", "15"))
+
 @router.get("/active", response_model=List[RaffleSchema])
 async def get_active_raffles(db: AsyncSession = Depends(get_db)):
     """Get all active raffles - PUBLIC ENDPOINT"""
@@ -89,8 +107,13 @@ async def get_completed_raffles(
         )
         participants_count = count_result.scalar()
         
+        # План сохраняется до анимации: у идущего розыгрыша показываем только объявленные места
+        revealed = None if raffle.is_completed else await load_revealed_positions(db, raffle.id)
+        
         winners = []
         for winner, user in winners_data:
+            if revealed is not None and winner.position not in revealed:
+                continue
             winners.append({
                 "position": winner.position,
                 "user": user,
@@ -149,18 +172,6 @@ async def participate_in_raffle(
     if datetime.now(timezone.utc) > raffle.end_date:
         raise HTTPException(status_code=400, detail="Raffle has ended")
     
-    # Check channels subscription
-    for channel in raffle.channels:
-        is_subscribed = await TelegramService.check_channel_subscription(
-            current_user.telegram_id, 
-            channel
-        )
-        if not is_subscribed:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"You must be subscribed to {channel}"
-            )
-    
     # Check if already participating
     existing = await db.execute(
         select(Participant).where(
@@ -171,11 +182,58 @@ async def participate_in_raffle(
     if existing.scalar_one_or_none():
         raise HTTPException(status_code=400, detail="Already participating")
     
+    # Check channels subscription в пределах общего бюджета
+    statuses = []
+    if raffle.channels:
+        # Завершаем читающую транзакцию: медленный, но отвечающий Telegram не
+        # открывает breaker, и всплеск заявок иначе выбрал бы весь пул.
+        # Индекс читается в своей короткой сессии, вставка возьмёт соединение заново
+        await db.commit()
+        try:
+            # Сначала индекс подписок от бота, getChatMember только для неизвестных пар
+            statuses = await asyncio.wait_for(
+                MembershipService.check_subscriptions(
+                    None,
+                    current_user.telegram_id,
+                    raffle.channels,
+                    timeout=JOIN_LATENCY_BUDGET
+                ),
+                timeout=JOIN_LATENCY_BUDGET + 0.5
+            )
+        except asyncio.TimeoutError:
+            statuses = [None] * len(raffle.channels)
+    
+    for channel, is_subscribed in zip(raffle.channels, statuses):
+        if is_subscribed is False:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"You must be subscribed to {channel}"
+            )
+    
+    verified = all(statuses)
+    if not verified and JOIN_DEGRADED_MODE != "provisional":
+        raise HTTPException(
+            status_code=503,
+            detail="Telegram is temporarily unavailable, please try again later",
+            headers={"Retry-After": "10"}
+        )
+    
     # Add participant
-    participant = Participant(raffle_id=raffle_id, user_id=current_user.id)
+    participant = Participant(
+        raffle_id=raffle_id,
+        user_id=current_user.id,
+        subscription_verified=verified
+    )
     db.add(participant)
     await db.commit()
     
+    if not verified:
+        return {
+            "status": "success",
+            "verification": "pending",
+            "message": "Successfully joined the raffle! Channel subscription will be verified shortly."
+        }
+    
     return {"status": "success", "message": "Successfully joined the raffle!"}
 
 @router.get("/{raffle_id}/participants")
@@ -193,6 +251,46 @@ async def get_participants(
     
     return participants
 
+async def load_draw_roster(raffle_id: int) -> Optional[Dict]:
+    """Roster of the current round with its ETag (loader for raffle_rosters)"""
+    raffle = await raffle_snapshots.get(raffle_id, load_raffle_snapshot)
+    if raffle is None:
+        return None
+    
+    async with async_session_maker() as db:
+        winner_filter = [Winner.raffle_id == raffle_id, Winner.user_id == User.id]
+        if not raffle["is_completed"]:
+            # Победители сохранены заранее — исключаем только уже объявленных
+            winner_filter.append(Winner.position.in_(await load_revealed_positions(db, raffle_id)))
+        
+        result = await db.execute(
+            select(User).join(Participant).where(
+                Participant.raffle_id == raffle_id,
+                ~select(Winner.id).where(*winner_filter).exists()
+            ).order_by(User.telegram_id.asc())
+        )
+        roster = [participant_entry(user) for user in result.scalars().all()]
+    
+    # Список меняется только между раундами — хеш годится как ETag
+    return {"roster": roster, "etag": f'"{roster_hash(p["id"] for p in roster)}"'}
+
+@router.get("/{raffle_id}/roster")
+async def get_draw_roster(raffle_id: int, request: Request):
+    """Ordered roster of the live draw (delta protocol): participants by Telegram ID minus revealed winners"""
+    # Один запрос к БД на розыгрыш и раунд; 304 не стоит ни запроса, ни трафика
+    cached = await raffle_rosters.get(raffle_id, load_draw_roster)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Raffle not found")
+    
+    roster, etag = cached["roster"], cached["etag"]
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return JSONResponse(
+        {"raffle_id": raffle_id, "roster": roster, "roster_hash": etag.strip('"'), "count": len(roster)},
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
 @router.get("/{raffle_id}/check-participation")
 async def check_participation(
     raffle_id: int,
@@ -208,4 +306,134 @@ async def check_participation(
     )
     participant = result.scalar_one_or_none()
     
-    return {"is_participating": participant is not None}
\ No newline at end of file
+    return {"is_participating": participant is not None}
+
+def live_events(raffle_id: int, after_seq: int, protocol: str, raffle: dict) -> Optional[List[dict]]:
+    """Logged draw events after after_seq; None when the client needs a snapshot"""
+    events = manager.events_since(raffle_id, after_seq, protocol)
+    if events == [] and raffle["is_completed"] and manager.last_seq(raffle_id) == 0:
+        # Розыгрыш закончился раньше, журнала в этом воркере нет — отдаём итог из БД
+        return None
+    return events
+
+async def live_snapshot(raffle_id: int, protocol: str, raffle: dict) -> dict:
+    db_winners = await raffle_winner_events.get(raffle_id, load_cached_winner_events)
+    snapshot = manager.snapshot(raffle_id, protocol, db_winners)
+    if snapshot["complete"] is None and raffle["is_completed"]:
+        async with async_session_maker() as db:
+            snapshot["complete"] = await load_complete_event(db, raffle_id)
+    return snapshot
+
+def sse_event(message: dict, seq: Optional[int] = None) -> str:
+    data = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+    return f"id: {seq}\ndata: {data}\n\n" if seq is not None else f"data: {data}\n\n"
+
+@router.get("/{raffle_id}/live/state")
+async def get_live_state(
+    raffle_id: int,
+    response: Response,
+    after_seq: int = Query(0, ge=0),
+    protocol: str = "full",
+    timeout: float = Query(LIVE_POLL_TIMEOUT, ge=0, le=LIVE_POLL_TIMEOUT)
+):
+    """Long-poll fallback for the live WebSocket: draw events after after_seq.
+
+    Если новых событий нет, ждёт до timeout секунд. Порядок и seq те же, что в
+    WebSocket; при слишком большом разрыве вместо событий приходит snapshot.
+    """
+    protocol = normalize_protocol(protocol)
+    raffle = await raffle_snapshots.get(raffle_id, load_raffle_snapshot)
+    if raffle is None:
+        raise HTTPException(status_code=404, detail="Raffle not found")
+
+    signal = manager.update_signal(raffle_id)
+    events = live_events(raffle_id, after_seq, protocol, raffle)
+    if events == [] and not raffle["is_completed"] and timeout > 0:
+        try:
+            async with asyncio.timeout(timeout):
+                await signal.wait()
+        except TimeoutError:
+            pass
+        events = live_events(raffle_id, after_seq, protocol, raffle)
+
+    body = {
+        "raffle_id": raffle_id,
+        "last_seq": events[-1]["seq"] if events else after_seq,
+        "events": events or [],
+        "countdown": manager.countdown_sync(raffle_id)
+    }
+    if events is None:
+        body["snapshot"] = await live_snapshot(raffle_id, protocol, raffle)
+        body["last_seq"] = body["snapshot"]["seq"]
+
+    if events:
+        # Ответ на этот after_seq не меняется, кроме дописанных в конец событий:
+        # CDN может отдать его сразу всем зрителям, ждущим того же seq
+        response.headers["Cache-Control"] = "public, max-age=1"
+    else:
+        response.headers["Cache-Control"] = "no-store"
+    return body
+
+@router.get("/{raffle_id}/live/stream")
+async def stream_live_events(
+    raffle_id: int,
+    request: Request,
+    after_seq: Optional[int] = Query(None, ge=0),
+    protocol: str = "full"
+):
+    """Server-Sent Events fallback for the live WebSocket.
+
+    id каждого события — его seq, поэтому EventSource при переподключении сам
+    продолжает с Last-Event-ID. Поток закрывается после raffle_complete.
+    """
+    protocol = normalize_protocol(protocol)
+    raffle = await raffle_snapshots.get(raffle_id, load_raffle_snapshot)
+    if raffle is None:
+        raise HTTPException(status_code=404, detail="Raffle not found")
+
+    if after_seq is None:
+        last_event_id = request.headers.get("last-event-id", "")
+        after_seq = int(last_event_id) if last_event_id.isdigit() else 0
+
+    async def event_stream():
+        nonlocal raffle
+        seq = after_seq
+        countdown_deadline = None
+        yield "retry: 3000\n\n"
+        while True:
+            signal = manager.update_signal(raffle_id)
+            events = live_events(raffle_id, seq, protocol, raffle)
+            if events is None:
+                snapshot = await live_snapshot(raffle_id, protocol, raffle)
+                seq = snapshot["seq"]
+                yield sse_event(snapshot, seq)
+                if snapshot["complete"] is not None:
+                    return
+                events = []
+
+            for message in events:
+                seq = message["seq"]
+                yield sse_event(message, seq)
+                if message["type"] == "raffle_complete":
+                    return
+
+            countdown = manager.countdown_sync(raffle_id)
+            deadline = countdown["deadline_ms"] if countdown else None
+            if deadline != countdown_deadline:
+                countdown_deadline = deadline
+                if countdown:
+                    yield sse_event(countdown)
+
+            try:
+                async with asyncio.timeout(LIVE_STREAM_KEEPALIVE):
+                    await signal.wait()
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                # отмена розыгрыша не проходит через шину — перечитываем статус
+                raffle = await raffle_snapshots.get(raffle_id, load_raffle_snapshot) or raffle
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,47 +1,133 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 import asyncio
 import random
 import json
 import math
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import logging
 from ..database import get_db, async_session_maker
-from ..models import Raffle, Participant, User, Winner
+from ..models import Raffle, Participant, User, Winner, DrawState
 from ..websocket_manager import manager
 from ..services.telegram import TelegramService
 from ..services.notifications import NotificationService
 from ..services.distributed_lock import distributed_lock
+from ..services.draw_state import DrawStateService, DrawOwnershipLost
+from ..services.admission import admission, CLOSE_TRY_AGAIN_LATER
+from ..utils.cache import raffle_snapshots, raffle_winner_events
+from ..services.wire_encoding import normalize_encoding
+from ..services.draw_protocol import (
+    normalize_protocol, participant_entry, raffle_starting_delta, slot_start_delta,
+    slot_start_window, draw_seconds
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Глобальный словарь для отслеживания состояния розыгрышей
-raffle_states = {}
-processed_messages = {}
+# Розыгрыша нет: клиенту незачем переподключаться
+CLOSE_RAFFLE_NOT_FOUND = 4404
+
+def plan_draw(prizes: Dict, roster_size: int) -> List[Tuple[int, int]]:
+    """Весь розыгрыш сразу: (место, индекс в замороженном списке) с последнего места к первому"""
+    positions = sorted((int(position) for position in prizes), reverse=True)
+    return list(zip(positions, random.sample(range(roster_size), len(positions))))
+
+async def persist_draw_plan(db: AsyncSession, raffle: Raffle, participants: List[User]) -> Optional[List[Tuple[int, int]]]:
+    """Сохраняет всех победителей одной транзакцией до начала анимации.
+    
+    Если план уже сохранён (повторный запуск), возвращает его же — победители
+    не перевыбираются.
+    """
+    lock_key = f"raffle_{raffle.id}_plan"
+    if not await distributed_lock.acquire(lock_key, timeout=30):
+        logger.warning(f"Could not acquire plan lock for raffle {raffle.id}")
+        return None
 
-async def run_wheel(raffle_id: int, db: AsyncSession):
-    """Запуск анимации розыгрыша и выбор победителя на сервере"""
     try:
-        # Получаем розыгрыш и участников
-        raffle_result = await db.execute(select(Raffle).where(Raffle.id == raffle_id))
-        raffle = raffle_result.scalar_one_or_none()
+        saved = await load_saved_plan(db, raffle, participants)
+        if saved is not None:
+            return saved or None
+
+        plan = plan_draw(raffle.prizes, len(participants))
+        db.add_all([
+            Winner(
+                raffle_id=raffle.id,
+                user_id=participants[index].id,
+                position=position,
+                prize=raffle.prizes[str(position)]
+            )
+            for position, index in plan
+        ])
+        try:
+            await db.commit()
+        except IntegrityError:
+            # InMemoryLock не видит другие процессы: план успел записать
+            # другой воркер (UNIQUE raffle_id, position) — играем его план
+            await db.rollback()
+            logger.warning(f"Draw plan of raffle {raffle.id} was saved by another worker")
+            return await load_saved_plan(db, raffle, participants) or None
+        return plan
+
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await distributed_lock.release(lock_key)
+
+async def load_saved_plan(db: AsyncSession, raffle: Raffle, participants: List[User]) -> Optional[List[Tuple[int, int]]]:
+    """Сохранённый план; None — плана нет, [] — не совпадает со списком участников"""
+    saved_result = await db.execute(
+        select(Winner.position, Winner.user_id).where(Winner.raffle_id == raffle.id)
+    )
+    saved = saved_result.all()
+    if not saved:
+        return None
+    roster_index = {user.id: index for index, user in enumerate(participants)}
+    if len(saved) != len(raffle.prizes) or any(row.user_id not in roster_index for row in saved):
+        logger.error(f"Saved winners of raffle {raffle.id} do not match its roster")
+        return []
+    logger.info(f"Reusing saved draw plan for raffle {raffle.id}")
+    return sorted(((row.position, roster_index[row.user_id]) for row in saved), reverse=True)
+
+async def run_wheel(raffle_id: int, resume: Optional[DrawState] = None):
+    """Запуск анимации розыгрыша: план выбирается и сохраняется сразу, анимация его проигрывает.
+    
+    resume — сохранённое состояние прерванного розыгрыша: объявленные раунды
+    пропускаются, недоигранный раунд начинается заново с тем же победителем.
+    Сессии БД берутся только на время запросов: во время анимации
+    розыгрыш не держит соединение из пула.
+    """
+    try:
+        async with async_session_maker() as db:
+            # Получаем розыгрыш и участников
+            raffle_result = await db.execute(select(Raffle).where(Raffle.id == raffle_id))
+            raffle = raffle_result.scalar_one_or_none()
 
-        if not raffle or raffle.is_completed:
-            logger.warning(f"Raffle {raffle_id} not found or already completed")
-            return
+            if not raffle or raffle.is_completed:
+                logger.warning(f"Raffle {raffle_id} not found or already completed")
+                return
 
-        # ВАЖНО: Загружаем участников в ФИКСИРОВАННОМ порядке (по Telegram ID)
-        participants_result = await db.execute(
-            select(User).join(Participant)
-            .where(Participant.raffle_id == raffle_id)
-            .order_by(User.telegram_id.asc())  # ДЕТЕРМИНИРОВАННЫЙ ПОРЯДОК
-        )
-        participants = participants_result.scalars().all()
+            # ВАЖНО: Загружаем участников в ФИКСИРОВАННОМ порядке (по Telegram ID)
+            participants_result = await db.execute(
+                select(User).join(Participant)
+                .where(Participant.raffle_id == raffle_id)
+                .order_by(User.telegram_id.asc())  # ДЕТЕРМИНИРОВАННЫЙ ПОРЯДОК
+            )
+            participants = participants_result.scalars().all()
+
+            if len(participants) < len(raffle.prizes):
+                plan = None
+            else:
+                # Победители известны и записаны в БД до первого кадра анимации;
+                # до raffle_complete их скрывают /completed, /roster и снимки
+                plan = await persist_draw_plan(db, raffle, participants)
 
         if len(participants) < len(raffle.prizes):
+            await DrawStateService.fail(raffle_id, "not enough participants")
             await manager.broadcast({
                 "type": "error",
                 "message": "Недостаточно участников для проведения розыгрыша"
@@ -49,266 +135,350 @@ async def run_wheel(raffle_id: int, db: AsyncSession):
             return
 
         logger.info(f"Starting raffle {raffle_id} with {len(participants)} participants")
-        logger.info(f"Initial participants order: {[p.telegram_id for p in participants]}")
-
-        # Сохраняем список участников для синхронизации с клиентами
-        participant_list = [{
-            "id": p.telegram_id,
-            "username": p.username or f"{p.first_name} {p.last_name or ''}".strip(),
-            "first_name": p.first_name,
-            "last_name": p.last_name
-        } for p in participants]
-
-        # Инициализируем состояние розыгрыша с round counter
-        raffle_states[raffle_id] = {
-            "participants": list(participants),
-            "remaining_participants": list(participants),
+
+        if plan is None:
+            await DrawStateService.fail(raffle_id, "no draw plan")
+            await manager.broadcast({
+                "type": "error",
+                "message": "Произошла ошибка при проведении розыгрыша"
+            }, raffle_id)
+            return
+
+        completed_positions = set()
+        if resume is not None and resume.phase in ("spinning", "revealed"):
+            completed_positions = set(resume.completed_positions or [])
+            logger.warning(f"Resuming raffle {raffle_id} after round {resume.round_seq}, revealed positions {sorted(completed_positions)}")
+
+        # Состоянием розыгрыша владеет актор: пока оно есть, актор не собирается
+        state = manager.actors.actor(raffle_id).draw = {
+            "roster": participants,
+            "plan": plan,
             "winners": [],
-            "completed_positions": set(),
-            "participant_list": participant_list,
-            "lock": asyncio.Lock(),
-            "round_seq": 0  # ИЗМЕНЕНО: round_seq вместо sequence
+            "round_seq": 0
         }
 
-        # Сообщаем всем клиентам о начале
-        await manager.broadcast({
-            "type": "raffle_starting",
-            "total_participants": len(participants),
-            "total_prizes": len(raffle.prizes),
-            "round_seq": 0
-        }, raffle_id)
+        if not completed_positions:
+            await DrawStateService.save(
+                raffle_id,
+                phase="starting",
+                plan=[list(step) for step in plan],
+                round_seq=0,
+                completed_positions=[],
+                deadline=time.time() + draw_seconds(3)
+            )
+
+            # Сохраняем список участников для синхронизации с клиентами
+            participant_list = [participant_entry(p) for p in participants]
+
+            # Сообщаем всем клиентам о начале; delta-клиенты получают список один раз здесь
+            raffle_starting_event = {
+                "type": "raffle_starting",
+                "total_participants": len(participants),
+                "total_prizes": len(raffle.prizes),
+                "round_seq": 0
+            }
+            await manager.broadcast(raffle_starting_event, raffle_id, variants={
+                "delta": raffle_starting_delta(raffle_starting_event, participant_list)
+            })
+
+            await asyncio.sleep(draw_seconds(3))
 
-        await asyncio.sleep(3)
+        wheel_duration = {
+            'fast': 5,
+            'medium': 7,
+            'slow': 10
+        }.get(raffle.wheel_speed, 5)
+
+        remaining_participants = list(participants)
+        drawn_indices: List[int] = []  # индексы победителей в исходном списке
 
         # Разыгрываем призы начиная с последнего места
-        sorted_positions = sorted(raffle.prizes.keys(), key=lambda x: int(x), reverse=True)
+        for position, roster_index in plan:
+            state['round_seq'] += 1
+            current_round_seq = state['round_seq']
+            prize = raffle.prizes[str(position)]
+
+            # индекс в списке раунда: исходный минус выбывшие до него (мест мало, O(k))
+            winner_index = roster_index - sum(1 for drawn in drawn_indices if drawn < roster_index)
+            winner = remaining_participants[winner_index]
+
+            winner_data = {
+                "id": winner.telegram_id,
+                "username": winner.username,
+                "first_name": winner.first_name,
+                "last_name": winner.last_name
+            }
+
+            if position in completed_positions:
+                # объявлен до рестарта — только восстанавливаем состояние раунда
+                del remaining_participants[winner_index]
+                drawn_indices.append(roster_index)
+                state['winners'].append({"position": position, "user": winner_data, "prize": prize})
+                continue
+
+            logger.info(f"=== ROUND {current_round_seq} - POSITION {position} ===")
+            logger.info(f"Remaining participants COUNT: {len(remaining_participants)}")
+            logger.info(f"Winner at index {winner_index}: {winner.username} (id={winner.telegram_id})")
+
+            # КРИТИЧЕСКИ ВАЖНО: Формируем список ТОЛЬКО из оставшихся участников В ТОМ ЖЕ ПОРЯДКЕ
+            remaining_participant_list = [participant_entry(p) for p in remaining_participants]
+
+            # ДОБАВЛЯЕМ participant_ids для проверки на клиенте
+            participant_ids = [p.telegram_id for p in remaining_participants]
+
+            # отправляем клиентам событие slot_start с ДЕТАЛЬНОЙ информацией
+            slot_start_event = {
+                "type": "slot_start",
+                "position": position,
+                "prize": prize,
+                "participants": remaining_participant_list,  # Полные данные участников
+                "participant_ids": participant_ids,  # НОВОЕ: массив ID для проверки
+                "predetermined_winner_id": winner.telegram_id,
+                "predetermined_winner": winner_data,
+                "predetermined_winner_index": winner_index,  # НОВОЕ: индекс победителя
+                "round_seq": current_round_seq  # ВАЖНО: round_seq для последовательности
+            }
+
+            await DrawStateService.save(
+                raffle_id,
+                phase="spinning",
+                round_seq=current_round_seq,
+                deadline=time.time() + draw_seconds(wheel_duration)
+            )
 
-        for position in sorted_positions:
-            state = raffle_states.get(raffle_id)
-            if not state:
-                break
+            logger.info(f"Sending slot_start with round_seq={current_round_seq}, winner_id={winner.telegram_id}")
+            await manager.broadcast(slot_start_event, raffle_id, variants={
+                "delta": slot_start_delta(slot_start_event, participant_ids),
+                "window": slot_start_window(slot_start_event, raffle_id, remaining_participant_list)
+            })
+
+            # ждём окончания анимации
+            await asyncio.sleep(draw_seconds(wheel_duration))
+
+            # победитель уже в БД — только убираем его из списка раунда
+            del remaining_participants[winner_index]
+            drawn_indices.append(roster_index)
+            state['winners'].append({
+                "position": position,
+                "user": winner_data,
+                "prize": prize
+            })
+
+            # сообщаем всем о победителе с round_seq
+            await manager.broadcast({
+                "type": "winner_confirmed",
+                "position": position,
+                "winner": winner_data,
+                "winner_id": winner.telegram_id,  # НОВОЕ: явный ID
+                "winner_index": winner_index,  # индекс в списке раунда (delta)
+                "prize": prize,
+                "round_seq": current_round_seq  # ВАЖНО: тот же round_seq
+            }, raffle_id)
+
+            # После рассылки: если упадём раньше записи, раунд просто проиграется заново
+            completed_positions.add(position)
+            await DrawStateService.save(
+                raffle_id,
+                phase="revealed",
+                round_seq=current_round_seq,
+                completed_positions=sorted(completed_positions),
+                deadline=time.time() + draw_seconds(3)
+            )
+
+            logger.info(f"Winner revealed: position {position}, user {winner.telegram_id}, round_seq {current_round_seq}")
 
-            async with state['lock']:
-                # Увеличиваем round_seq для каждого раунда
-                state['round_seq'] += 1
-                current_round_seq = state['round_seq']
-                
-                # пропускаем, если это место уже разыграно
-                if int(position) in state['completed_positions']:
-                    logger.info(f"Position {position} already completed, skipping")
-                    continue
-
-                remaining_participants = state['remaining_participants']
-                if not remaining_participants:
-                    logger.error(f"No participants left for position {position}")
-                    break
-
-                # КРИТИЧЕСКИ ВАЖНО: Логируем точное состояние перед выбором
-                logger.info(f"=== ROUND {current_round_seq} - POSITION {position} ===")
-                logger.info(f"Remaining participants COUNT: {len(remaining_participants)}")
-                logger.info(f"Remaining participants IDs: {[p.telegram_id for p in remaining_participants]}")
-                logger.info(f"Remaining participants ORDER: {[(i, p.telegram_id, p.username) for i, p in enumerate(remaining_participants)]}")
-
-                # сервер выбирает случайного победителя
-                winner_index = random.randint(0, len(remaining_participants) - 1)
-                winner = remaining_participants[winner_index]
-                
-                logger.info(f"Random index selected: {winner_index}")
-                logger.info(f"Winner at index {winner_index}: {winner.username} (id={winner.telegram_id})")
-                
-                winner_data = {
-                    "id": winner.telegram_id,
-                    "username": winner.username,
-                    "first_name": winner.first_name,
-                    "last_name": winner.last_name
-                }
-
-                # КРИТИЧЕСКИ ВАЖНО: Формируем список ТОЛЬКО из оставшихся участников В ТОМ ЖЕ ПОРЯДКЕ
-                remaining_participant_list = [{
-                    "id": p.telegram_id,
-                    "username": p.username or f"{p.first_name} {p.last_name or ''}".strip(),
-                    "first_name": p.first_name,
-                    "last_name": p.last_name
-                } for p in remaining_participants]
-
-                # ДОБАВЛЯЕМ participant_ids для проверки на клиенте
-                participant_ids = [p.telegram_id for p in remaining_participants]
-
-                # отправляем клиентам событие slot_start с ДЕТАЛЬНОЙ информацией
-                slot_start_event = {
-                    "type": "slot_start",
-                    "position": int(position),
-                    "prize": raffle.prizes[position],
-                    "participants": remaining_participant_list,  # Полные данные участников
-                    "participant_ids": participant_ids,  # НОВОЕ: массив ID для проверки
-                    "predetermined_winner_id": winner.telegram_id,
-                    "predetermined_winner": winner_data,
-                    "predetermined_winner_index": winner_index,  # НОВОЕ: индекс победителя
-                    "round_seq": current_round_seq  # ВАЖНО: round_seq для последовательности
-                }
-                
-                logger.info(f"Sending slot_start with round_seq={current_round_seq}, winner_id={winner.telegram_id}")
-                await manager.broadcast(slot_start_event, raffle_id)
-
-                # ждём окончания анимации
-                wheel_duration = {
-                    'fast': 5,
-                    'medium': 7,
-                    'slow': 10
-                }.get(raffle.wheel_speed, 5)
-                await asyncio.sleep(wheel_duration)
-
-                # распределённая блокировка на сохранение
-                lock_key = f"raffle_{raffle_id}_position_{position}"
-                lock_acquired = await distributed_lock.acquire(lock_key, timeout=30)
-                if not lock_acquired:
-                    logger.warning(f"Could not acquire lock for position {position}")
-                    continue
-
-                try:
-                    # проверяем дубликат
-                    existing = await db.execute(
-                        select(Winner).where(
-                            Winner.raffle_id == raffle_id,
-                            Winner.position == int(position)
-                        ).with_for_update()
-                    )
-                    if not existing.scalar_one_or_none():
-                        winner_record = Winner(
-                            raffle_id=raffle_id,
-                            user_id=winner.id,
-                            position=int(position),
-                            prize=raffle.prizes[position]
-                        )
-                        db.add(winner_record)
-                        await db.commit()
-
-                        # обновляем состояние ПОСЛЕ сохранения в БД
-                        state['completed_positions'].add(int(position))
-                        state['winners'].append(winner_data)
-                        # ВАЖНО: удаляем победителя из списка только после сохранения
-                        state['remaining_participants'] = [
-                            p for p in state['remaining_participants']
-                            if p.telegram_id != winner.telegram_id
-                        ]
-
-                        # сообщаем всем о победителе с round_seq
-                        await manager.broadcast({
-                            "type": "winner_confirmed",
-                            "position": int(position),
-                            "winner": winner_data,
-                            "winner_id": winner.telegram_id,  # НОВОЕ: явный ID
-                            "prize": raffle.prizes[position],
-                            "round_seq": current_round_seq  # ВАЖНО: тот же round_seq
-                        }, raffle_id)
-
-                        logger.info(f"Winner confirmed and saved: position {position}, user {winner.telegram_id}, round_seq {current_round_seq}")
-                        logger.info(f"Remaining participants after removal: {[p.telegram_id for p in state['remaining_participants']]}")
-                    else:
-                        logger.warning(f"Winner already exists for position {position}")
-
-                except Exception as e:
-                    await db.rollback()
-                    logger.error(f"Error saving winner: {e}")
-                finally:
-                    await distributed_lock.release(lock_key)
-
-                await asyncio.sleep(3)
+            await asyncio.sleep(draw_seconds(3))
 
         # Финальное завершение
-        await finalize_raffle(db, raffle_id)
+        if len(state['winners']) == len(plan):
+            await finalize_raffle(raffle_id, state['winners'])
 
+    except DrawOwnershipLost:
+        # розыгрыш ведёт другой воркер — молча уступаем ему
+        logger.warning(f"Raffle {raffle_id} draw was taken over by another worker, stopping")
     except Exception as e:
         logger.exception(f"Error in run_wheel: {e}")
+        # иначе recovery подхватывал бы сломанный розыгрыш каждые DRAW_STATE_STALE секунд
+        await DrawStateService.fail(raffle_id, str(e))
         await manager.broadcast({
             "type": "error",
             "message": "Произошла ошибка при проведении розыгрыша"
         }, raffle_id)
-
-async def finalize_raffle(db: AsyncSession, raffle_id: int):
-    """Проверяем, все ли призы выданы, и завершаем розыгрыш"""
+    finally:
+        # и при ошибке: без этого актор никогда не соберётся
+        actor = manager.actors.get(raffle_id)
+        if actor is not None:
+            actor.draw = None
+
+async def finalize_raffle(raffle_id: int, winners: List[Dict]):
+    """Завершаем розыгрыш: победители уже сохранены, итог собирается из проигранного плана"""
     try:
-        winners_count_result = await db.execute(
-            select(func.count(Winner.id)).where(Winner.raffle_id == raffle_id)
-        )
-        winners_count = winners_count_result.scalar()
-
-        raffle_result = await db.execute(select(Raffle).where(Raffle.id == raffle_id))
-        raffle = raffle_result.scalar_one_or_none()
-
-        if raffle and winners_count >= len(raffle.prizes):
-            logger.info(f"All prizes distributed for raffle {raffle_id}")
+        logger.info(f"All prizes distributed for raffle {raffle_id}")
 
-            raffle.is_completed = True
-            raffle.is_active = False
-            await db.commit()
-
-            # очищаем локальное состояние
-            if raffle_id in raffle_states:
-                del raffle_states[raffle_id]
-                if raffle_id in processed_messages:
-                    del processed_messages[raffle_id]
-
-            # подготавливаем список победителей для финального сообщения
-            winners_result = await db.execute(
-                select(Winner, User).join(User).where(
-                    Winner.raffle_id == raffle_id
-                ).order_by(Winner.position)
+        async with async_session_maker() as db:
+            # Условный UPDATE: итог рассылает только тот, кто завершил розыгрыш
+            completed = await db.execute(
+                update(Raffle)
+                .where(Raffle.id == raffle_id, Raffle.is_completed == False)
+                .values(is_completed=True, is_active=False)
             )
-            winners_data = winners_result.all()
-            winners = []
-            for winner, user in winners_data:
-                winners.append({
-                    "position": winner.position,
-                    "user": {
-                        "id": user.telegram_id,
-                        "username": user.username,
-                        "first_name": user.first_name,
-                        "last_name": user.last_name
-                    },
-                    "prize": winner.prize
-                })
+            if completed.rowcount != 1:
+                await db.rollback()
+                logger.warning(f"Raffle {raffle_id} was already finalized by another worker")
+                return
+            # состояние больше не нужно: итог в raffles и winners
+            await DrawStateService.clear(db, raffle_id)
+            await db.commit()
+        raffle_snapshots.invalidate(raffle_id)
 
-            await manager.broadcast({
-                "type": "raffle_complete",
-                "winners": winners
-            }, raffle_id)
+        winners = sorted(winners, key=lambda w: w["position"])
+        await manager.broadcast({"type": "raffle_complete", "winners": winners}, raffle_id)
 
-            # уведомляем через Telegram/уведомления
-            await NotificationService.notify_winners(raffle_id, winners)
-            await NotificationService.notify_raffle_results(raffle_id, winners)
-            logger.info(f"Raffle {raffle_id} completed successfully with {len(winners)} winners")
+        # уведомляем через Telegram/уведомления
+        await NotificationService.notify_winners(raffle_id, winners)
+        await NotificationService.notify_raffle_results(raffle_id, winners)
+        logger.info(f"Raffle {raffle_id} completed successfully with {len(winners)} winners")
 
     except Exception as e:
         logger.exception(f"Error finalizing raffle {raffle_id}: {e}")
 
+async def load_complete_event(db: AsyncSession, raffle_id: int) -> Dict:
+    """raffle_complete message built from the saved winners"""
+    result = await db.execute(
+        select(Winner, User).join(User).where(Winner.raffle_id == raffle_id).order_by(Winner.position)
+    )
+    return {
+        "type": "raffle_complete",
+        "winners": [{
+            "position": winner.position,
+            "user": {
+                "id": user.telegram_id,
+                "username": user.username,
+                "first_name": user.first_name,
+                "last_name": user.last_name
+            },
+            "prize": winner.prize
+        } for winner, user in result.all()]
+    }
+
+async def load_revealed_positions(db: AsyncSession, raffle_id: int) -> set:
+    """Места идущего розыгрыша, победители которых уже объявлены: журнал событий и сохранённое состояние"""
+    return manager.revealed_positions(raffle_id) | await DrawStateService.revealed_positions(db, raffle_id)
+
+async def load_winner_events(db: AsyncSession, raffle_id: int) -> List[Dict]:
+    """Saved winners as winner_confirmed messages, for snapshots of resuming clients.
+    
+    План сохраняется до анимации, поэтому у незавершённого розыгрыша отдаются
+    только уже объявленные места.
+    """
+    result = await db.execute(
+        select(Winner, User, Raffle.is_completed).join(User).join(Raffle, Raffle.id == Winner.raffle_id)
+        .where(Winner.raffle_id == raffle_id)
+        .order_by(Winner.position)
+    )
+    rows = result.all()
+    if rows and not rows[0].is_completed:
+        revealed = await load_revealed_positions(db, raffle_id)
+        rows = [row for row in rows if row.Winner.position in revealed]
+    return [{
+        "type": "winner_confirmed",
+        "position": winner.position,
+        "winner": {
+            "id": user.telegram_id,
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name
+        },
+        "winner_id": user.telegram_id,
+        "prize": winner.prize
+    } for winner, user, _ in rows]
+
+async def load_cached_winner_events(raffle_id: int) -> List[Dict]:
+    """load_winner_events в своей сессии (loader для raffle_winner_events)"""
+    async with async_session_maker() as db:
+        return await load_winner_events(db, raffle_id)
+
+async def load_raffle_snapshot(raffle_id: int) -> Optional[Dict]:
+    """Raffle fields sent in connection_established (loader for raffle_snapshots)"""
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(Raffle.id, Raffle.title, Raffle.is_completed, Raffle.draw_started)
+            .where(Raffle.id == raffle_id)
+        )
+        row = result.one_or_none()
+    if row is None:
+        return None
+    return {
+        "id": row.id,
+        "title": row.title,
+        "is_completed": row.is_completed,
+        "draw_started": row.draw_started
+    }
+
 @router.websocket("/{raffle_id}")
-async def websocket_endpoint(websocket: WebSocket, raffle_id: int):
-    """WebSocket endpoint for live raffle"""
-    await manager.connect(websocket, raffle_id)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    raffle_id: int,
+    protocol: str = "full",
+    encoding: str = "json",
+    resume_from: Optional[int] = None
+):
+    """WebSocket endpoint for live raffle.
+    
+    ?protocol=full|delta|window — см. services/draw_protocol.py,
+    ?encoding=json|columnar|msgpack — см. services/wire_encoding.py,
+    ?resume_from=<seq> — прислать пропущенные события (или snapshot) после переподключения
+    """
+    protocol = normalize_protocol(protocol)
+    encoding = normalize_encoding(encoding)
+    
+    # Контроль допуска — до любых запросов к БД
+    rejected = admission.admit(len(manager.records), manager.local_viewers(raffle_id))
+    if rejected is not None:
+        reason, retry_after = rejected
+        # Без accept браузер увидит только ошибку рукопожатия, без кода и подсказки
+        await websocket.accept()
+        await websocket.close(
+            code=CLOSE_TRY_AGAIN_LATER,
+            reason=json.dumps({"reason": reason, "retry_after_ms": int(retry_after * 1000)})
+        )
+        return
+    
+    # Всё, что требует await, делаем до регистрации соединения
+    # Метаданные из кеша: при шторме подключений — один запрос к БД на розыгрыш
+    raffle = await raffle_snapshots.get(raffle_id, load_raffle_snapshot)
+    if raffle is None:
+        # до connect: несуществующий id не создаёт ни соединения, ни актора
+        await websocket.accept()
+        await websocket.close(code=CLOSE_RAFFLE_NOT_FOUND, reason="Raffle not found")
+        return
+    
+    db_winners = None
+    if resume_from is not None and manager.needs_snapshot(raffle_id, resume_from):
+        # После рестарта журнала нет у всех переподключающихся — один запрос на розыгрыш
+        db_winners = await raffle_winner_events.get(raffle_id, load_cached_winner_events)
+    
+    await manager.connect(websocket, raffle_id, protocol, encoding)
     try:
         # при подключении отправляем текущий статус
-        async with async_session_maker() as db:
-            raffle_result = await db.execute(
-                select(Raffle).where(Raffle.id == raffle_id)
-            )
-            raffle = raffle_result.scalar_one_or_none()
-            if raffle:
-                # Отправляем текущий round_seq если розыгрыш активен
-                current_round_seq = 0
-                if raffle_id in raffle_states:
-                    current_round_seq = raffle_states[raffle_id].get('round_seq', 0)
-                    
-                await websocket.send_json({
-                    "type": "connection_established",
-                    "raffle": {
-                        "id": raffle.id,
-                        "title": raffle.title,
-                        "is_completed": raffle.is_completed,
-                        "draw_started": raffle.draw_started
-                    },
-                    "round_seq": current_round_seq  # текущий round_seq
-                })
+        manager.send_personal({
+            "type": "connection_established",
+            "raffle": raffle,
+            # розыгрыш может идти в другом воркере — берём из журнала событий
+            "round_seq": manager.round_seq(raffle_id),
+            "last_seq": manager.last_seq(raffle_id),
+            "viewers": manager.total_viewers(raffle_id),
+            "protocol": protocol,
+            "encoding": encoding
+        }, websocket)
+        
+        # Без await после connect: пропущенные события встают в очередь раньше новых
+        if resume_from is not None:
+            manager.replay(websocket, raffle_id, resume_from, db_winners)
+        
+        countdown = manager.countdown_sync(raffle_id)
+        if countdown is not None:
+            manager.send_personal(countdown, websocket)
 
         while True:
             try:
@@ -319,12 +489,15 @@ async def websocket_endpoint(websocket: WebSocket, raffle_id: int):
                 logger.debug(f"WebSocket receive error: {e}")
                 break
 
+            manager.touch(websocket)
             try:
                 message = json.loads(data)
                 if message.get("type") == "ping":
-                    await websocket.send_json({"type": "pong"})
+                    manager.send_personal({"type": "pong"}, websocket)
             except Exception as e:
                 logger.error(f"Error processing message: {e}")
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, raffle_id)
\ No newline at end of file
+        pass
+    finally:
+        manager.disconnect(websocket)
\ No newline at end of file
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Literal
 
 class UserBase(BaseModel):
     telegram_id: int
@@ -19,6 +19,11 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class AudienceSegment(BaseModel):
+    type: Literal["all", "active_days", "never_won", "raffle_participants"] = "all"
+    days: Optional[int] = Field(default=None, gt=0)  # для active_days; 0 или меньше — ошибка 422, а не молча 30 дней
+    raffle_id: Optional[int] = None  # для raffle_participants
+
 class RaffleBase(BaseModel):
     title: str
     description: str
@@ -30,6 +35,7 @@ class RaffleBase(BaseModel):
     wheel_speed: str = "fast"  # НОВОЕ ПОЛЕ
     post_channels: List[str] = []  # НОВОЕ ПОЛЕ
     display_type: str = "slot"
+    audience: Optional[AudienceSegment] = None
 class RaffleCreate(RaffleBase):
     pass
 
@@ -60,4 +66,10 @@ class TelegramInitData(BaseModel):
     query_id: str
     user: dict
     auth_date: int
-    hash: str
\ No newline at end of file
+    hash: str
+
+class ChannelMemberUpdate(BaseModel):
+    channel: str
+    telegram_id: int
+    status: str
+    updated_at: Optional[datetime] = None
@@ -0,0 +1,88 @@
+import math
+import os
+import random
+import time
+from typing import Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько новых WebSocket-подключений в секунду принимает воркер (0 — без ограничения)
+WS_ACCEPT_RATE = float(os.getenv("WS_ACCEPT_RATE", "200"))
+# Сколько подключений можно принять разом сверх скорости
+WS_ACCEPT_BURST = int(os.getenv("WS_ACCEPT_BURST", "400"))
+# Предел соединений на воркер и на один розыгрыш в воркере (0 — без ограничения)
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "20000"))
+WS_MAX_PER_RAFFLE = int(os.getenv("WS_MAX_PER_RAFFLE", "0"))
+# Базовая задержка повторного подключения, которую подсказываем клиенту (секунды)
+WS_RETRY_BASE = float(os.getenv("WS_RETRY_BASE", "2"))
+
+# 1013 Try Again Later: в reason передаём {"retry_after_ms": ...}
+CLOSE_TRY_AGAIN_LATER = 1013
+
+class AdmissionControl:
+    """Admission control for the raffle WebSocket: accept rate and connection caps.
+
+    Скорость — token bucket на воркер. Отклонённый клиент получает
+    подсказку, через сколько переподключиться; задержка случайная и растёт
+    с числом недавних отказов, чтобы волна переподключений растянулась.
+    """
+
+    def __init__(
+        self,
+        rate: float = WS_ACCEPT_RATE,
+        burst: int = WS_ACCEPT_BURST,
+        max_connections: int = WS_MAX_CONNECTIONS,
+        max_per_raffle: int = WS_MAX_PER_RAFFLE
+    ):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_connections = max_connections
+        self.max_per_raffle = max_per_raffle
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.pressure = 0.0  # отказы за последние секунды, затухает экспоненциально
+        self.rejected: Dict[str, int] = {"rate": 0, "worker_full": 0, "raffle_full": 0}
+
+    def admit(self, worker_connections: int, raffle_connections: int) -> Optional[Tuple[str, float]]:
+        """None if the connection may proceed, else (reason, retry_after seconds)"""
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.pressure *= math.exp(-elapsed)
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+
+        if self.max_connections and worker_connections >= self.max_connections:
+            return self._reject("worker_full")
+        if self.max_per_raffle and raffle_connections >= self.max_per_raffle:
+            return self._reject("raffle_full")
+
+        if self.rate > 0:
+            if self.tokens < 1:
+                return self._reject("rate")
+            self.tokens -= 1
+        return None
+
+    def _reject(self, reason: str) -> Tuple[str, float]:
+        self.rejected[reason] += 1
+        self.pressure += 1
+        if reason == "rate":
+            # Разносим отказанных по окну, за которое бакет их пропустит
+            window = WS_RETRY_BASE + self.pressure / self.rate
+        else:
+            # Мест нет — освободятся не скоро
+            window = WS_RETRY_BASE * 5
+        return reason, window * random.uniform(0.5, 1.5)
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "tokens": round(self.tokens, 1),
+            "max_connections": self.max_connections,
+            "max_per_raffle": self.max_per_raffle,
+            "rejected": dict(self.rejected)
+        }
+
+# Глобальный экземпляр на воркер
+admission = AdmissionControl()
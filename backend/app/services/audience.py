@@ -0,0 +1,92 @@
+from typing import AsyncIterator, Optional
+from datetime import datetime, timedelta, timezone
+import logging
+
+from sqlalchemy import select, exists
+
+from ..database import async_session_maker
+from ..models import User, Participant, Winner
+
+logger = logging.getLogger(__name__)
+
+# Поддерживаемые сегменты аудитории для анонсов
+AUDIENCE_TYPES = ("all", "active_days", "never_won", "raffle_participants")
+DEFAULT_ACTIVE_DAYS = 30
+STREAM_CHUNK_SIZE = 1000
+
+
+def audience_query(segment: Optional[dict]):
+    """Build SELECT of telegram ids for users in the audience segment"""
+    segment = segment or {}
+    kind = segment.get("type") or "all"
+
+    query = select(User.telegram_id).where(User.notifications_enabled == True)
+
+    if kind == "all":
+        return query
+
+    if kind == "active_days":
+        days = int(segment.get("days") or DEFAULT_ACTIVE_DAYS)
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        # ix_participants_user_joined
+        return query.where(
+            exists().where(
+                Participant.user_id == User.id,
+                Participant.joined_at >= since
+            )
+        )
+
+    if kind == "never_won":
+        # ix_winners_user_id
+        return query.where(~exists().where(Winner.user_id == User.id))
+
+    if kind == "raffle_participants":
+        # ix_participants_raffle_user
+        return query.where(
+            exists().where(
+                Participant.user_id == User.id,
+                Participant.raffle_id == int(segment["raffle_id"])
+            )
+        )
+
+    raise ValueError(f"Unknown audience segment: {kind}")
+
+
+async def _paged_telegram_ids(query) -> AsyncIterator[int]:
+    """Keyset pages by telegram_id, each read in its own short session"""
+    last_id = None
+    while True:
+        page_query = query.order_by(User.telegram_id).limit(STREAM_CHUNK_SIZE)
+        if last_id is not None:
+            page_query = page_query.where(User.telegram_id > last_id)
+        async with async_session_maker() as db:
+            page = (await db.execute(page_query)).scalars().all()
+        for telegram_id in page:
+            yield telegram_id
+        if len(page) < STREAM_CHUNK_SIZE:
+            return
+        last_id = page[-1]
+
+
+async def page_audience(segment: Optional[dict]) -> AsyncIterator[int]:
+    """Telegram ids of the segment, read page by page without holding a connection.
+
+    Отправка тысяч сообщений занимает минуты, а поток из открытой сессии
+    всё это время занимал бы соединение пула.
+    """
+    async for telegram_id in _paged_telegram_ids(audience_query(segment)):
+        yield telegram_id
+
+
+async def page_raffle_recipients(raffle_id: int, segment: Optional[dict]) -> AsyncIterator[int]:
+    """Участники розыгрыша, затем аудитория сегмента без повторов (постранично, как page_audience)"""
+    seen = set()
+
+    participants = select(User.telegram_id).join(Participant).where(Participant.raffle_id == raffle_id)
+    async for telegram_id in _paged_telegram_ids(participants):
+        seen.add(telegram_id)
+        yield telegram_id
+
+    async for telegram_id in page_audience(segment):
+        if telegram_id not in seen:
+            yield telegram_id
@@ -0,0 +1,85 @@
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Simple circuit breaker for calls to an external service.
+
+    closed → open после failure_threshold ошибок подряд; через reset_timeout
+    пропускается один пробный запрос (half-open), успех закрывает цепь.
+    Пробный запрос, который не завершился (отменён), не держит цепь дольше
+    reset_timeout: вызывающий освобождает его через release_trial.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.trial_in_flight = False
+        self.trial_started = 0.0
+
+    def allow_request(self) -> bool:
+        """Можно ли сейчас обращаться к сервису"""
+        if self.state == self.CLOSED:
+            return True
+        
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = False
+        
+        if self.state == self.HALF_OPEN and self.trial_in_flight:
+            # пробный запрос потерян без record_* — не блокируем цепь навсегда
+            if time.monotonic() - self.trial_started >= self.reset_timeout:
+                self.trial_in_flight = False
+        
+        if self.state == self.HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            self.trial_started = time.monotonic()
+            return True
+        
+        self.rejected += 1
+        return False
+
+    def release_trial(self):
+        """Запрос завершился без результата (отмена) — следующий может стать пробным"""
+        if self.state == self.HALF_OPEN:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit {self.name} opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "rejected": self.rejected
+        }
+
+# Global breaker for Telegram Bot API calls
+telegram_breaker = CircuitBreaker(
+    "telegram",
+    failure_threshold=int(os.getenv("TELEGRAM_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("TELEGRAM_BREAKER_RESET_SECONDS", "30"))
+)
@@ -35,8 +35,8 @@ class InMemoryLock:
     
     async def release(self, key: str):
         """Release lock"""
-        if key in self.locks:
-            self.locks[key]['locked'] = False
+        # Ключи вида raffle_{id}_plan одноразовые — не копим их
+        self.locks.pop(key, None)
 
 # Global lock instance
 distributed_lock = InMemoryLock()
\ No newline at end of file
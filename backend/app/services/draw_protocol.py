@@ -0,0 +1,125 @@
+"""Live draw message formats.
+
+full — каждый slot_start несёт весь оставшийся список участников (по умолчанию).
+delta — список передаётся один раз в raffle_starting (или GET /api/raffles/{id}/roster),
+дальше в раундах только индекс и id победителя; клиент сверяет свой список
+по remaining_count и roster_hash.
+window — в slot_start только окно имён, которое прокручивает слот-машина:
+соседи победителя и случайные участники. Размер не зависит от числа участников.
+"""
+from typing import Iterable, List, Optional
+from datetime import datetime, timezone
+import hashlib
+import math
+import os
+import random
+import time
+
+from ..models import User
+
+PROTOCOLS = ("full", "delta", "window")
+DEFAULT_PROTOCOL = "full"
+
+# Сколько имён в окне протокола window
+DRAW_WINDOW_SIZE = int(os.getenv("DRAW_WINDOW_SIZE", "40"))
+# Сколько соседей победителя с каждой стороны попадает в окно
+WINDOW_NEIGHBOURS = 3
+# Множитель всех пауз розыгрыша (отсчёт, анимация): <1 ускоряет часы для нагрузочных тестов
+DRAW_TIME_SCALE = float(os.getenv("DRAW_TIME_SCALE", "1"))
+
+def normalize_protocol(value: Optional[str]) -> str:
+    return value if value in PROTOCOLS else DEFAULT_PROTOCOL
+
+def draw_seconds(seconds: float) -> float:
+    """Pause of the live draw on the DRAW_TIME_SCALE clock"""
+    return seconds * DRAW_TIME_SCALE
+
+def participant_entry(user: User) -> dict:
+    """Participant as shown on the slot machine"""
+    return {
+        "id": user.telegram_id,
+        "username": user.username or f"{user.first_name} {user.last_name or ''}".strip(),
+        "first_name": user.first_name,
+        "last_name": user.last_name
+    }
+
+def roster_hash(ids: Iterable[int]) -> str:
+    """Short hash of the ordered roster: sha256 of comma-joined Telegram ids"""
+    return hashlib.sha256(",".join(str(i) for i in ids).encode()).hexdigest()[:16]
+
+def raffle_starting_delta(message: dict, roster: List[dict]) -> dict:
+    return {
+        **message,
+        "roster": roster,
+        "roster_hash": roster_hash(p["id"] for p in roster)
+    }
+
+def slot_start_delta(message: dict, remaining_ids: List[int]) -> dict:
+    """slot_start without the roster: the client already holds it"""
+    delta = {
+        key: value for key, value in message.items()
+        if key not in ("participants", "participant_ids")
+    }
+    delta["remaining_count"] = len(remaining_ids)
+    delta["roster_hash"] = roster_hash(remaining_ids)
+    return delta
+
+def draw_window(raffle_id: int, round_seq: int, size: int, winner_index: int, window_size: int = None):
+    """Indices of the roster shown in a window round and the winner's position inside it.
+
+    Детерминировано по (raffle_id, round_seq): соседи победителя идут подряд,
+    остальное окно — случайная выборка из списка.
+    """
+    window_size = max(window_size or DRAW_WINDOW_SIZE, 2 * WINDOW_NEIGHBOURS + 1)
+    if size <= window_size:
+        return list(range(size)), winner_index
+
+    rng = random.Random(f"{raffle_id}:{round_seq}")
+    neighbours = [
+        (winner_index + offset) % size
+        for offset in range(-WINDOW_NEIGHBOURS, WINDOW_NEIGHBOURS + 1)
+    ]
+    taken = set(neighbours)
+    filler = []
+    while len(filler) < window_size - len(neighbours):
+        index = rng.randrange(size)
+        if index not in taken:
+            taken.add(index)
+            filler.append(index)
+
+    insert_at = rng.randint(0, len(filler))
+    indices = filler[:insert_at] + neighbours + filler[insert_at:]
+    return indices, insert_at + WINDOW_NEIGHBOURS
+
+def slot_start_window(message: dict, raffle_id: int, remaining: List[dict]) -> dict:
+    """slot_start with only the window of names, same field names as the full protocol"""
+    indices, winner_position = draw_window(
+        raffle_id,
+        message["round_seq"],
+        len(remaining),
+        message["predetermined_winner_index"]
+    )
+    window = [remaining[i] for i in indices]
+    return {
+        **message,
+        "participants": window,
+        "participant_ids": [p["id"] for p in window],
+        "predetermined_winner_index": winner_position,
+        "remaining_count": len(remaining),
+        "window": True
+    }
+
+def countdown_event(message_type: str, deadline: float) -> dict:
+    """countdown_started / countdown: absolute deadline and server time, epoch ms.
+
+    Клиент считает секунды сам по своим часам с поправкой на server_time_ms;
+    seconds оставлено для старых клиентов.
+    """
+    now = time.time()
+    return {
+        "type": message_type,
+        "deadline": datetime.fromtimestamp(deadline, timezone.utc).isoformat(),
+        "deadline_ms": int(deadline * 1000),
+        "server_time_ms": int(now * 1000),
+        "seconds": max(0, math.ceil(deadline - now))
+    }
@@ -0,0 +1,147 @@
+from contextlib import asynccontextmanager
+from typing import Optional, Set
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import async_session_maker
+from ..models import DrawState
+from ..websocket_manager import WORKER_ID, manager
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд без обновлений розыгрыш считается брошенным и его подхватывает другой воркер.
+# Должно быть больше самой длинной паузы между переходами (ресинк отсчёта, анимация раунда)
+DRAW_STATE_STALE = float(os.getenv("DRAW_STATE_STALE", "90"))
+
+class DrawOwnershipLost(Exception):
+    """Розыгрыш подхватил другой воркер — этот должен остановиться"""
+
+def new_draw_state(raffle_id: int, deadline: float) -> DrawState:
+    """Строка состояния для только что захваченного розыгрыша (в транзакции захвата)"""
+    now = time.time()
+    return DrawState(
+        raffle_id=raffle_id,
+        phase="countdown",
+        round_seq=0,
+        completed_positions=[],
+        deadline=deadline,
+        owner=WORKER_ID,
+        heartbeat=now
+    )
+
+class DrawStateService:
+    """Draw progress persisted at every transition (draw_states)"""
+
+    @staticmethod
+    async def save(raffle_id: int, **fields):
+        """Записывает переход розыгрыша, если он всё ещё принадлежит этому воркеру.
+
+        Raises DrawOwnershipLost, если строку забрал другой воркер или её нет.
+        Заодно сохраняет seq событий: после рестарта нумерация продолжится с него.
+        """
+        async with async_session_maker() as db:
+            saved = await db.execute(
+                update(DrawState)
+                .where(DrawState.raffle_id == raffle_id, DrawState.owner == WORKER_ID)
+                .values(heartbeat=time.time(), event_seq=manager.published_seq(raffle_id), **fields)
+            )
+            await db.commit()
+        if saved.rowcount != 1:
+            raise DrawOwnershipLost(f"Draw of raffle {raffle_id} is no longer owned by {WORKER_ID}")
+
+    @staticmethod
+    async def touch(raffle_id: int) -> bool:
+        """Heartbeat of the owner; False if the draw is no longer ours"""
+        async with async_session_maker() as db:
+            touched = await db.execute(
+                update(DrawState)
+                .where(DrawState.raffle_id == raffle_id, DrawState.owner == WORKER_ID)
+                .values(heartbeat=time.time())
+            )
+            await db.commit()
+        return touched.rowcount == 1
+
+    @staticmethod
+    @asynccontextmanager
+    async def heartbeat(raffle_id: int):
+        """Продлевает владение, пока выполняется блок (Telegram, отсчёт, анимация)"""
+        async def beat():
+            while True:
+                await asyncio.sleep(DRAW_STATE_STALE / 3)
+                try:
+                    if not await DrawStateService.touch(raffle_id):
+                        return
+                except Exception as e:
+                    logger.error(f"Draw heartbeat of raffle {raffle_id} failed: {e}")
+
+        task = asyncio.create_task(beat())
+        try:
+            yield
+        finally:
+            task.cancel()
+
+    @staticmethod
+    async def fail(raffle_id: int, reason: str):
+        """Розыгрыш не может продолжиться: recovery его больше не подхватывает"""
+        logger.error(f"Draw of raffle {raffle_id} failed: {reason}")
+        async with async_session_maker() as db:
+            await db.execute(
+                update(DrawState)
+                .where(DrawState.raffle_id == raffle_id, DrawState.owner == WORKER_ID)
+                .values(phase="failed", heartbeat=time.time())
+            )
+            await db.commit()
+
+    @staticmethod
+    async def clear(db: AsyncSession, raffle_id: int):
+        """Удаляет состояние в транзакции вызывающего (завершение, отмена)"""
+        await db.execute(delete(DrawState).where(DrawState.raffle_id == raffle_id))
+
+    @staticmethod
+    async def claim(raffle_id: int, stale_before: float) -> Optional[DrawState]:
+        """Take over a draw whose owner stopped updating it; None if someone else has it.
+
+        Условный UPDATE, как захват draw_started: при нескольких воркерах
+        брошенный розыгрыш подхватывает только один.
+        """
+        async with async_session_maker() as db:
+            claimed = await db.execute(
+                update(DrawState)
+                .where(
+                    DrawState.raffle_id == raffle_id,
+                    DrawState.phase != "failed",
+                    DrawState.heartbeat < stale_before
+                )
+                .values(owner=WORKER_ID, heartbeat=time.time())
+            )
+            await db.commit()
+            if claimed.rowcount == 1:
+                return await db.get(DrawState, raffle_id)
+
+            if await db.get(DrawState, raffle_id) is not None:
+                return None
+
+            # Розыгрыш запущен до появления draw_states —
+            # начинаем с обратного отсчёта, который уже истёк
+            state = new_draw_state(raffle_id, time.time())
+            db.add(state)
+            try:
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+                return None
+            return state
+
+    @staticmethod
+    async def revealed_positions(db: AsyncSession, raffle_id: int) -> Set[int]:
+        """Места, объявленные в идущем розыгрыше (переживает рестарт воркера)"""
+        result = await db.execute(
+            select(DrawState.completed_positions).where(DrawState.raffle_id == raffle_id)
+        )
+        return set(result.scalar_one_or_none() or [])
@@ -0,0 +1,108 @@
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import json
+import logging
+import os
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis нужен только для WS_BUS=redis
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# memory — один процесс; redis — рассылка между воркерами и хостами
+WS_BUS = os.getenv("WS_BUS", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+CHANNEL_PREFIX = "raffle:"
+
+# handler(raffle_id, message, variants): variants — версии сообщения для
+# других протоколов клиентов (см. services/draw_protocol.py)
+Handler = Callable[[int, dict, Optional[Dict[str, dict]]], Awaitable[None]]
+
+def raffle_channel(raffle_id: int) -> str:
+    return f"{CHANNEL_PREFIX}{raffle_id}"
+
+class InProcessBus:
+    """Bus for a single worker: published messages go straight to the local handler"""
+
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def stop(self):
+        self.handler = None
+
+    async def publish(self, raffle_id: int, message: dict, variants: Optional[Dict[str, dict]] = None):
+        if self.handler is not None:
+            await self.handler(raffle_id, message, variants)
+
+class RedisBus:
+    """Redis pub/sub bus: every worker relays raffle:{id} messages to its own sockets"""
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("WS_BUS=redis requires the redis package")
+        self.url = url
+        self.redis = None
+        self.pubsub = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        self.redis = aioredis.from_url(self.url)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+        self.task = asyncio.create_task(self._listen(handler))
+        logger.info(f"WebSocket bus subscribed to {self.url}")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if self.pubsub is not None:
+            await self.pubsub.aclose()
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    async def publish(self, raffle_id: int, message: dict, variants: Optional[Dict[str, dict]] = None):
+        payload = {"message": message, "variants": variants}
+        await self.redis.publish(
+            raffle_channel(raffle_id),
+            json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        )
+
+    async def _listen(self, handler: Handler):
+        while True:
+            try:
+                async for item in self.pubsub.listen():
+                    if item.get("type") != "pmessage":
+                        continue
+                    channel = item["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    try:
+                        raffle_id = int(channel[len(CHANNEL_PREFIX):])
+                        payload = json.loads(item["data"])
+                        await handler(raffle_id, payload["message"], payload.get("variants"))
+                    except Exception as e:
+                        logger.error(f"Error relaying {channel}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Redis перезапустился — переподписываемся
+                logger.error(f"WebSocket bus connection lost: {e}")
+                await asyncio.sleep(1)
+                try:
+                    await self.pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                except Exception:
+                    pass
+
+def create_bus():
+    if WS_BUS == "redis":
+        return RedisBus(REDIS_URL)
+    return InProcessBus()
@@ -0,0 +1,88 @@
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import deque
+import os
+import time
+
+# Сколько последних событий розыгрыша хранится для переподключившихся клиентов
+EVENT_LOG_SIZE = int(os.getenv("EVENT_LOG_SIZE", "256"))
+# Сколько секунд журнал завершённого розыгрыша хранится для опоздавших (WS, SSE, long-poll)
+EVENT_LOG_RETENTION = float(os.getenv("EVENT_LOG_RETENTION", "300"))
+# Эти сообщения заменяют друг друга и в журнал не попадают
+EPHEMERAL_TYPES = {"countdown", "viewer_count"}
+
+Entry = Tuple[int, dict, Optional[Dict[str, dict]]]  # (seq, message, variants)
+
+class RaffleEventLog:
+    """Bounded log of draw events with monotonic seq, plus the folded draw state.
+
+    Кольцевой буфер отдаёт пропущенные события по resume_from; если разрыв
+    больше буфера, клиент получает снимок состояния (snapshot).
+    """
+
+    def __init__(self, raffle_id: int, size: int = EVENT_LOG_SIZE):
+        self.raffle_id = raffle_id
+        self.entries: Deque[Entry] = deque(maxlen=size)
+        self.last_seq = 0
+        self.round_seq = 0
+        self.winners: Dict[int, dict] = {}  # position → winner_confirmed
+        self.current: Optional[Entry] = None  # slot_start без winner_confirmed
+        self.complete: Optional[dict] = None
+        self.completed_at: Optional[float] = None  # time.monotonic() прихода raffle_complete
+
+    def append(self, seq: int, message: dict, variants: Optional[Dict[str, dict]] = None):
+        if seq <= self.last_seq:
+            # Воркер, который ведёт розыгрыш, перезапустился — начинаем журнал заново
+            self.entries.clear()
+        self.last_seq = seq
+        self.entries.append((seq, message, variants))
+
+        message_type = message.get("type")
+        if "round_seq" in message:
+            self.round_seq = message["round_seq"]
+        if message_type == "raffle_starting":
+            self.winners.clear()
+            self.current = None
+            self.complete = None
+            self.completed_at = None
+        elif message_type == "slot_start":
+            self.current = (seq, message, variants)
+        elif message_type == "winner_confirmed":
+            self.winners[message["position"]] = message
+            self.current = None
+        elif message_type == "raffle_complete":
+            self.complete = message
+            self.completed_at = time.monotonic()
+            self.current = None
+
+    def expired(self, now: float, retention: float = EVENT_LOG_RETENTION) -> bool:
+        """Розыгрыш завершён достаточно давно, журнал можно выбросить"""
+        return self.completed_at is not None and now - self.completed_at >= retention
+
+    def since(self, seq: int) -> Optional[List[Entry]]:
+        """Events after seq, or None when they are no longer all in the buffer"""
+        if seq > self.last_seq:
+            return None
+        if seq == self.last_seq:
+            return []
+        if not self.entries or self.entries[0][0] > seq + 1:
+            return None
+        return [entry for entry in self.entries if entry[0] > seq]
+
+    def snapshot(self, protocol: str, db_winners: Optional[List[dict]] = None) -> dict:
+        """Current draw state for a client whose gap is too big to replay"""
+        winners = {w["position"]: w for w in db_winners or []}
+        winners.update(self.winners)
+
+        current_round = None
+        if self.current is not None:
+            _, message, variants = self.current
+            current_round = (variants or {}).get(protocol, message)
+
+        return {
+            "type": "snapshot",
+            "seq": self.last_seq,
+            "round_seq": self.round_seq,
+            "winners": [winners[position] for position in sorted(winners)],
+            "current_round": current_round,
+            "complete": self.complete
+        }
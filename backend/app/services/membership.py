@@ -0,0 +1,146 @@
+from typing import List, Dict, Optional, Iterable
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+import os
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import async_session_maker
+from ..models import ChannelMembership
+from ..schemas import ChannelMemberUpdate
+from .telegram import TelegramService
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBED_STATUSES = ("creator", "administrator", "member")
+# Сколько часов запись индекса считается достоверной без подтверждения
+MEMBERSHIP_INDEX_TTL_HOURS = float(os.getenv("MEMBERSHIP_INDEX_TTL_HOURS", "24"))
+
+def normalize_channel(channel: str) -> str:
+    return channel.replace('@', '').strip().lower()
+
+def _as_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    # SQLite возвращает naive datetime
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+class MembershipService:
+    """Channel membership index with getChatMember fallback"""
+
+    @staticmethod
+    async def lookup(db: AsyncSession, telegram_id: int, channels: Iterable[str]) -> Dict[str, bool]:
+        """Known fresh subscription states from the index, keyed by normalized channel"""
+        names = [normalize_channel(c) for c in channels]
+        if not names:
+            return {}
+
+        result = await db.execute(
+            select(ChannelMembership).where(
+                ChannelMembership.telegram_id == telegram_id,
+                ChannelMembership.channel.in_(names)
+            )
+        )
+        fresh_since = datetime.now(timezone.utc) - timedelta(hours=MEMBERSHIP_INDEX_TTL_HOURS)
+        return {
+            row.channel: row.status in SUBSCRIBED_STATUSES
+            for row in result.scalars().all()
+            if _as_utc(row.updated_at) and _as_utc(row.updated_at) >= fresh_since
+        }
+
+    @staticmethod
+    async def check_subscriptions(
+        db: Optional[AsyncSession],
+        telegram_id: int,
+        channels: List[str],
+        timeout: Optional[float] = None
+    ) -> List[Optional[bool]]:
+        """Subscription state per channel: index first, getChatMember for unknown and negative pairs.
+
+        db=None — индекс читается в своей короткой сессии, и Telegram
+        ожидается без занятого соединения (фоновые проверки).
+        """
+        if db is None:
+            async with async_session_maker() as lookup_db:
+                known = await MembershipService.lookup(lookup_db, telegram_id, channels)
+        else:
+            known = await MembershipService.lookup(db, telegram_id, channels)
+
+        # "Не подписан" из индекса — только подсказка: пропущенный chat_member
+        # (простой бота, бот ещё не админ канала) не должен сутки блокировать
+        # подписанного пользователя. Подтверждаем у Telegram, а если он
+        # недоступен — верим индексу
+        hints = {channel: False for channel, is_subscribed in known.items() if not is_subscribed}
+        unknown = [c for c in channels if not known.get(normalize_channel(c))]
+        if unknown:
+            fetched = await asyncio.gather(*[
+                TelegramService.get_subscription_status(telegram_id, channel, timeout=timeout)
+                for channel in unknown
+            ])
+            # Ответы Telegram тоже кладём в индекс
+            updates = [
+                ChannelMemberUpdate(
+                    channel=channel,
+                    telegram_id=telegram_id,
+                    status="member" if is_subscribed else "left"
+                )
+                for channel, is_subscribed in zip(unknown, fetched)
+                if is_subscribed is not None
+            ]
+            if updates:
+                # Отдельная сессия, чтобы не трогать транзакцию вызывающего
+                try:
+                    async with async_session_maker() as cache_db:
+                        await MembershipService.apply_updates(cache_db, updates)
+                except Exception as e:
+                    # Параллельная запись той же пары — индекс догонится позже
+                    logger.debug(f"Could not cache membership for {telegram_id}: {e}")
+            for channel, is_subscribed in zip(unknown, fetched):
+                name = normalize_channel(channel)
+                known[name] = is_subscribed if is_subscribed is not None else hints.get(name)
+
+        return [known[normalize_channel(c)] for c in channels]
+
+    @staticmethod
+    async def apply_updates(db: AsyncSession, updates: List[ChannelMemberUpdate]) -> int:
+        """Upsert membership updates, ignoring ones older than the stored state"""
+        if not updates:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        latest: Dict[tuple, ChannelMemberUpdate] = {}
+        for update in updates:
+            key = (normalize_channel(update.channel), update.telegram_id)
+            update_time = _as_utc(update.updated_at) or now
+            current = latest.get(key)
+            if current is None or update_time >= (_as_utc(current.updated_at) or now):
+                latest[key] = update.model_copy(update={"updated_at": update_time})
+
+        result = await db.execute(
+            select(ChannelMembership).where(
+                tuple_(ChannelMembership.channel, ChannelMembership.telegram_id).in_(list(latest.keys()))
+            )
+        )
+        existing = {(row.channel, row.telegram_id): row for row in result.scalars().all()}
+
+        applied = 0
+        for key, update in latest.items():
+            row = existing.get(key)
+            if row is None:
+                db.add(ChannelMembership(
+                    channel=key[0],
+                    telegram_id=key[1],
+                    status=update.status,
+                    updated_at=update.updated_at
+                ))
+            elif _as_utc(row.updated_at) is None or update.updated_at >= _as_utc(row.updated_at):
+                row.status = update.status
+                row.updated_at = update.updated_at
+            else:
+                continue
+            applied += 1
+
+        await db.commit()
+        return applied
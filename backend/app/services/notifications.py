@@ -3,40 +3,165 @@ from typing import List, Dict, Optional
 from datetime import datetime
 import logging
 import os
-from ..services.telegram import TelegramService
+import time
+from ..services.telegram import TelegramService, bot_api_url
 from ..database import async_session_maker
-from ..models import User, Raffle, Participant
-from sqlalchemy import select
+from ..services.audience import page_audience, page_raffle_recipients
+from ..models import User, Raffle, Participant, PendingNotice
+from sqlalchemy import select, delete, func
 
 logger = logging.getLogger(__name__)
 
+# Окно дайджеста в минутах: новые розыгрыши, созданные в пределах окна,
+# объединяются в одно сообщение на пользователя (0 — дайджест выключен)
+NOTIFICATION_DIGEST_MINUTES = int(os.getenv("NOTIFICATION_DIGEST_MINUTES", "0"))
+
 class NotificationService:
     """Service for managing notifications"""
+
+    # Задача этого воркера, которая ждёт окна дайджеста; сами анонсы лежат в pending_notices
+    _digest_task: Optional[asyncio.Task] = None
+    digest_stats: Dict[str, int] = {
+        "digests_sent": 0,
+        "raffles_digested": 0,
+        "messages_sent": 0,
+        "messages_saved": 0
+    }
     
     @staticmethod
     async def notify_new_raffle(raffle_id: int, raffle_data: dict):
         """Send notification about new raffle to all users with notifications enabled"""
-        async with async_session_maker() as db:
-            # Get users with notifications enabled
-            result = await db.execute(
-                select(User).where(User.notifications_enabled == True)
+        if NOTIFICATION_DIGEST_MINUTES > 0:
+            # В БД, а не в памяти: анонс переживает рестарт, и дайджест отправляет один воркер
+            async with async_session_maker() as db:
+                db.add(PendingNotice(
+                    raffle_id=raffle_id,
+                    data={**raffle_data, "id": raffle_id},
+                    created_at=time.time()
+                ))
+                await db.commit()
+            NotificationService.schedule_digest()
+            logger.info(f"Raffle {raffle_id} queued for digest")
+            return
+
+        await NotificationService._send_new_raffle(raffle_id, raffle_data)
+
+    @staticmethod
+    def schedule_digest():
+        """Запустить ожидание окна, если этот воркер ещё не ждёт.
+
+        Вызывается и фоновой проверкой: анонсы, оставшиеся после рестарта, тоже уйдут.
+        """
+        if NOTIFICATION_DIGEST_MINUTES <= 0:
+            return
+        task = NotificationService._digest_task
+        if task is None or task.done():
+            NotificationService._digest_task = asyncio.create_task(
+                NotificationService._flush_digest_when_due()
             )
-            users = result.scalars().all()
-            
-            if not users:
-                logger.info("No users with notifications enabled")
+
+    @staticmethod
+    async def _flush_digest_when_due():
+        """Ждём окончания окна самого старого анонса и отправляем накопленные одним сообщением"""
+        window = NOTIFICATION_DIGEST_MINUTES * 60
+        while True:
+            async with async_session_maker() as db:
+                oldest = (await db.execute(select(func.min(PendingNotice.created_at)))).scalar()
+            if oldest is None:
                 return
-            
-            user_ids = [user.telegram_id for user in users]
-            
-            # Send notifications
-            await TelegramService.notify_new_raffle(
-                raffle_id,
-                user_ids,
-                raffle_data
+            # Анонсы, пришедшие во время рассылки, ждут своего окна на следующем круге
+            await asyncio.sleep(max(0.0, oldest + window - time.time()))
+            try:
+                raffles = await NotificationService._claim_digest()
+                await NotificationService.flush_digest(raffles)
+            except Exception as e:
+                logger.error(f"Error sending raffle digest: {e}")
+                await asyncio.sleep(window)
+
+    @staticmethod
+    async def _claim_digest() -> List[Dict]:
+        """Забрать все ожидающие анонсы; пусто, если их забрал другой воркер.
+
+        Условный DELETE, как захват draw_started: удалил все строки — дайджест наш.
+        """
+        async with async_session_maker() as db:
+            rows = (await db.execute(select(PendingNotice).order_by(PendingNotice.id))).scalars().all()
+            if not rows:
+                return []
+            claimed = await db.execute(
+                delete(PendingNotice).where(PendingNotice.id.in_([row.id for row in rows]))
             )
-            
-            logger.info(f"Sent new raffle notifications to {len(user_ids)} users")
+            if claimed.rowcount != len(rows):
+                await db.rollback()
+                return []
+            await db.commit()
+        return [row.data for row in rows]
+
+    @staticmethod
+    async def flush_digest(raffles: List[Dict]):
+        """Send queued new raffle notices as a single message per user"""
+        if not raffles:
+            return
+
+        if len(raffles) == 1:
+            raffle = raffles[0]
+            await NotificationService._send_new_raffle(raffle["id"], raffle)
+            return
+
+        # Сегменты у розыгрышей могут отличаться: собираем для каждого
+        # пользователя список адресованных ему розыгрышей
+        user_raffles: Dict[int, List[int]] = {}
+        for index, raffle in enumerate(raffles):
+            async for telegram_id in page_audience(raffle.get("audience")):
+                user_raffles.setdefault(telegram_id, []).append(index)
+
+        if not user_raffles:
+            logger.info("No users with notifications enabled")
+            return
+
+        # Пользователи с одинаковым набором розыгрышей получают одно и то же сообщение
+        groups: Dict[tuple, List[int]] = {}
+        for telegram_id, indexes in user_raffles.items():
+            groups.setdefault(tuple(indexes), []).append(telegram_id)
+
+        sent = 0
+        for indexes, user_ids in groups.items():
+            if len(indexes) == 1:
+                raffle = raffles[indexes[0]]
+                sent += await TelegramService.notify_new_raffle(raffle["id"], user_ids, raffle)
+            else:
+                sent += await TelegramService.notify_new_raffles_digest(
+                    user_ids,
+                    [raffles[i] for i in indexes]
+                )
+
+        saved = sum(len(indexes) for indexes in user_raffles.values()) - sent
+        stats = NotificationService.digest_stats
+        stats["digests_sent"] += 1
+        stats["raffles_digested"] += len(raffles)
+        stats["messages_sent"] += sent
+        stats["messages_saved"] += saved
+
+        logger.info(
+            f"Sent digest of {len(raffles)} raffles to {sent} users, "
+            f"saved {saved} messages"
+        )
+
+    @staticmethod
+    async def _send_new_raffle(raffle_id: int, raffle_data: dict):
+        """Немедленная рассылка об одном новом розыгрыше"""
+        # Пользователи сегмента читаются страницами прямо в рассылку, соединение между ними свободно
+        sent = await TelegramService.notify_new_raffle(
+            raffle_id,
+            page_audience(raffle_data.get("audience")),
+            raffle_data
+        )
+
+        if not sent:
+            logger.info("No users with notifications enabled")
+            return
+
+        logger.info(f"Sent new raffle notifications to {sent} users")
     
     @staticmethod
     async def notify_raffle_starting(raffle_id: int):
@@ -48,55 +173,36 @@ class NotificationService:
             )
             raffle = raffle_result.scalar_one_or_none()
             
-            if not raffle:
-                logger.error(f"Raffle {raffle_id} not found")
-                return
-            
-            # Get participants
-            participants_result = await db.execute(
-                select(User).join(Participant).where(
-                    Participant.raffle_id == raffle_id
-                )
-            )
-            participants = participants_result.scalars().all()
-            participant_ids = [p.telegram_id for p in participants]
-            
-            # Get users with notifications
-            notif_result = await db.execute(
-                select(User).where(User.notifications_enabled == True)
-            )
-            notif_users = notif_result.scalars().all()
-            notif_ids = [u.telegram_id for u in notif_users]
-            
-            # Combine and deduplicate
-            all_user_ids = list(set(participant_ids + notif_ids))
-            
-            # Send notifications to users
-            await TelegramService.notify_raffle_start(
+        if not raffle:
+            logger.error(f"Raffle {raffle_id} not found")
+            return
+        
+        # Participants plus users of the audience segment, deduplicated;
+        # получатели читаются страницами, сессия на время рассылки не держится
+        sent = await TelegramService.notify_raffle_start(
+            raffle_id,
+            page_raffle_recipients(raffle_id, raffle.audience),
+            {
+                "title": raffle.title,
+                "photo_url": raffle.photo_url
+            }
+        )
+        
+        # НОВОЕ: Отправка уведомления в каналы для публикации
+        if raffle.post_channels:
+            await NotificationService.notify_channels_raffle_start(
                 raffle_id,
-                all_user_ids,
-                {
-                    "title": raffle.title,
-                    "photo_url": raffle.photo_url
-                }
+                raffle.title,
+                raffle.photo_url,
+                raffle.post_channels
             )
-            
-            # НОВОЕ: Отправка уведомления в каналы для публикации
-            if raffle.post_channels:
-                await NotificationService.notify_channels_raffle_start(
-                    raffle_id,
-                    raffle.title,
-                    raffle.photo_url,
-                    raffle.post_channels
-                )
-            
-            logger.info(f"Sent raffle start notifications to {len(all_user_ids)} users")
+        
+        logger.info(f"Sent raffle start notifications to {sent} users")
 
     @staticmethod
     async def notify_channels_raffle_start(raffle_id: int, title: str, photo_url: str, channels: List[str]):
         """Уведомление каналов о начале розыгрыша"""
         import os
-        BOT_TOKEN = os.getenv("BOT_TOKEN")
         WEBAPP_URL = os.getenv("WEBAPP_URL")
         
         text = (
@@ -118,7 +224,7 @@ class NotificationService:
         for channel in channels:
             channel = channel.replace('@', '')
             try:
-                url = f"https://api.telegram.org/bot{BOT_TOKEN}/"
+                url = bot_api_url()
                 
                 if photo_url and photo_url.startswith('http'):
                     data = {
@@ -180,74 +286,57 @@ class NotificationService:
             )
             raffle = raffle_result.scalar_one_or_none()
             
-            if not raffle:
-                logger.error(f"Raffle {raffle_id} not found for results notification")
-                return
-            
-            # Format winners text
-            winners_text = "\n".join([
-                f"{w['position']}. @{w['user']['username'] or w['user']['first_name']} - {w['prize']}"
-                for w in sorted(winners, key=lambda x: x['position'])
-            ])
-            
-            # Get users with notifications enabled
-            users_result = await db.execute(
-                select(User).where(User.notifications_enabled == True)
-            )
-            users = users_result.scalars().all()
-            user_ids = [u.telegram_id for u in users]
-            
-            # Also get all participants
-            participants_result = await db.execute(
-                select(User).join(Participant).where(
-                    Participant.raffle_id == raffle_id
-                )
+        if not raffle:
+            logger.error(f"Raffle {raffle_id} not found for results notification")
+            return
+        
+        # Format winners text
+        winners_text = "\n".join([
+            f"{w['position']}. @{w['user']['username'] or w['user']['first_name']} - {w['prize']}"
+            for w in sorted(winners, key=lambda x: x['position'])
+        ])
+        
+        # Send to users
+        keyboard = {
+            "inline_keyboard": [[{
+                "text": "📊 Посмотреть результаты",
+                "web_app": {"url": f"{os.getenv('WEBAPP_URL')}/raffle/{raffle_id}/history"}
+            }]]
+        }
+        
+        text = (
+            f"🎊 **Розыгрыш завершен!**\n\n"
+            f"**{raffle.title}**\n\n"
+            f"🏆 **Победители:**\n{winners_text}\n\n"
+            f"Поздравляем победителей! 🎉"
+        )
+        
+        # Participants plus users of the audience segment, deduplicated
+        # получатели читаются страницами: соединение не держится на время рассылки
+        recipients = page_raffle_recipients(raffle_id, raffle.audience)
+        async for user_id in recipients:
+            await TelegramService.send_notification(
+                user_id,
+                text,
+                raffle.photo_url,
+                keyboard
             )
-            participants = participants_result.scalars().all()
-            participant_ids = [p.telegram_id for p in participants]
-            
-            # Combine and deduplicate
-            all_user_ids = list(set(user_ids + participant_ids))
-            
-            # Send to users
-            keyboard = {
-                "inline_keyboard": [[{
-                    "text": "📊 Посмотреть результаты",
-                    "web_app": {"url": f"{os.getenv('WEBAPP_URL')}/raffle/{raffle_id}/history"}
-                }]]
-            }
-            
-            text = (
-                f"🎊 **Розыгрыш завершен!**\n\n"
-                f"**{raffle.title}**\n\n"
-                f"🏆 **Победители:**\n{winners_text}\n\n"
-                f"Поздравляем победителей! 🎉"
+            await asyncio.sleep(0.05)
+        
+        # Send to post channels
+        if raffle.post_channels:
+            await NotificationService.notify_channels_results(
+                raffle_id,
+                raffle.title,
+                raffle.photo_url,
+                raffle.post_channels,
+                winners_text
             )
-            
-            for user_id in all_user_ids:
-                await TelegramService.send_notification(
-                    user_id,
-                    text,
-                    raffle.photo_url,
-                    keyboard
-                )
-                await asyncio.sleep(0.05)
-            
-            # Send to post channels
-            if raffle.post_channels:
-                await NotificationService.notify_channels_results(
-                    raffle_id,
-                    raffle.title,
-                    raffle.photo_url,
-                    raffle.post_channels,
-                    winners_text
-                )
 
     @staticmethod
     async def notify_channels_results(raffle_id: int, title: str, photo_url: str, channels: List[str], winners_text: str):
         """Notify channels about raffle results"""
         import os
-        BOT_TOKEN = os.getenv("BOT_TOKEN")
         WEBAPP_URL = os.getenv("WEBAPP_URL")
         
         text = (
@@ -269,7 +358,7 @@ class NotificationService:
         for channel in channels:
             channel = channel.replace('@', '')
             try:
-                url = f"https://api.telegram.org/bot{BOT_TOKEN}/"
+                url = bot_api_url()
                 
                 if photo_url and photo_url.startswith('http'):
                     data = {
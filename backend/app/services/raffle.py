@@ -1,18 +1,70 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, delete, or_, and_, func
 from datetime import datetime, timedelta, timezone
 import asyncio
 import logging
+import os
+import time
 
 from ..database import async_session_maker
-from ..models import Raffle, Participant, User
+from ..models import Raffle, Participant, User, DrawState
 from ..services.telegram import TelegramService
+from ..services.membership import MembershipService
 from ..services.notifications import NotificationService
+from ..services.draw_protocol import countdown_event, draw_seconds
+from ..services.draw_state import DrawStateService, DrawOwnershipLost, DRAW_STATE_STALE, new_draw_state
+from ..utils.cache import raffle_snapshots
 from ..websocket_manager import manager
 
 logger = logging.getLogger(__name__)
 
+# Как часто пересылать дедлайн обратного отсчёта (секунды)
+COUNTDOWN_RESYNC_SECONDS = float(os.getenv("COUNTDOWN_RESYNC_SECONDS", "30"))
+
+# Розыгрыши, которые ведёт этот воркер (отсчёт или анимация)
+active_draws = set()
+
 class RaffleService:
+    @staticmethod
+    async def verify_provisional_participants(raffle_id: int = None):
+        """Re-check subscriptions of participants accepted while Telegram was down"""
+        async with async_session_maker() as db:
+            query = (
+                select(Participant.id, User.telegram_id, Raffle.id, Raffle.channels)
+                .select_from(Participant).join(User).join(Raffle)
+            ).where(
+                Participant.subscription_verified == False,
+                Raffle.is_completed == False
+            )
+            if raffle_id is not None:
+                query = query.where(Participant.raffle_id == raffle_id)
+            
+            result = await db.execute(query)
+            rows = result.all()
+        
+        # Telegram опрашивается по одному участнику — соединение на это время не держим
+        removed, verified = [], []
+        for participant_id, telegram_id, participant_raffle_id, channels in rows:
+            statuses = await MembershipService.check_subscriptions(None, telegram_id, channels or [])
+            
+            if any(status is False for status in statuses):
+                # Подписки нет — снимаем условное участие
+                removed.append(participant_id)
+                logger.info(f"Removed unsubscribed participant {telegram_id} from raffle {participant_raffle_id}")
+            elif all(statuses):
+                verified.append(participant_id)
+            # None — Telegram всё ещё недоступен, проверим в следующий раз
+        
+        if removed or verified:
+            async with async_session_maker() as db:
+                if removed:
+                    await db.execute(delete(Participant).where(Participant.id.in_(removed)))
+                if verified:
+                    await db.execute(
+                        update(Participant).where(Participant.id.in_(verified)).values(subscription_verified=True)
+                    )
+                await db.commit()
+
     @staticmethod
     async def check_and_start_draws():
         """Check for raffles that need to start drawing"""
@@ -28,25 +80,51 @@ class RaffleService:
             )
             raffles = result.scalars().all()
             
+            started = []
             for raffle in raffles:
-                # Mark draw as started
-                raffle.draw_started = True
+                # Mark draw as started. Условный UPDATE: при нескольких
+                # воркерах розыгрыш запускает только тот, кто успел первым
+                claimed = await db.execute(
+                    update(Raffle)
+                    .where(Raffle.id == raffle.id, Raffle.draw_started == False)
+                    .values(draw_started=True)
+                )
+                if claimed.rowcount != 1:
+                    await db.commit()
+                    continue
+                # Состояние — в той же транзакции: без строки draw_states
+                # recovery другого воркера сразу забрал бы розыгрыш себе
+                db.add(new_draw_state(raffle.id, time.time() + draw_seconds(raffle.draw_delay_minutes * 60)))
                 await db.commit()
+                started.append(raffle)
+        
+        # Проверки подписок и уведомления ходят в Telegram — без открытой сессии
+        for raffle in started:
+            raffle_snapshots.invalidate(raffle.id)
+            
+            # Telegram на большой аудитории идёт дольше DRAW_STATE_STALE — продлеваем владение
+            async with DrawStateService.heartbeat(raffle.id):
+                # Последняя попытка проверить условно принятых участников
+                await RaffleService.verify_provisional_participants(raffle.id)
                 
-                # Get participants
-                participants_result = await db.execute(
-                    select(User).join(Participant).where(
-                        Participant.raffle_id == raffle.id
+                async with async_session_maker() as db:
+                    # Get participants
+                    count_result = await db.execute(
+                        select(func.count(Participant.id)).where(Participant.raffle_id == raffle.id)
                     )
-                )
-                participants = participants_result.scalars().all()
+                    participants_count = count_result.scalar()
+                    
+                    # Check if we have enough participants
+                    if participants_count < len(raffle.prizes):
+                        # Not enough participants, cancel raffle
+                        await db.execute(
+                            update(Raffle).where(Raffle.id == raffle.id).values(is_active=False, is_completed=True)
+                        )
+                        await DrawStateService.clear(db, raffle.id)
+                        await db.commit()
                 
-                # Check if we have enough participants
-                if len(participants) < len(raffle.prizes):
-                    # Not enough participants, cancel raffle
-                    raffle.is_active = False
-                    raffle.is_completed = True
-                    await db.commit()
+                if participants_count < len(raffle.prizes):
+                    raffle_snapshots.invalidate(raffle.id)
                     
                     # Notify about cancellation
                     logger.warning(f"Raffle {raffle.id} cancelled due to insufficient participants")
@@ -55,52 +133,99 @@ class RaffleService:
                 # Notify users that draw will start
                 await NotificationService.notify_raffle_starting(raffle.id)
                 
-                # Schedule wheel start after delay
-                asyncio.create_task(
-                    RaffleService._start_wheel_after_delay(
-                        raffle.id, 
-                        raffle.draw_delay_minutes
+                # Отсчёт идёт от конца рассылки (на большой аудитории она занимает минуты);
+                # после рестарта отсчёт продолжится с сохранённого дедлайна
+                deadline = time.time() + draw_seconds(raffle.draw_delay_minutes * 60)
+                try:
+                    await DrawStateService.save(raffle.id, phase="countdown", deadline=deadline)
+                except DrawOwnershipLost:
+                    logger.warning(f"Raffle {raffle.id} draw was taken over by another worker")
+                    continue
+            
+            # Schedule wheel start after delay
+            asyncio.create_task(
+                RaffleService._start_wheel_after_delay(raffle.id, deadline)
+            )
+    
+    @staticmethod
+    async def recover_interrupted_draws():
+        """Resume draws left by a stopped worker: draw_started, not completed, state not updated for DRAW_STATE_STALE"""
+        stale_before = time.time() - DRAW_STATE_STALE
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(Raffle.id).outerjoin(DrawState, DrawState.raffle_id == Raffle.id).where(
+                    Raffle.draw_started == True,
+                    Raffle.is_completed == False,
+                    or_(
+                        DrawState.raffle_id.is_(None),
+                        # failed — розыгрыш не может продолжиться, повторять его бессмысленно
+                        and_(DrawState.heartbeat < stale_before, DrawState.phase != "failed")
                     )
                 )
+            )
+            raffle_ids = result.scalars().all()
+        
+        for raffle_id in raffle_ids:
+            if raffle_id in active_draws:
+                continue
+            state = await DrawStateService.claim(raffle_id, stale_before)
+            if state is None:
+                continue
+            
+            logger.warning(f"Recovering interrupted draw of raffle {raffle_id}: phase {state.phase}, round {state.round_seq}")
+            manager.resume_seq(raffle_id, state.event_seq)
+            if state.phase == "countdown":
+                asyncio.create_task(RaffleService._start_wheel_after_delay(raffle_id, state.deadline))
+            else:
+                asyncio.create_task(RaffleService._run_wheel(raffle_id, state))
     
     @staticmethod
-    async def _start_wheel_after_delay(raffle_id: int, delay_minutes: int):
-        """Start wheel after specified delay with countdown"""
+    async def _start_wheel_after_delay(raffle_id: int, deadline: float):
+        """Start wheel at the countdown deadline (epoch seconds)"""
+        active_draws.add(raffle_id)
         try:
-            # Send countdown updates every second
-            total_seconds = delay_minutes * 60
+            # Один countdown_started с дедлайном, дальше только редкие синхронизации:
+            # секунды клиенты отсчитывают сами
+            await manager.broadcast(countdown_event("countdown_started", deadline), raffle_id)
             
-            while total_seconds > 0:
-                # Send countdown to all connected clients
-                await manager.broadcast({
-                    "type": "countdown",
-                    "seconds": total_seconds
-                }, raffle_id)
-                
-                # Wait 1 second
-                await asyncio.sleep(1)
-                total_seconds -= 1
+            while (remaining := deadline - time.time()) > 0:
+                await asyncio.sleep(min(COUNTDOWN_RESYNC_SECONDS, remaining))
+                if not await DrawStateService.touch(raffle_id):
+                    logger.warning(f"Raffle {raffle_id} draw was taken over by another worker, stopping countdown")
+                    return
+                if deadline - time.time() > 1:
+                    await manager.broadcast(countdown_event("countdown", deadline), raffle_id)
             
             # Send final countdown
-            await manager.broadcast({
-                "type": "countdown",
-                "seconds": 0
-            }, raffle_id)
+            await manager.broadcast(countdown_event("countdown", deadline), raffle_id)
             
-            # Start the wheel
+            await RaffleService._run_wheel(raffle_id)
+                    
+        except Exception as e:
+            logger.error(f"Error in wheel delay for raffle {raffle_id}: {e}")
+        finally:
+            active_draws.discard(raffle_id)
+    
+    @staticmethod
+    async def _run_wheel(raffle_id: int, resume: DrawState = None):
+        """Run the wheel; resume — persisted state of an interrupted draw"""
+        active_draws.add(raffle_id)
+        try:
+            # Check if raffle is still active; сессию не держим на всё время анимации
             async with async_session_maker() as db:
-                # Импортируем функцию правильно
-                from ..routers.websocket import run_wheel
-                
-                # Check if raffle is still active
                 result = await db.execute(
-                    select(Raffle).where(Raffle.id == raffle_id)
+                    select(Raffle.id).where(Raffle.id == raffle_id, Raffle.is_completed == False)
                 )
-                raffle = result.scalar_one_or_none()
+                still_active = result.scalar_one_or_none() is not None
+            
+            if still_active:
+                # Импортируем функцию правильно
+                from ..routers.websocket import run_wheel
                 
-                if raffle and not raffle.is_completed:
-                    logger.info(f"Starting wheel for raffle {raffle_id}")
-                    await run_wheel(raffle_id, db)
+                logger.info(f"Starting wheel for raffle {raffle_id}")
+                await run_wheel(raffle_id, resume)
                     
         except Exception as e:
-            logger.error(f"Error in wheel delay for raffle {raffle_id}: {e}")
\ No newline at end of file
+            logger.error(f"Error in wheel for raffle {raffle_id}: {e}")
+        finally:
+            active_draws.discard(raffle_id)
@@ -0,0 +1,143 @@
+"""Per-raffle actors: all live state of one raffle in one object, updated by one task.
+
+Всё, что раньше лежало в отдельных словарях по raffle_id (соединения,
+журнал событий, дедупликация, отсчёт, отчёты других воркеров, состояние
+розыгрыша), принадлежит актору розыгрыша. Сообщения шины приходят в его
+почтовый ящик и обрабатываются по одному, поэтому розыгрыши не делят ни
+блокировок, ни очередей. Супервизор удаляет актор целиком, когда у него не
+осталось зрителей и розыгрыша, — отдельной уборки в каждом словаре нет.
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Set
+import asyncio
+import json
+import logging
+import os
+import time
+
+from .event_log import RaffleEventLog
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд живёт актор без зрителей, розыгрыша и сообщений (журнал незавершённого розыгрыша тоже)
+RAFFLE_ACTOR_TTL = float(os.getenv("RAFFLE_ACTOR_TTL", "3600"))
+
+class RaffleActor:
+    """Live state of one raffle in this worker, owned by its mailbox task"""
+
+    def __init__(self, raffle_id: int, handler: Callable[["RaffleActor", dict, Optional[Dict[str, dict]]], None]):
+        self.raffle_id = raffle_id
+        self.handler = handler
+        self.mailbox: asyncio.Queue = asyncio.Queue()
+        self.connections: Set = set()  # ConnectionRecord зрителей этого воркера
+        self.log: Optional[RaffleEventLog] = None  # события, полученные через шину
+        self.publish_seq = 0  # seq событий, опубликованных этим воркером
+        self.countdown_deadline: Optional[float] = None  # epoch
+        self.delivered: Set[tuple] = set()  # (тип, место) уже разосланных slot_start / winner_confirmed
+        self.update_signal: Optional[asyncio.Event] = None  # HTTP-зрители (SSE, long-poll)
+        self.remote_viewers: Dict[str, tuple] = {}  # воркер → (зрители, время отчёта)
+        self.sent_viewer_count: Optional[int] = None
+        self.reaped = 0  # отключено по таймауту тишины
+        self.draw: Optional[dict] = None  # roster, plan, winners, round_seq розыгрыша, который ведёт этот воркер
+        self.last_active = time.monotonic()
+        self.task = asyncio.create_task(self._run())
+
+    def post(self, message: dict, variants: Optional[Dict[str, dict]] = None):
+        self.last_active = time.monotonic()
+        self.mailbox.put_nowait((message, variants))
+
+    async def _run(self):
+        while True:
+            message, variants = await self.mailbox.get()
+            try:
+                self.handler(self, message, variants)
+            except Exception as e:
+                logger.exception(f"Raffle {self.raffle_id} actor failed on {message.get('type')}: {e}")
+
+    def event_log(self) -> RaffleEventLog:
+        if self.log is None:
+            self.log = RaffleEventLog(self.raffle_id)
+        return self.log
+
+    def signal(self) -> asyncio.Event:
+        if self.update_signal is None:
+            self.update_signal = asyncio.Event()
+        return self.update_signal
+
+    def idle(self, now: float, ttl: float = RAFFLE_ACTOR_TTL) -> bool:
+        """Ни зрителей, ни розыгрыша, ни сообщений; журнал отслужил или актор давно молчит"""
+        if self.connections or self.draw is not None or not self.mailbox.empty():
+            return False
+        if self.log is not None and self.log.expired(now):
+            return True
+        return now - self.last_active >= ttl
+
+    def memory(self) -> dict:
+        """Примерный объём состояния: журнал (JSON) и неотправленные кадры зрителей"""
+        log_bytes = 0
+        log_entries = 0
+        if self.log is not None:
+            for _, message, variants in self.log.entries:
+                log_entries += 1
+                log_bytes += len(json.dumps(message, ensure_ascii=False))
+                for variant in (variants or {}).values():
+                    log_bytes += len(json.dumps(variant, ensure_ascii=False))
+        queued_bytes = sum(
+            entry[2] for record in self.connections if record.queue is not None for entry in record.queue.frames
+        )
+        return {
+            "connections": len(self.connections),
+            "mailbox": self.mailbox.qsize(),
+            "log_entries": log_entries,
+            "log_bytes": log_bytes,
+            "queued_bytes": queued_bytes,
+            "drawing": self.draw is not None,
+            "idle_seconds": round(time.monotonic() - self.last_active, 1)
+        }
+
+    def stop(self):
+        self.task.cancel()
+
+class RaffleSupervisor:
+    """Registry of raffle actors with TTL-based garbage collection"""
+
+    def __init__(self, handler: Callable[[RaffleActor, dict, Optional[Dict[str, dict]]], None]):
+        self.handler = handler
+        self.actors: Dict[int, RaffleActor] = {}
+        self.collected = 0
+
+    def get(self, raffle_id: int) -> Optional[RaffleActor]:
+        return self.actors.get(raffle_id)
+
+    def actor(self, raffle_id: int) -> RaffleActor:
+        """Актор розыгрыша; создаётся при первом обращении"""
+        actor = self.actors.get(raffle_id)
+        if actor is None:
+            actor = self.actors[raffle_id] = RaffleActor(raffle_id, self.handler)
+        return actor
+
+    def __iter__(self) -> Iterator[RaffleActor]:
+        return iter(list(self.actors.values()))
+
+    def collect(self, now: Optional[float] = None) -> List[int]:
+        """Stop and drop idle actors; returns their raffle ids"""
+        now = now or time.monotonic()
+        collected = [raffle_id for raffle_id, actor in self.actors.items() if actor.idle(now)]
+        for raffle_id in collected:
+            self.actors.pop(raffle_id).stop()
+        self.collected += len(collected)
+        return collected
+
+    def memory_report(self) -> dict:
+        raffles = {raffle_id: actor.memory() for raffle_id, actor in self.actors.items()}
+        return {
+            "actors": len(raffles),
+            "collected": self.collected,
+            "log_bytes": sum(r["log_bytes"] for r in raffles.values()),
+            "queued_bytes": sum(r["queued_bytes"] for r in raffles.values()),
+            "raffles": raffles
+        }
+
+    def stop_all(self):
+        for actor in self.actors.values():
+            actor.stop()
+        self.actors.clear()
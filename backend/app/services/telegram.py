@@ -1,7 +1,7 @@
 import aiohttp
 import hashlib
 import hmac
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Union, Iterable, AsyncIterable, AsyncIterator
 import os
 from datetime import datetime, timedelta
 import urllib.parse
@@ -10,13 +10,43 @@ import asyncio
 from functools import lru_cache
 import time
 
+from .circuit_breaker import telegram_breaker
+
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 WEBAPP_URL = os.getenv("WEBAPP_URL", "https://your-app.onrender.com")
 
+# Базовый URL Bot API: можно направить на локальный tools/fake_telegram_api.py
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+# Таймаут одного запроса к Bot API и пауза между повторами (секунды)
+TELEGRAM_REQUEST_TIMEOUT = float(os.getenv("TELEGRAM_REQUEST_TIMEOUT", "3"))
+TELEGRAM_RETRY_DELAY = float(os.getenv("TELEGRAM_RETRY_DELAY", "0.2"))
+# Сколько раз повторять отправку после 429 Too Many Requests
+SEND_RETRY_LIMIT = int(os.getenv("TELEGRAM_SEND_RETRIES", "3"))
+
+def bot_api_url(method: str = "") -> str:
+    """URL метода Bot API"""
+    return f"{TELEGRAM_API_URL}/bot{BOT_TOKEN}/{method}"
+
+def bot_file_url(file_path: str) -> str:
+    """URL для скачивания файла, полученного через getFile"""
+    return f"{TELEGRAM_API_URL}/file/bot{BOT_TOKEN}/{file_path}"
+
 # Кеш для результатов проверки подписки
 subscription_cache: Dict[str, Dict] = {}
 CACHE_TTL = 60  # 60 секунд
 
+# Получатели рассылки: готовый список или поток из БД
+Recipients = Union[Iterable[int], AsyncIterable[int]]
+
+async def iter_recipients(users: Recipients) -> AsyncIterator[int]:
+    """Единый async-итератор по списку или потоку получателей"""
+    if hasattr(users, "__aiter__"):
+        async for user_id in users:
+            yield user_id
+    else:
+        for user_id in users:
+            yield user_id
+
 class TelegramService:
     @staticmethod
     def validate_init_data(init_data: str) -> dict:
@@ -73,6 +103,26 @@ class TelegramService:
     @staticmethod
     async def check_channel_subscription(user_id: int, channel_username: str, retry_count: int = 3) -> bool:
         """Check if user is subscribed to channel with caching and retries"""
+        is_subscribed = await TelegramService.get_subscription_status(
+            user_id,
+            channel_username,
+            retry_count=retry_count
+        )
+        # Если Telegram недоступен, считаем что не подписан
+        return bool(is_subscribed)
+
+    @staticmethod
+    async def get_subscription_status(
+        user_id: int,
+        channel_username: str,
+        timeout: Optional[float] = None,
+        retry_count: int = 3
+    ) -> Optional[bool]:
+        """Check subscription within a latency budget.
+
+        Возвращает True/False, либо None, если Telegram не ответил за timeout
+        секунд или circuit breaker открыт.
+        """
         channel = channel_username.replace('@', '')
         cache_key = f"{user_id}:{channel}"
         
@@ -82,18 +132,28 @@ class TelegramService:
             if time.time() - cached_data['timestamp'] < CACHE_TTL:
                 return cached_data['is_subscribed']
         
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChatMember"
+        url = bot_api_url("getChatMember")
+        deadline = time.monotonic() + (timeout if timeout is not None else retry_count * TELEGRAM_REQUEST_TIMEOUT)
         
         async with aiohttp.ClientSession() as session:
             for attempt in range(retry_count):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                
+                # Telegram деградировал — не ждём, сразу отвечаем "неизвестно"
+                if not telegram_breaker.allow_request():
+                    return None
+                
                 try:
                     async with session.post(url, json={
                         "chat_id": f"@{channel}",
                         "user_id": user_id
-                    }, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    }, timeout=aiohttp.ClientTimeout(total=min(TELEGRAM_REQUEST_TIMEOUT, remaining))) as response:
                         data = await response.json()
                         
                         if data.get("ok"):
+                            telegram_breaker.record_success()
                             status = data["result"]["status"]
                             is_subscribed = status in ["creator", "administrator", "member"]
                             
@@ -108,26 +168,37 @@ class TelegramService:
                         # Если ошибка от API Telegram
                         error_code = data.get("error_code")
                         if error_code == 400:  # Bad Request - канал не существует или бот не админ
+                            telegram_breaker.record_success()
                             print(f"Bot is not admin in channel @{channel} or channel doesn't exist")
                             return False
                         
+                        telegram_breaker.record_failure()
+                        
                 except asyncio.TimeoutError:
+                    telegram_breaker.record_failure()
                     print(f"Timeout checking subscription for user {user_id} in @{channel}, attempt {attempt + 1}/{retry_count}")
                 except Exception as e:
+                    telegram_breaker.record_failure()
                     print(f"Error checking subscription: {e}, attempt {attempt + 1}/{retry_count}")
+                finally:
+                    # CancelledError (wait_for в participate_in_raffle) не проходит
+                    # через except Exception — иначе half-open так и остался бы занят
+                    telegram_breaker.release_trial()
                 
-                # Ждем перед следующей попыткой
+                # Короткая пауза перед следующей попыткой, если бюджет позволяет
                 if attempt < retry_count - 1:
-                    await asyncio.sleep(1)
+                    pause = min(TELEGRAM_RETRY_DELAY, deadline - time.monotonic())
+                    if pause <= 0:
+                        break
+                    await asyncio.sleep(pause)
             
-            # Если все попытки неудачны, считаем что не подписан
-            return False
+            return None
     
     @staticmethod
     async def send_notification(user_id: int, text: str, photo: Optional[str] = None, 
                               keyboard: Optional[dict] = None):
         """Send notification to user"""
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/"
+        url = bot_api_url()
         
         async with aiohttp.ClientSession() as session:
             try:
@@ -150,14 +221,22 @@ class TelegramService:
                 if keyboard:
                     data["reply_markup"] = keyboard
                 
-                async with session.post(url + method, json=data) as response:
-                    return await response.json()
+                for attempt in range(SEND_RETRY_LIMIT + 1):
+                    async with session.post(url + method, json=data) as response:
+                        result = await response.json()
+                    
+                    # Соблюдаем retry_after при превышении лимитов Telegram
+                    retry_after = (result.get("parameters") or {}).get("retry_after")
+                    if result.get("error_code") == 429 and retry_after and attempt < SEND_RETRY_LIMIT:
+                        await asyncio.sleep(retry_after)
+                        continue
+                    return result
             except Exception as e:
                 print(f"Error sending notification: {e}")
                 return None
     
     @staticmethod
-    async def notify_raffle_start(raffle_id: int, users: List[int], raffle_data: dict):
+    async def notify_raffle_start(raffle_id: int, users: Recipients, raffle_data: dict) -> int:
         """Notify users about raffle start"""
         keyboard = {
             "inline_keyboard": [[{
@@ -173,16 +252,19 @@ class TelegramService:
         )
         
         # Используем существующий метод send_notification
-        for user_id in users:
+        sent = 0
+        async for user_id in iter_recipients(users):
             await TelegramService.send_notification(
                 user_id, 
                 text,
                 raffle_data.get('photo_url'),
                 keyboard
             )
+            sent += 1
             await asyncio.sleep(0.05)  # Rate limiting
+        return sent
     @staticmethod
-    async def notify_new_raffle(raffle_id: int, users: List[int], raffle_data: dict):
+    async def notify_new_raffle(raffle_id: int, users: Recipients, raffle_data: dict) -> int:
         """Notify users about new raffle (личные сообщения)"""
         keyboard = {
             "inline_keyboard": [[{
@@ -208,14 +290,47 @@ class TelegramService:
         )
 
         # рассылаем подписчикам
-        for user_id in users:
+        sent = 0
+        async for user_id in iter_recipients(users):
             await TelegramService.send_notification(
                 user_id,
                 text,
                 raffle_data.get("photo_url"),
                 keyboard,
             )
+            sent += 1
             await asyncio.sleep(0.05)  # лёгкий rate‑limit
+        return sent
+
+    @staticmethod
+    async def notify_new_raffles_digest(users: Recipients, raffles: List[dict]) -> int:
+        """Notify users about several new raffles with one message"""
+        keyboard = {
+            "inline_keyboard": [[{
+                "text": f"🎯 {raffle['title']}",
+                "web_app": {"url": f"{WEBAPP_URL}/raffle/{raffle['id']}"}
+            }] for raffle in raffles]
+        }
+
+        raffles_text = "\n\n".join(
+            f"**{raffle['title']}**\n"
+            f"🏆 Призов: {len(raffle['prizes'])}\n"
+            f"⏰ До {raffle.get('end_date', '')}"
+            for raffle in raffles
+        )
+
+        text = (
+            f"🎉 **Новые розыгрыши: {len(raffles)}**\n\n"
+            f"{raffles_text}\n\n"
+            "Выберите розыгрыш, чтобы участвовать!"
+        )
+
+        sent = 0
+        async for user_id in iter_recipients(users):
+            await TelegramService.send_notification(user_id, text, None, keyboard)
+            sent += 1
+            await asyncio.sleep(0.05)
+        return sent
 
     
     @staticmethod
@@ -0,0 +1,52 @@
+"""Wire encodings of live draw frames, chosen by the ?encoding= query parameter.
+
+json — как раньше, текстовые кадры (по умолчанию).
+columnar — тот же JSON, но списки участников передаются колонками
+({"columns": {"id": [...], "username": [...], ...}}) без повторяющихся ключей.
+msgpack — бинарные кадры MessagePack со списками в колонках; нужен пакет msgpack.
+
+Поверх любой кодировки uvicorn согласует permessage-deflate
+(--ws-per-message-deflate, по умолчанию включено).
+"""
+from typing import Optional, Union
+import json
+
+try:
+    import msgpack
+except ImportError:  # msgpack — необязательная зависимость
+    msgpack = None
+
+DEFAULT_ENCODING = "json"
+# Поля с упорядоченными списками участников
+COLUMNAR_FIELDS = ("participants", "roster")
+PARTICIPANT_COLUMNS = ("id", "username", "first_name", "last_name")
+
+def available_encodings() -> tuple:
+    if msgpack is None:
+        return ("json", "columnar")
+    return ("json", "columnar", "msgpack")
+
+def normalize_encoding(value: Optional[str]) -> str:
+    return value if value in available_encodings() else DEFAULT_ENCODING
+
+def to_columnar(message: dict) -> dict:
+    """Replace participant lists with column arrays"""
+    converted = dict(message)
+    for field in COLUMNAR_FIELDS:
+        rows = message.get(field)
+        if isinstance(rows, list) and rows and isinstance(rows[0], dict):
+            converted[field] = {
+                "columns": {column: [row.get(column) for row in rows] for column in PARTICIPANT_COLUMNS}
+            }
+    # participant_ids дублирует колонку id
+    if isinstance(converted.get("participants"), dict):
+        converted.pop("participant_ids", None)
+    return converted
+
+def encode_frame(message: dict, encoding: str = DEFAULT_ENCODING) -> Union[str, bytes]:
+    """Text frame for json/columnar, binary frame for msgpack"""
+    if encoding == "msgpack":
+        return msgpack.packb(to_columnar(message), use_bin_type=True)
+    if encoding == "columnar":
+        message = to_columnar(message)
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
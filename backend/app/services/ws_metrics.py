@@ -0,0 +1,111 @@
+"""Live WebSocket metrics of one worker: traffic, send latency and evictions per raffle.
+
+Зрители считаются в ConnectionManager (с учётом других воркеров), здесь —
+то, что нужно для оценки нагрузки: сколько сообщений и байт ушло, за сколько
+кадр доходит от постановки в очередь до сокета и сколько клиентов отключено.
+"""
+from bisect import bisect_left
+from typing import Dict, Optional
+
+# Границы корзин гистограмм задержки, миллисекунды
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; quantiles are bucket upper bounds"""
+
+    __slots__ = ("counts", "count", "sum_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        buckets = {f"le_{bound}": n for bound, n in zip(LATENCY_BUCKETS_MS, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum_ms / self.count, 2) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": buckets
+        }
+
+class RaffleMetrics:
+    __slots__ = ("messages_sent", "bytes_sent", "evictions", "peak_viewers", "send_latency", "fanout_latency")
+
+    def __init__(self):
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.evictions: Dict[str, int] = {}
+        self.peak_viewers = 0
+        self.send_latency = LatencyHistogram()  # постановка в очередь → кадр записан в сокет
+        self.fanout_latency = LatencyHistogram()  # раскладка одного сообщения по очередям
+
+    def to_dict(self) -> dict:
+        return {
+            "messages_sent": self.messages_sent,
+            "bytes_sent": self.bytes_sent,
+            "evictions": dict(self.evictions),
+            "peak_viewers": self.peak_viewers,
+            "send_latency": self.send_latency.to_dict(),
+            "fanout_latency": self.fanout_latency.to_dict()
+        }
+
+class WebSocketMetrics:
+    """Per-raffle and worker-wide counters"""
+
+    def __init__(self):
+        self.raffles: Dict[int, RaffleMetrics] = {}
+        self.total = RaffleMetrics()
+
+    def for_raffle(self, raffle_id: int) -> RaffleMetrics:
+        metrics = self.raffles.get(raffle_id)
+        if metrics is None:
+            metrics = self.raffles[raffle_id] = RaffleMetrics()
+        return metrics
+
+    def record_send(self, raffle_id: int, size: int, latency_ms: float):
+        for metrics in (self.for_raffle(raffle_id), self.total):
+            metrics.messages_sent += 1
+            metrics.bytes_sent += size
+            metrics.send_latency.observe(latency_ms)
+
+    def record_fanout(self, raffle_id: int, latency_ms: float):
+        self.for_raffle(raffle_id).fanout_latency.observe(latency_ms)
+        self.total.fanout_latency.observe(latency_ms)
+
+    def record_eviction(self, raffle_id: int, reason: str):
+        for metrics in (self.for_raffle(raffle_id), self.total):
+            metrics.evictions[reason] = metrics.evictions.get(reason, 0) + 1
+
+    def record_viewers(self, raffle_id: int, viewers: int, worker_viewers: int):
+        metrics = self.for_raffle(raffle_id)
+        metrics.peak_viewers = max(metrics.peak_viewers, viewers)
+        self.total.peak_viewers = max(self.total.peak_viewers, worker_viewers)
+
+    def forget(self, raffle_id: int):
+        self.raffles.pop(raffle_id, None)
+
+# Глобальный экземпляр на воркер
+ws_metrics = WebSocketMetrics()
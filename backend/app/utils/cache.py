@@ -1,8 +1,13 @@
 import json
-from typing import List, Dict, Optional
+from typing import Awaitable, Callable, List, Dict, Optional
 import asyncio
+import os
+import time
 from datetime import datetime, timedelta
 
+# Сколько секунд живёт снимок розыгрыша для рукопожатия WebSocket (0 — не кешировать)
+RAFFLE_SNAPSHOT_TTL = float(os.getenv("RAFFLE_SNAPSHOT_TTL", "30"))
+
 class ParticipantsCache:
     """Кеш для участников розыгрыша"""
     
@@ -37,4 +42,78 @@ class ParticipantsCache:
                 del self._cache[raffle_id]
 
 # Глобальный экземпляр кеша
-participants_cache = ParticipantsCache()
\ No newline at end of file
+participants_cache = ParticipantsCache()
+
+class RaffleSnapshotCache:
+    """Кеш метаданных розыгрыша для рукопожатия WebSocket.
+
+    Пока снимок загружается, остальные подключения ждут тот же запрос
+    (single-flight), поэтому шторм переподключений даёт один SELECT на розыгрыш.
+    Отсутствующий розыгрыш не кешируется: перебор id анонимными запросами
+    не должен раздувать кеш; истёкшие снимки вычищаются раз в TTL.
+    """
+
+    def __init__(self, ttl_seconds: float = RAFFLE_SNAPSHOT_TTL):
+        self._cache: Dict[int, Dict] = {}
+        self._loading: Dict[int, asyncio.Task] = {}
+        self._stale: set = set()
+        self._ttl = ttl_seconds
+        self._swept_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, raffle_id: int, loader: Callable[[int], Awaitable[Optional[Dict]]]) -> Optional[Dict]:
+        """Снимок из кеша или из loader(raffle_id), один вызов на всех ждущих"""
+        entry = self._cache.get(raffle_id)
+        if entry is not None and time.monotonic() < entry['expires']:
+            self.hits += 1
+            return entry['data']
+
+        task = self._loading.get(raffle_id)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._load(raffle_id, loader))
+            self._loading[raffle_id] = task
+        else:
+            self.hits += 1
+        # отключившийся клиент не должен отменять загрузку для остальных
+        return await asyncio.shield(task)
+
+    async def _load(self, raffle_id: int, loader) -> Optional[Dict]:
+        try:
+            data = await loader(raffle_id)
+        finally:
+            self._loading.pop(raffle_id, None)
+        if raffle_id in self._stale:
+            # состояние поменялось во время загрузки — результат мог устареть
+            self._stale.discard(raffle_id)
+        elif self._ttl > 0 and data is not None:
+            now = time.monotonic()
+            self._sweep(now)
+            self._cache[raffle_id] = {
+                'data': data,
+                'expires': now + self._ttl
+            }
+        return data
+
+    def _sweep(self, now: float):
+        """Удалить истёкшие снимки (не чаще раза в TTL)"""
+        if now - self._swept_at < self._ttl:
+            return
+        self._swept_at = now
+        for raffle_id in [key for key, entry in self._cache.items() if entry['expires'] <= now]:
+            del self._cache[raffle_id]
+
+    def invalidate(self, raffle_id: int):
+        """Сбросить снимок после изменения розыгрыша"""
+        self._cache.pop(raffle_id, None)
+        if raffle_id in self._loading:
+            self._stale.add(raffle_id)
+
+# Снимки розыгрышей для рукопожатия WebSocket
+raffle_snapshots = RaffleSnapshotCache()
+# Сохранённые победители (winner_confirmed) для снимков переподключившихся клиентов:
+# после рестарта журнала нет, и шторм переподключений даёт один запрос на розыгрыш
+raffle_winner_events = RaffleSnapshotCache()
+# Список раунда с ETag для /roster: меняется только между раундами
+raffle_rosters = RaffleSnapshotCache()
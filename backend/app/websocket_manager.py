@@ -1,84 +1,536 @@
 from fastapi import WebSocket
-from typing import Dict, List, Set
+from typing import Deque, Dict, List, Optional, Set, Union
+from collections import deque
 import logging
 import asyncio
+import itertools
+import os
+import socket
+import time
+
+from .services.event_bus import create_bus
+from .services.draw_protocol import DEFAULT_PROTOCOL, countdown_event
+from .services.wire_encoding import DEFAULT_ENCODING, encode_frame
+from .services.event_log import RaffleEventLog, EPHEMERAL_TYPES
+from .services.ws_metrics import ws_metrics
+from .services.raffle_actor import RaffleActor, RaffleSupervisor
+from .utils.cache import raffle_snapshots, raffle_winner_events, raffle_rosters
 
 logger = logging.getLogger(__name__)
 
+# Сколько секунд ждём отправку одному клиенту, прежде чем отключить его
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# Сколько незаменяемых сообщений может ждать отправки одному клиенту
+WS_QUEUE_LIMIT = int(os.getenv("WS_QUEUE_LIMIT", "64"))
+# Как часто сервер пингует молчащих клиентов и проверяет соединения (секунды)
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "25"))
+# Сколько секунд без сообщений от клиента до отключения (полуоткрытые соединения)
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "75"))
+# Типы сообщений, для которых важно только последнее значение
+COALESCE_TYPES = {"countdown", "viewer_count", "ping"}
+# Как часто зрителям рассылается число зрителей (не чаще; только при изменении)
+VIEWER_COUNT_INTERVAL = float(os.getenv("VIEWER_COUNT_INTERVAL", "5"))
+# Воркер в отчётах о числе зрителей
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+# После этих событий снимок розыгрыша для рукопожатия устарел (во всех воркерах)
+SNAPSHOT_INVALIDATING_TYPES = {"countdown_started", "raffle_starting", "raffle_complete", "error"}
+# После них меняется список объявленных победителей
+WINNERS_INVALIDATING_TYPES = {"raffle_starting", "winner_confirmed", "raffle_complete"}
+
+def encode_message(message: dict) -> str:
+    """JSON-кадр в том же формате, что и WebSocket.send_json"""
+    return encode_frame(message, DEFAULT_ENCODING)
+
+# ID соединений в пределах процесса
+_connection_ids = itertools.count(1)
+
+class ConnectionRecord:
+    """One viewer connection: socket, negotiated format, outbound queue and counters"""
+    
+    __slots__ = (
+        "id", "websocket", "raffle_id", "protocol", "encoding",
+        "connected_at", "bytes_sent", "last_pong", "queue"
+    )
+    
+    def __init__(self, websocket: WebSocket, raffle_id: int, protocol: str, encoding: str):
+        self.id = next(_connection_ids)
+        self.websocket = websocket
+        self.raffle_id = raffle_id
+        self.protocol = protocol
+        self.encoding = encoding
+        self.connected_at = time.monotonic()
+        self.bytes_sent = 0
+        self.last_pong = self.connected_at  # последнее сообщение от клиента
+        self.queue: Optional["OutboundQueue"] = None
+
+def frame_size(frame: Union[str, bytes]) -> int:
+    return len(frame) if isinstance(frame, bytes) else len(frame.encode())
+
+class OutboundQueue:
+    """Bounded outbound queue of one connection, drained by its own writer task.
+
+    Заменяемые сообщения (countdown, viewer_count) не копятся: новое значение
+    перезаписывает ещё не отправленное. Переполнение очереди остальных
+    сообщений означает, что клиент не успевает, и он отключается.
+    """
+    
+    __slots__ = ("record", "frames", "pending", "backlog", "wakeup", "on_evict", "task")
+
+    def __init__(self, record: ConnectionRecord, on_evict):
+        self.record = record
+        self.frames: Deque[list] = deque()  # [message_type, frame, size, enqueued_at]
+        self.pending: Dict[str, list] = {}  # заменяемый тип → запись в очереди
+        self.backlog = 0  # незаменяемые сообщения в очереди
+        self.wakeup = asyncio.Event()
+        self.on_evict = on_evict
+        self.task = asyncio.create_task(self._run())
+
+    def put(self, message_type: Optional[str], frame: Union[str, bytes], size: Optional[int] = None) -> bool:
+        """Enqueue a frame; False if the connection has fallen too far behind"""
+        if size is None:
+            size = frame_size(frame)
+        if message_type in COALESCE_TYPES:
+            entry = self.pending.get(message_type)
+            if entry is not None:
+                entry[1] = frame
+                entry[2] = size
+                return True
+            entry = [message_type, frame, size, time.monotonic()]
+            self.pending[message_type] = entry
+        else:
+            if self.backlog >= WS_QUEUE_LIMIT:
+                return False
+            self.backlog += 1
+            entry = [message_type, frame, size, time.monotonic()]
+        
+        self.frames.append(entry)
+        self.wakeup.set()
+        return True
+
+    async def _run(self):
+        record = self.record
+        websocket = record.websocket
+        try:
+            while True:
+                if not self.frames:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                
+                message_type, frame, size, enqueued_at = self.frames.popleft()
+                if message_type in COALESCE_TYPES:
+                    self.pending.pop(message_type, None)
+                else:
+                    self.backlog -= 1
+                
+                # asyncio.timeout, в отличие от wait_for, не теряет отмену задачи
+                async with asyncio.timeout(WS_SEND_TIMEOUT):
+                    if isinstance(frame, bytes):
+                        await websocket.send_bytes(frame)
+                    else:
+                        await websocket.send_text(frame)
+                record.bytes_sent += size
+                ws_metrics.record_send(record.raffle_id, size, (time.monotonic() - enqueued_at) * 1000)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.on_evict(record, "send timeout")
+        except Exception as e:
+            if "ConnectionClosedOK" not in str(type(e).__name__):
+                logger.debug(f"Broadcast error: {e}")
+            self.on_evict(record, None)
+
+    def close(self):
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-        self.connection_ids: Dict[WebSocket, str] = {}
-        self.message_cache: Dict[str, Set[str]] = {}  # Кеш обработанных сообщений
-        self.lock = asyncio.Lock()
+        # websocket → запись; всё остальное по розыгрышу принадлежит его актору
+        self.records: Dict[WebSocket, ConnectionRecord] = {}
+        self.actors = RaffleSupervisor(self._handle)
+        self.bus = create_bus()
+        self._reaper: Optional[asyncio.Task] = None
+        self._viewer_counter: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Subscribe to the bus and start the heartbeat; call once per worker on startup"""
+        await self.bus.start(self.deliver_local)
+        self._reaper = asyncio.create_task(self._heartbeat())
+        self._viewer_counter = asyncio.create_task(self._count_viewers())
     
-    async def connect(self, websocket: WebSocket, raffle_id: int):
+    async def stop(self):
+        for task in (self._reaper, self._viewer_counter):
+            if task is not None:
+                task.cancel()
+        self._reaper = self._viewer_counter = None
+        await self.bus.stop()
+        for websocket, record in list(self.records.items()):
+            self.disconnect(websocket, record.raffle_id)
+        self.actors.stop_all()
+    
+    async def connect(
+        self,
+        websocket: WebSocket,
+        raffle_id: int,
+        protocol: str = DEFAULT_PROTOCOL,
+        encoding: str = DEFAULT_ENCODING
+    ) -> ConnectionRecord:
         await websocket.accept()
         
-        async with self.lock:
-            if raffle_id not in self.active_connections:
-                self.active_connections[raffle_id] = []
-                self.message_cache[f"raffle_{raffle_id}"] = set()
-            
-            self.active_connections[raffle_id].append(websocket)
-            
-            # Генерируем уникальный ID соединения
-            import uuid
-            connection_id = str(uuid.uuid4())
-            self.connection_ids[websocket] = connection_id
-            
-            logger.info(f"Client {connection_id} connected to raffle {raffle_id}")
-    
-    def disconnect(self, websocket: WebSocket, raffle_id: int):
-        if raffle_id in self.active_connections:
-            self.active_connections[raffle_id].remove(websocket)
-            if not self.active_connections[raffle_id]:
-                del self.active_connections[raffle_id]
-                # Очищаем кеш сообщений
-                cache_key = f"raffle_{raffle_id}"
-                if cache_key in self.message_cache:
-                    del self.message_cache[cache_key]
-        
-        if websocket in self.connection_ids:
-            connection_id = self.connection_ids[websocket]
-            del self.connection_ids[websocket]
-            logger.info(f"Client {connection_id} disconnected from raffle {raffle_id}")
-    
-    async def broadcast(self, message: dict, raffle_id: int):
-        """Broadcast with deduplication"""
-        if raffle_id in self.active_connections:
-            # Создаем уникальный ключ для сообщения
-            import json
-            import hashlib
-            
-            message_key = None
-            if message.get("type") in ["winner_confirmed", "slot_start"]:
-                # Для критичных сообщений создаем ключ
-                content = f"{message.get('type')}_{message.get('position')}_{raffle_id}"
-                message_key = hashlib.md5(content.encode()).hexdigest()
-                
-                cache_key = f"raffle_{raffle_id}"
-                if message_key in self.message_cache.get(cache_key, set()):
-                    logger.info(f"Skipping duplicate broadcast: {message_key}")
-                    return
-                
-                # Добавляем в кеш
-                if cache_key not in self.message_cache:
-                    self.message_cache[cache_key] = set()
-                self.message_cache[cache_key].add(message_key)
+        # Дальше без await: регистрация атомарна для event loop
+        record = ConnectionRecord(websocket, raffle_id, protocol, encoding)
+        record.queue = OutboundQueue(record, self._evict)
+        
+        actor = self.actors.actor(raffle_id)
+        actor.connections.add(record)
+        actor.last_active = time.monotonic()
+        self.records[websocket] = record
+        ws_metrics.record_viewers(raffle_id, self.total_viewers(raffle_id), len(self.records))
+        
+        logger.info(f"Client {record.id} connected to raffle {raffle_id}")
+        return record
+    
+    def disconnect(self, websocket: WebSocket, raffle_id: int = None):
+        """Unregister a connection; safe to call more than once"""
+        record = self.records.pop(websocket, None)
+        if record is None:
+            return
+        
+        raffle_id = record.raffle_id
+        actor = self.actors.get(raffle_id)
+        if actor is not None:
+            actor.connections.discard(record)
+            actor.last_active = time.monotonic()
+            if not actor.connections:
+                actor.sent_viewer_count = None
+        
+        record.queue.close()
+        logger.info(f"Client {record.id} disconnected from raffle {raffle_id}")
+    
+    def touch(self, websocket: WebSocket):
+        """Клиент прислал сообщение (в том числе pong) — соединение живо"""
+        record = self.records.get(websocket)
+        if record is not None:
+            record.last_pong = time.monotonic()
+    
+    def local_viewers(self, raffle_id: int) -> int:
+        actor = self.actors.get(raffle_id)
+        return len(actor.connections) if actor is not None else 0
+    
+    def published_seq(self, raffle_id: int) -> int:
+        """seq последнего события, опубликованного этим воркером"""
+        actor = self.actors.get(raffle_id)
+        return actor.publish_seq if actor is not None else 0
+    
+    def resume_seq(self, raffle_id: int, seq: int):
+        """Продолжить нумерацию прерванного розыгрыша, а не начинать с 1.
+        
+        Клиенты, пережившие рестарт воркера, отбрасывают события с seq не
+        больше уже виденного — иначе возобновлённый розыгрыш для них «замирает».
+        """
+        actor = self.actors.actor(raffle_id)
+        log_seq = actor.log.last_seq if actor.log is not None else 0
+        actor.publish_seq = max(actor.publish_seq, log_seq, seq or 0)
+    
+    async def broadcast(self, message: dict, raffle_id: int, variants: Optional[Dict[str, dict]] = None):
+        """Publish to the raffle channel; every worker delivers to its own viewers.
+        
+        variants — версии сообщения для клиентов с другим протоколом ({"delta": {...}}),
+        остальные получают message. Событиям розыгрыша присваивается seq
+        для журнала и переподключения клиентов (resume_from).
+        """
+        if message.get("type") not in EPHEMERAL_TYPES:
+            actor = self.actors.actor(raffle_id)
+            actor.publish_seq += 1
+            seq = actor.publish_seq
+            if message.get("type") == "raffle_complete":
+                actor.publish_seq = 0
+            # ts — время публикации (epoch ms), клиенты и ws_loadtest считают по нему задержку доставки
+            stamp = {"seq": seq, "ts": int(time.time() * 1000)}
+            message = {**message, **stamp}
+            if variants:
+                variants = {name: {**variant, **stamp} for name, variant in variants.items()}
+        
+        try:
+            await self.bus.publish(raffle_id, message, variants)
+        except Exception as e:
+            logger.error(f"Failed to publish {message.get('type')} for raffle {raffle_id}: {e}")
+    
+    async def deliver_local(self, raffle_id: int, message: dict, variants: Optional[Dict[str, dict]] = None):
+        """Hand a bus message to the raffle actor; it updates the state and fans out in order"""
+        if message.get("type") == "viewer_report":
+            # Отчёт другого воркера нужен только тем, у кого есть свои зрители розыгрыша
+            actor = self.actors.get(raffle_id)
+            if actor is not None and message.get("worker") != WORKER_ID:
+                actor.post(message)
+            return
+        self.actors.actor(raffle_id).post(message, variants)
+    
+    def _handle(self, actor: RaffleActor, message: dict, variants: Optional[Dict[str, dict]]):
+        """Одно сообщение шины в задаче актора розыгрыша"""
+        raffle_id = actor.raffle_id
+        message_type = message.get("type")
+        if message_type == "viewer_report":
+            actor.remote_viewers[message["worker"]] = (message["viewers"], time.monotonic())
+            return
+        if message_type in ("countdown_started", "countdown") and message.get("seconds"):
+            if "deadline_ms" in message:
+                actor.countdown_deadline = message["deadline_ms"] / 1000
+        elif message_type in ("countdown", "raffle_starting", "raffle_complete", "error"):
+            actor.countdown_deadline = None
+        if message_type in SNAPSHOT_INVALIDATING_TYPES:
+            raffle_snapshots.invalidate(raffle_id)
+        if message_type in WINNERS_INVALIDATING_TYPES:
+            raffle_winner_events.invalidate(raffle_id)
+        if message_type in WINNERS_INVALIDATING_TYPES or message_type in SNAPSHOT_INVALIDATING_TYPES:
+            # новый раунд (или закрыт приём заявок) — список раунда другой
+            raffle_rosters.invalidate(raffle_id)
+        
+        if "seq" in message and actor.log is not None and message["seq"] <= actor.log.last_seq:
+            # Воркер, который ведёт розыгрыш, перезапустился: раунды могут повториться
+            actor.delivered.clear()
+        
+        if message_type in ("winner_confirmed", "slot_start"):
+            # Критичные сообщения не рассылаем дважды
+            message_key = (message_type, message.get("position"))
+            if message_key in actor.delivered:
+                logger.info(f"Skipping duplicate broadcast: {message_type} position {message.get('position')} of raffle {raffle_id}")
+                return
+            actor.delivered.add(message_key)
+        
+        if "seq" in message:
+            actor.event_log().append(message["seq"], message, variants)
+        
+        if actor.update_signal is not None:
+            actor.update_signal.set()
+            actor.update_signal = None
+        
+        if actor.connections:
+            # Кодируем один раз на пару (протокол, кодировка), клиентам с одной
+            # парой уходит один и тот же кадр
+            variants = variants or {}
+            frames: Dict[tuple, tuple] = {}
             
-            disconnected = []
-            for connection in self.active_connections[raffle_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    if "ConnectionClosedOK" not in str(type(e).__name__):
-                        logger.debug(f"Broadcast error: {e}")
-                    disconnected.append(connection)
+            # Только ставим в очереди соединений — отправляют их writer-задачи,
+            # поэтому медленный клиент не задерживает ни других, ни run_wheel
+            started = time.perf_counter()
+            overflowed = []
+            for record in actor.connections:
+                key = (record.protocol, record.encoding)
+                encoded = frames.get(key)
+                if encoded is None:
+                    frame = encode_frame(variants.get(record.protocol, message), record.encoding)
+                    encoded = frames[key] = (frame, frame_size(frame))
+                if not record.queue.put(message_type, *encoded):
+                    overflowed.append(record)
+            ws_metrics.record_fanout(raffle_id, (time.perf_counter() - started) * 1000)
             
-            # Remove disconnected clients
-            for conn in disconnected:
-                self.disconnect(conn, raffle_id)
+            for record in overflowed:
+                self._evict(record, "queue overflow")
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(WS_PING_INTERVAL)
+            try:
+                self.reap_idle()
+                self.collect_actors()
+            except Exception as e:
+                logger.error(f"WebSocket heartbeat error: {e}")
+    
+    def reap_idle(self, now: Optional[float] = None) -> int:
+        """Ping quiet clients and drop the ones silent for WS_IDLE_TIMEOUT.
+        
+        Клиент, пропавший без close-кадра (мобильная сеть), иначе висит в
+        соединениях розыгрыша до первой неудачной отправки.
+        """
+        now = now or time.monotonic()
+        pings: Dict[str, tuple] = {}
+        reaped = 0
+        for record in list(self.records.values()):
+            idle = now - record.last_pong
+            if idle >= WS_IDLE_TIMEOUT:
+                actor = self.actors.get(record.raffle_id)
+                if actor is not None:
+                    actor.reaped += 1
+                self._evict(record, "idle timeout")
+                reaped += 1
+            elif idle >= WS_PING_INTERVAL:
+                encoded = pings.get(record.encoding)
+                if encoded is None:
+                    frame = encode_frame({"type": "ping", "server_time_ms": int(time.time() * 1000)}, record.encoding)
+                    encoded = pings[record.encoding] = (frame, frame_size(frame))
+                record.queue.put("ping", *encoded)
+        return reaped
+    
+    def total_viewers(self, raffle_id: int) -> int:
+        """WebSocket viewers of the raffle across workers (others by their last reports)"""
+        actor = self.actors.get(raffle_id)
+        if actor is None:
+            return 0
+        return len(actor.connections) + sum(count for count, _ in actor.remote_viewers.values())
+    
+    async def _count_viewers(self):
+        while True:
+            await asyncio.sleep(VIEWER_COUNT_INTERVAL)
+            try:
+                await self.report_viewers()
+            except Exception as e:
+                logger.error(f"Viewer count error: {e}")
+    
+    async def report_viewers(self):
+        """Publish this worker's viewer counts and push changed totals as viewer_count.
+        
+        Не чаще раза в VIEWER_COUNT_INTERVAL и только при изменении; в очереди
+        клиента viewer_count заменяет неотправленное значение.
+        """
+        now = time.monotonic()
+        stale = now - 3 * VIEWER_COUNT_INTERVAL
+        live = []
+        for actor in self.actors:
+            for worker, (_, reported_at) in list(actor.remote_viewers.items()):
+                if reported_at < stale:
+                    del actor.remote_viewers[worker]
+            if actor.connections:
+                live.append(actor)
+        
+        for actor in live:
+            await self.bus.publish(actor.raffle_id, {"type": "viewer_report", "worker": WORKER_ID, "viewers": len(actor.connections)})
+        
+        for actor in live:
+            total = self.total_viewers(actor.raffle_id)
+            ws_metrics.record_viewers(actor.raffle_id, total, len(self.records))
+            if actor.sent_viewer_count != total:
+                actor.sent_viewer_count = total
+                await self.deliver_local(actor.raffle_id, {"type": "viewer_count", "count": total})
+    
+    def metrics_report(self) -> dict:
+        """Viewers and traffic metrics of this worker, per raffle and in total"""
+        raffles = {}
+        live = {actor.raffle_id for actor in self.actors if actor.connections}
+        for raffle_id in live | set(ws_metrics.raffles):
+            metrics = ws_metrics.raffles.get(raffle_id)
+            raffles[raffle_id] = {
+                "viewers": self.total_viewers(raffle_id),
+                "local_viewers": self.local_viewers(raffle_id),
+                **(metrics.to_dict() if metrics is not None else {})
+            }
+        return {
+            "worker": WORKER_ID,
+            "local_viewers": len(self.records),
+            "total": ws_metrics.total.to_dict(),
+            "raffles": raffles
+        }
+    
+    def collect_actors(self, now: Optional[float] = None) -> List[int]:
+        """Drop actors without viewers or a draw whose log expired or that stayed idle for RAFFLE_ACTOR_TTL"""
+        collected = self.actors.collect(now)
+        for raffle_id in collected:
+            ws_metrics.forget(raffle_id)
+        if collected:
+            logger.info(f"Collected raffle actors: {collected}")
+        return collected
+    
+    def connection_gauges(self) -> Dict[int, dict]:
+        """Live / idle / reaped connections per raffle in this worker"""
+        now = time.monotonic()
+        gauges = {}
+        for actor in self.actors:
+            if not actor.connections and not actor.reaped:
+                continue
+            idle = sum(1 for record in actor.connections if now - record.last_pong >= WS_PING_INTERVAL)
+            gauges[actor.raffle_id] = {"live": len(actor.connections) - idle, "idle": idle, "reaped": actor.reaped}
+        return gauges
+    
+    def _log(self, raffle_id: int) -> Optional[RaffleEventLog]:
+        actor = self.actors.get(raffle_id)
+        return actor.log if actor is not None else None
+    
+    def round_seq(self, raffle_id: int) -> int:
+        """Последний round_seq розыгрыша: он может идти в другом воркере"""
+        log = self._log(raffle_id)
+        return log.round_seq if log is not None else 0
+    
+    def last_seq(self, raffle_id: int) -> int:
+        log = self._log(raffle_id)
+        return log.last_seq if log is not None else 0
+    
+    def revealed_positions(self, raffle_id: int) -> Set[int]:
+        """Места, победители которых уже объявлены (winner_confirmed в журнале)"""
+        log = self._log(raffle_id)
+        return set(log.winners) if log is not None else set()
+    
+    def countdown_sync(self, raffle_id: int) -> Optional[dict]:
+        """Текущий обратный отсчёт для только что подключившегося клиента"""
+        actor = self.actors.get(raffle_id)
+        deadline = actor.countdown_deadline if actor is not None else None
+        if deadline is None or deadline <= time.time():
+            return None
+        return countdown_event("countdown", deadline)
+    
+    def events_since(self, raffle_id: int, after_seq: int, protocol: str = DEFAULT_PROTOCOL) -> Optional[List[dict]]:
+        """Logged events after after_seq in the given protocol, None if a snapshot is needed"""
+        log = self._log(raffle_id)
+        if log is None:
+            return [] if after_seq == 0 else None
+        entries = log.since(after_seq)
+        if entries is None:
+            return None
+        return [(variants or {}).get(protocol, message) for _, message, variants in entries]
+    
+    def snapshot(self, raffle_id: int, protocol: str = DEFAULT_PROTOCOL, db_winners: Optional[List[dict]] = None) -> dict:
+        log = self._log(raffle_id) or RaffleEventLog(raffle_id)
+        return log.snapshot(protocol, db_winners)
+    
+    def update_signal(self, raffle_id: int) -> asyncio.Event:
+        """Event set by the next bus message of the raffle (SSE, long-poll).
+        
+        Брать до чтения журнала: сообщение, пришедшее между чтением и
+        ожиданием, всё равно разбудит ждущего.
+        """
+        return self.actors.actor(raffle_id).signal()
+    
+    def needs_snapshot(self, raffle_id: int, resume_from: int) -> bool:
+        log = self._log(raffle_id)
+        return log is None or log.since(resume_from) is None
+    
+    def replay(self, websocket: WebSocket, raffle_id: int, resume_from: int, db_winners: Optional[List[dict]] = None):
+        """Send the events missed since resume_from, or a snapshot if the gap is too big.
+        
+        Вызывать сразу после connect, без await между ними: тогда новые события
+        гарантированно встанут в очередь после воспроизведённых.
+        """
+        record = self.records.get(websocket)
+        if record is None:
+            return
+        
+        events = self.events_since(raffle_id, resume_from, record.protocol)
+        if events is None:
+            self.send_personal(self.snapshot(raffle_id, record.protocol, db_winners), websocket)
+            return
+        
+        for message in events:
+            self.send_personal(message, websocket)
+    
+    def send_personal(self, message: dict, websocket: WebSocket):
+        """Сообщение одному клиенту через его очередь, чтобы не нарушать порядок"""
+        record = self.records.get(websocket)
+        if record is not None and not record.queue.put(message.get("type"), encode_frame(message, record.encoding)):
+            self._evict(record, "queue overflow")
+
+    def _evict(self, record: ConnectionRecord, reason: Optional[str]):
+        """Disconnect a client that cannot keep up or whose socket failed"""
+        if reason:
+            logger.info(f"Evicting client {record.id}: {reason}")
+            ws_metrics.record_eviction(record.raffle_id, reason)
+            asyncio.create_task(self._close_quietly(record.websocket))
+        self.disconnect(record.websocket)
+
+    async def _close_quietly(self, connection: WebSocket):
+        try:
+            await asyncio.wait_for(connection.close(code=1001), timeout=WS_SEND_TIMEOUT)
+        except Exception:
+            pass
 
 # Создаем глобальный экземпляр
 manager = ConnectionManager()
\ No newline at end of file
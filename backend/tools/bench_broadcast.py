@@ -0,0 +1,70 @@
+"""Замер пропускной способности рассылки TelegramService через fake Bot API.
+
+Запуск из каталога backend:
+
+    python -m tools.bench_broadcast --users 500 --latency-ms 50 --rate-limit-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from .fake_telegram_api import FakeApiConfig, start_fake_api
+
+
+async def run(args: argparse.Namespace) -> dict:
+    config = FakeApiConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+    )
+    api, runner = await start_fake_api(config, port=args.port)
+
+    # Сервис читает адрес API при импорте
+    os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("BOT_TOKEN", "123:fake")
+    from app.services.telegram import TelegramService
+
+    raffle_data = {
+        "title": "Benchmark",
+        "description": "Benchmark raffle",
+        "prizes": {"1": "Prize"},
+        "end_date": "01.01.2030 в 12:00 МСК",
+        "photo_url": "https://example.com/photo.png" if args.photo else None,
+    }
+
+    try:
+        started = time.perf_counter()
+        sent = await TelegramService.notify_new_raffle(1, range(1, args.users + 1), raffle_data)
+        elapsed = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+    return {
+        "users": args.users,
+        "sent": sent,
+        "elapsed_seconds": round(elapsed, 3),
+        "messages_per_second": round(sent / elapsed, 2) if elapsed else None,
+        "api": api.accounting.as_dict(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broadcast throughput benchmark")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--photo", action="store_true", help="рассылать sendPhoto вместо sendMessage")
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Соединения пула БД во время N одновременных розыгрышей.
+
+Поднимает фейковый Telegram API в этом же процессе, создаёт N розыгрышей
+с истёкшим приёмом заявок и запускает их через check_and_start_draws на
+ускоренных часах (DRAW_TIME_SCALE). Считает, сколько соединений пула
+занято одновременно, сколько в среднем за время розыгрышей, и замеряет
+задержку пробного запроса (как у обычного API-запроса) на фоне розыгрышей.
+Выходит с кодом 1, если пик занятых соединений больше --max-connections
+или среднее больше --max-mean: розыгрыш не должен держать соединение во
+время пауз анимации, только на время запросов.
+
+Запуск из каталога backend:
+
+    python -m tools.bench_draw_sessions --draws 20 --max-connections 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_draw_sessions.db")
+TELEGRAM_PORT = int(os.getenv("BENCH_TELEGRAM_PORT", "8798"))
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_FILE}"
+os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{TELEGRAM_PORT}"
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ.setdefault("DRAW_TIME_SCALE", "0.05")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from sqlalchemy import event, func, select, text
+
+from app.database import async_session_maker, engine, init_db
+from app.models import Participant, Raffle, User
+from app.services.raffle import RaffleService, active_draws
+from app.websocket_manager import manager
+from tools.fake_telegram_api import FakeApiConfig, start_fake_api
+
+logging.getLogger().setLevel(logging.WARNING)
+
+
+class PoolGauge:
+    """Занятые соединения пула: текущее, пик и интеграл по времени"""
+
+    def __init__(self):
+        self.checked_out = 0
+        self.peak = 0
+        self.area = 0.0
+        self.updated = time.monotonic()
+
+    def _advance(self):
+        now = time.monotonic()
+        self.area += self.checked_out * (now - self.updated)
+        self.updated = now
+
+    def checkout(self, *args):
+        self._advance()
+        self.checked_out += 1
+        self.peak = max(self.peak, self.checked_out)
+
+    def checkin(self, *args):
+        self._advance()
+        self.checked_out -= 1
+
+    def reset(self):
+        self._advance()
+        self.peak = self.checked_out
+        self.area = 0.0
+
+
+async def seed(draws: int, participants: int, prizes: int):
+    await init_db()
+    async with async_session_maker() as db:
+        users = [
+            User(telegram_id=800000000 + i, username=f"user{i}", first_name=f"User{i}", notifications_enabled=False)
+            for i in range(participants)
+        ]
+        db.add_all(users)
+        for n in range(draws):
+            raffle = Raffle(
+                title=f"Bench raffle {n}",
+                description="",
+                channels=[],
+                post_channels=[],
+                prizes={str(p): f"Prize {p}" for p in range(1, prizes + 1)},
+                end_date=datetime.utcnow() - timedelta(seconds=1),
+                draw_delay_minutes=0,
+                wheel_speed="fast",
+            )
+            db.add(raffle)
+            await db.flush()
+            db.add_all(Participant(raffle_id=raffle.id, user_id=u.id) for u in users)
+        await db.commit()
+
+
+async def probe(latencies: list, stop: asyncio.Event):
+    """Запрос «обычного API»: ждёт соединение из пула наравне с розыгрышами"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        async with async_session_maker() as db:
+            await db.execute(text("SELECT 1"))
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.05)
+
+
+async def run(args) -> dict:
+    _, runner = await start_fake_api(FakeApiConfig(), port=TELEGRAM_PORT)
+    await seed(args.draws, args.participants, args.prizes)
+    await manager.start()
+
+    gauge = PoolGauge()
+    event.listen(engine.sync_engine.pool, "checkout", gauge.checkout)
+    event.listen(engine.sync_engine.pool, "checkin", gauge.checkin)
+
+    latencies = []
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe(latencies, stop))
+
+    gauge.reset()
+    started = time.monotonic()
+    await RaffleService.check_and_start_draws()
+    await asyncio.sleep(0.1)
+    while active_draws:
+        await asyncio.sleep(0.1)
+    elapsed = time.monotonic() - started
+    gauge._advance()
+    mean_checked_out = gauge.area / elapsed
+
+    stop.set()
+    await prober
+    async with async_session_maker() as db:
+        completed = (await db.execute(
+            select(func.count(Raffle.id)).where(Raffle.is_completed == True)
+        )).scalar()
+
+    await manager.stop()
+    await engine.dispose()
+    await runner.cleanup()
+
+    latencies.sort()
+    return {
+        "draws": args.draws,
+        "completed": completed,
+        "seconds": round(elapsed, 2),
+        "pool": engine.pool.status(),
+        "peak_checked_out": gauge.peak,
+        "mean_checked_out": round(mean_checked_out, 3),
+        "probe_ms": {
+            "p50": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "max": round(latencies[-1], 2) if latencies else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DB pool usage of concurrent draws")
+    parser.add_argument("--draws", type=int, default=20)
+    parser.add_argument("--participants", type=int, default=10)
+    parser.add_argument("--prizes", type=int, default=3)
+    parser.add_argument("--max-connections", type=int, default=8,
+                        help="допустимый пик занятых соединений (переходы розыгрышей совпадают по времени)")
+    parser.add_argument("--max-mean", type=float, default=1.0,
+                        help="допустимое среднее число занятых соединений")
+    args = parser.parse_args()
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        if os.path.exists(DB_FILE):
+            os.remove(DB_FILE)
+    print(json.dumps(result, indent=2))
+    if (
+        result["completed"] != args.draws
+        or result["peak_checked_out"] > args.max_connections
+        or result["mean_checked_out"] > args.max_mean
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
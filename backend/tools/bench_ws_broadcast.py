@@ -0,0 +1,148 @@
+"""CPU на одну рассылку ConnectionManager.broadcast в зависимости от числа зрителей.
+
+Сравнивает кодирование JSON для каждого клиента (send_json) с отправкой
+одного заранее закодированного кадра. Сокеты — заглушки в памяти, поэтому
+замер показывает только стоимость сервера.
+
+Запуск из каталога backend:
+
+    python -m tools.bench_ws_broadcast --viewers 100 1000 5000 --roster 2000
+    python -m tools.bench_ws_broadcast --registry 50000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.websocket_manager import ConnectionManager
+
+
+class MemorySocket:
+    """Заглушка WebSocket: считает байты, ничего не отправляет"""
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.frames = 0
+
+    async def accept(self, *args, **kwargs):
+        pass
+
+    async def send_text(self, data: str):
+        self.bytes_sent += len(data.encode())
+        self.frames += 1
+
+    async def send_bytes(self, data: bytes):
+        self.bytes_sent += len(data)
+        self.frames += 1
+
+    async def send_json(self, data):
+        # Так же, как starlette.websockets.WebSocket.send_json
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+    async def close(self, code: int = 1000, reason=None):
+        pass
+
+
+def slot_start_message(roster: int) -> dict:
+    participants = [
+        {"id": 100000 + i, "username": f"user{i}", "first_name": f"Name{i}", "last_name": f"Surname{i}"}
+        for i in range(roster)
+    ]
+    return {
+        "type": "slot_start",
+        "position": 1,
+        "prize": "Prize",
+        "participants": participants,
+        "participant_ids": [p["id"] for p in participants],
+        "predetermined_winner_id": participants[0]["id"],
+        "predetermined_winner": participants[0],
+        "predetermined_winner_index": 0,
+        "round_seq": 1,
+    }
+
+
+async def wait_delivered(sockets, frames: int):
+    # Менеджер может отправлять кадры в фоне — ждём доставки
+    while any(s.frames < frames for s in sockets):
+        await asyncio.sleep(0)
+
+
+async def bench_viewers(viewers: int, roster: int, rounds: int) -> dict:
+    message = slot_start_message(roster)
+
+    # Старое поведение: send_json для каждого клиента
+    sockets = [MemorySocket() for _ in range(viewers)]
+    started = time.process_time()
+    for _ in range(rounds):
+        for socket in sockets:
+            await socket.send_json(message)
+    per_client = (time.process_time() - started) / rounds
+
+    # ConnectionManager: один кадр на рассылку
+    manager = ConnectionManager()
+    await manager.start()
+    sockets = [MemorySocket() for _ in range(viewers)]
+    for socket in sockets:
+        await manager.connect(socket, 1)
+    started = time.process_time()
+    for round_seq in range(rounds):
+        await manager.broadcast({**message, "position": round_seq + 1}, 1)
+        await wait_delivered(sockets, round_seq + 1)
+    encode_once = (time.process_time() - started) / rounds
+    await manager.stop()
+
+    return {
+        "viewers": viewers,
+        "roster": roster,
+        "frame_bytes": len(json.dumps(message, separators=(",", ":")).encode()),
+        "cpu_ms_per_broadcast_send_json": round(per_client * 1000, 2),
+        "cpu_ms_per_broadcast_encode_once": round(encode_once * 1000, 2),
+        "speedup": round(per_client / encode_once, 1) if encode_once else None,
+    }
+
+
+async def bench_registry(connections: int) -> dict:
+    """Стоимость connect/disconnect при большом числе соединений в одном розыгрыше"""
+    manager = ConnectionManager()
+    await manager.start()
+    sockets = [MemorySocket() for _ in range(connections)]
+
+    started = time.perf_counter()
+    for socket in sockets:
+        await manager.connect(socket, 1)
+    connect_time = time.perf_counter() - started
+
+    # Зрители уходят в случайном порядке
+    random.Random(connections).shuffle(sockets)
+    started = time.perf_counter()
+    for socket in sockets:
+        manager.disconnect(socket, 1)
+    disconnect_time = time.perf_counter() - started
+    await manager.stop()
+
+    return {
+        "connections": connections,
+        "connect_us": round(connect_time / connections * 1e6, 2),
+        "disconnect_us": round(disconnect_time / connections * 1e6, 2),
+    }
+
+
+async def run(args: argparse.Namespace):
+    if args.registry:
+        return await bench_registry(args.registry)
+    return [await bench_viewers(v, args.roster, args.rounds) for v in args.viewers]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket broadcast CPU benchmark")
+    parser.add_argument("--viewers", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--roster", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--registry", type=int, default=0, help="замерить connect/disconnect для N соединений")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Шторм подключений к /ws/raffle/{id}: подключений в секунду и запросов к БД.
+
+Поднимает приложение в этом же процессе (uvicorn, SQLite во временном файле),
+создаёт один розыгрыш и открывает N клиентов одновременно; каждый ждёт
+connection_established и отключается. Сравнивает рукопожатие с кешем
+снимка розыгрыша (raffle_snapshots) и без него — как при массовом
+переподключении после рестарта воркера.
+
+Контроль допуска (services/admission.py) по умолчанию выключен: замеряется
+цена рукопожатия, а не лимит скорости. Отказы 1013 считаются отдельно и в
+connects_per_sec не входят.
+
+Запуск из каталога backend:
+
+    python -m tools.bench_ws_connect --clients 200 1000 --port 8799
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_ws_connect.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_FILE}"
+# 0 — без лимита скорости; задайте WS_ACCEPT_RATE, чтобы замерить шторм вместе с допуском
+os.environ.setdefault("WS_ACCEPT_RATE", "0")
+
+import uvicorn
+import websockets
+from sqlalchemy import event
+
+from app.main import app
+from app.database import async_session_maker, engine
+from app.models import Raffle
+from app.services.admission import CLOSE_TRY_AGAIN_LATER
+from app.utils.cache import raffle_snapshots
+
+# app.main включает DEBUG для всего процесса
+logging.getLogger().setLevel(logging.WARNING)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+async def create_raffle() -> int:
+    async with async_session_maker() as db:
+        raffle = Raffle(
+            title="Bench raffle",
+            description="",
+            channels=[],
+            prizes={"1": "Prize"},
+            # розыгрыш не должен начаться во время замера
+            end_date=datetime.utcnow() + timedelta(days=1)
+        )
+        db.add(raffle)
+        await db.commit()
+        return raffle.id
+
+
+async def connect_once(url: str) -> str:
+    """ok, rejected (1013 от контроля допуска) или failed"""
+    try:
+        async with websockets.connect(url, open_timeout=30, close_timeout=1) as ws:
+            message = json.loads(await asyncio.wait_for(ws.recv(), 30))
+            return "ok" if message.get("type") == "connection_established" else "failed"
+    except websockets.ConnectionClosed as e:
+        return "rejected" if e.rcvd is not None and e.rcvd.code == CLOSE_TRY_AGAIN_LATER else "failed"
+    except Exception:
+        return "failed"
+
+
+async def storm(url: str, clients: int, counter: QueryCounter) -> dict:
+    queries_before = counter.count
+    started = time.perf_counter()
+    results = await asyncio.gather(*(connect_once(url) for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    ok = results.count("ok")
+    return {
+        "clients": clients,
+        "ok": ok,
+        "rejected": results.count("rejected"),
+        "failed": results.count("failed"),
+        "seconds": round(elapsed, 3),
+        # только принятые: отказ 1013 — не пропускная способность
+        "connects_per_sec": round(ok / elapsed),
+        "db_queries": counter.count - queries_before,
+    }
+
+
+async def run(args):
+    config = uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    raffle_id = await create_raffle()
+    url = f"ws://127.0.0.1:{args.port}/ws/raffle/{raffle_id}"
+    counter = QueryCounter()
+    event.listen(engine.sync_engine, "before_cursor_execute", counter)
+
+    rows = []
+    for cached in (False, True):
+        if cached:
+            del raffle_snapshots.get
+        else:
+            # как до кеша: каждый клиент читает розыгрыш из БД сам
+            raffle_snapshots.get = lambda raffle_id, loader: loader(raffle_id)
+        raffle_snapshots.invalidate(raffle_id)
+        for clients in args.clients:
+            rows.append({"cache": cached, **await storm(url, clients, counter)})
+
+    server.should_exit = True
+    await server_task
+    await engine.dispose()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket handshake throughput under a connect storm")
+    parser.add_argument("--clients", type=int, nargs="+", default=[200, 1000])
+    parser.add_argument("--port", type=int, default=8799)
+    args = parser.parse_args()
+    try:
+        rows = asyncio.run(run(args))
+    finally:
+        if os.path.exists(DB_FILE):
+            os.remove(DB_FILE)
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Байты на зрителя за розыгрыш для каждого протокола и кодировки.
+
+Строит те же сообщения, что run_wheel (raffle_starting, slot_start и
+winner_confirmed на каждый приз), и считает размер кадров без сжатия и
+после permessage-deflate (raw deflate на каждое сообщение, как при
+no_context_takeover — худший случай для сжатия).
+
+Запуск из каталога backend:
+
+    python -m tools.bench_ws_payload --participants 50 2000 100000 --prizes 10
+"""
+import argparse
+import json
+import random
+import zlib
+
+from app.services.draw_protocol import (
+    PROTOCOLS, raffle_starting_delta, slot_start_delta, slot_start_window
+)
+from app.services.wire_encoding import available_encodings, encode_frame
+
+
+def make_roster(size: int) -> list:
+    return [
+        {"id": 100000 + i, "username": f"user{i}", "first_name": f"Name{i}", "last_name": f"Surname{i}"}
+        for i in range(size)
+    ]
+
+
+def draw_messages(participants: int, prizes: int, protocol: str):
+    """Сообщения одного розыгрыша в варианте протокола"""
+    rng = random.Random(participants)
+    roster = make_roster(participants)
+    starting = {"type": "raffle_starting", "total_participants": participants, "total_prizes": prizes, "round_seq": 0}
+    yield raffle_starting_delta(starting, roster) if protocol == "delta" else starting
+
+    remaining = list(roster)
+    for round_seq, position in enumerate(range(prizes, 0, -1), start=1):
+        winner_index = rng.randrange(len(remaining))
+        winner = remaining[winner_index]
+        slot_start = {
+            "type": "slot_start",
+            "position": position,
+            "prize": f"Prize {position}",
+            "participants": remaining,
+            "participant_ids": [p["id"] for p in remaining],
+            "predetermined_winner_id": winner["id"],
+            "predetermined_winner": winner,
+            "predetermined_winner_index": winner_index,
+            "round_seq": round_seq,
+        }
+        if protocol == "delta":
+            slot_start = slot_start_delta(slot_start, slot_start["participant_ids"])
+        elif protocol == "window":
+            slot_start = slot_start_window(slot_start, 1, remaining)
+        yield slot_start
+
+        yield {
+            "type": "winner_confirmed",
+            "position": position,
+            "winner": winner,
+            "winner_id": winner["id"],
+            "winner_index": winner_index,
+            "prize": f"Prize {position}",
+            "round_seq": round_seq,
+        }
+        remaining = remaining[:winner_index] + remaining[winner_index + 1:]
+
+
+def frame_bytes(frame) -> bytes:
+    return frame if isinstance(frame, bytes) else frame.encode()
+
+
+def deflated_size(data: bytes) -> int:
+    compressor = zlib.compressobj(wbits=-15)
+    return len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+
+def measure(participants: int, prizes: int) -> list:
+    rows = []
+    for protocol in PROTOCOLS:
+        messages = list(draw_messages(participants, prizes, protocol))
+        for encoding in available_encodings():
+            frames = [frame_bytes(encode_frame(m, encoding)) for m in messages]
+            raw = sum(len(f) for f in frames)
+            deflated = sum(deflated_size(f) for f in frames)
+            rows.append({
+                "participants": participants,
+                "protocol": protocol,
+                "encoding": encoding,
+                "bytes_per_draw": raw,
+                "bytes_per_round": round(raw / prizes),
+                "deflate_bytes_per_draw": deflated,
+                "deflate_bytes_per_round": round(deflated / prizes),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live draw payload size per viewer")
+    parser.add_argument("--participants", type=int, nargs="+", default=[50, 2000, 20000])
+    parser.add_argument("--prizes", type=int, default=10)
+    args = parser.parse_args()
+    rows = [row for size in args.participants for row in measure(size, args.prizes)]
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
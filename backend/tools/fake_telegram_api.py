@@ -0,0 +1,275 @@
+"""Локальная замена Telegram Bot API для нагрузочных тестов и замеров задержек.
+
+Поддерживает sendMessage, sendPhoto, getChatMember, getFile и скачивание
+файлов. Задержка, доля ошибок и 429 с retry_after настраиваются, все вызовы
+учитываются и доступны через GET /_stats (POST /_reset обнуляет счётчики).
+
+Запуск из каталога backend:
+
+    python -m tools.fake_telegram_api --port 8081 --latency-ms 80 --rate-limit-rate 0.05
+
+и для backend/бота:
+
+    TELEGRAM_API_URL=http://localhost:8081
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from aiohttp import web
+
+# Минимальный валидный PNG 1x1 для скачивания файлов
+FAKE_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000d49444154789c6300010000000500010d0a2db40000000049454e44ae426082"
+)
+
+
+@dataclass
+class FakeApiConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 1
+    max_rps: float = 0.0
+    member_status: str = "member"
+    non_member_rate: float = 0.0
+
+
+@dataclass
+class MethodStats:
+    calls: int = 0
+    ok: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    latency_total: float = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "ok": self.ok,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "avg_latency_ms": round(self.latency_total / self.calls * 1000, 2) if self.calls else 0.0,
+        }
+
+
+@dataclass
+class CallAccounting:
+    methods: Dict[str, MethodStats] = field(default_factory=dict)
+    chats: set = field(default_factory=set)
+    first_call: Optional[float] = None
+    last_call: Optional[float] = None
+
+    def record(self, method: str, chat_id, outcome: str, latency: float):
+        now = time.monotonic()
+        if self.first_call is None:
+            self.first_call = now
+        self.last_call = now
+
+        stats = self.methods.setdefault(method, MethodStats())
+        stats.calls += 1
+        stats.latency_total += latency
+        if outcome == "ok":
+            stats.ok += 1
+        elif outcome == "rate_limited":
+            stats.rate_limited += 1
+        else:
+            stats.errors += 1
+        if chat_id is not None:
+            self.chats.add(str(chat_id))
+
+    def as_dict(self) -> dict:
+        total = sum(s.calls for s in self.methods.values())
+        elapsed = (self.last_call - self.first_call) if self.first_call is not None else 0.0
+        return {
+            "total_calls": total,
+            "unique_chats": len(self.chats),
+            "elapsed_seconds": round(elapsed, 3),
+            "calls_per_second": round(total / elapsed, 2) if elapsed > 0 else None,
+            "methods": {name: s.as_dict() for name, s in sorted(self.methods.items())},
+        }
+
+
+class RateWindow:
+    """Глобальный лимит запросов в секунду (как flood-limit Telegram)"""
+
+    def __init__(self, max_rps: float):
+        self.max_rps = max_rps
+        self.window_start = time.monotonic()
+        self.count = 0
+
+    def allow(self) -> bool:
+        if self.max_rps <= 0:
+            return True
+        now = time.monotonic()
+        if now - self.window_start >= 1.0:
+            self.window_start = now
+            self.count = 0
+        self.count += 1
+        return self.count <= self.max_rps
+
+
+def _error(code: int, description: str, retry_after: Optional[int] = None) -> web.Response:
+    payload = {"ok": False, "error_code": code, "description": description}
+    if retry_after is not None:
+        payload["parameters"] = {"retry_after": retry_after}
+    return web.json_response(payload, status=code)
+
+
+class FakeTelegramApi:
+    def __init__(self, config: FakeApiConfig):
+        self.config = config
+        self.accounting = CallAccounting()
+        self.rate_window = RateWindow(config.max_rps)
+        self.message_id = 0
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/file/bot{token}/{file_path:.+}", self.handle_file)
+        app.router.add_get("/_stats", self.handle_stats)
+        app.router.add_post("/_reset", self.handle_reset)
+        return app
+
+    async def _params(self, request: web.Request) -> dict:
+        params = dict(request.query)
+        if request.method == "POST" and request.can_read_body:
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+        return params
+
+    async def _delay(self):
+        delay = self.config.latency_ms + random.uniform(0, self.config.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        started = time.monotonic()
+        method = request.match_info["method"]
+        params = await self._params(request)
+        chat_id = params.get("chat_id")
+
+        await self._delay()
+        response, outcome = self._dispatch(method, params)
+        self.accounting.record(method, chat_id, outcome, time.monotonic() - started)
+        return response
+
+    def _dispatch(self, method: str, params: dict):
+        handler = {
+            "sendMessage": self._send_message,
+            "sendPhoto": self._send_message,
+            "getChatMember": self._get_chat_member,
+            "getFile": self._get_file,
+        }.get(method)
+        if handler is None:
+            return _error(404, "Not Found"), "error"
+
+        if not self.rate_window.allow() or random.random() < self.config.rate_limit_rate:
+            return _error(
+                429,
+                f"Too Many Requests: retry after {self.config.retry_after}",
+                self.config.retry_after,
+            ), "rate_limited"
+
+        if random.random() < self.config.error_rate:
+            return _error(500, "Internal Server Error"), "error"
+
+        return web.json_response({"ok": True, "result": handler(params)}), "ok"
+
+    def _send_message(self, params: dict) -> dict:
+        self.message_id += 1
+        message = {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": params.get("chat_id"), "type": "private"},
+        }
+        if "photo" in params:
+            message["photo"] = [{"file_id": str(params["photo"]), "width": 1, "height": 1}]
+            message["caption"] = params.get("caption", "")
+        else:
+            message["text"] = params.get("text", "")
+        return message
+
+    def _get_chat_member(self, params: dict) -> dict:
+        status = self.config.member_status
+        if random.random() < self.config.non_member_rate:
+            status = "left"
+        user_id = params.get("user_id")
+        return {
+            "status": status,
+            "user": {"id": int(user_id) if user_id else 0, "is_bot": False, "first_name": "User"},
+        }
+
+    def _get_file(self, params: dict) -> dict:
+        file_id = str(params.get("file_id", "file"))
+        return {
+            "file_id": file_id,
+            "file_unique_id": file_id[:16],
+            "file_size": len(FAKE_PNG),
+            "file_path": f"photos/{file_id}.png",
+        }
+
+    async def handle_file(self, request: web.Request) -> web.Response:
+        started = time.monotonic()
+        await self._delay()
+        self.accounting.record("file", None, "ok", time.monotonic() - started)
+        return web.Response(body=FAKE_PNG, content_type="image/png")
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.accounting.as_dict())
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.accounting = CallAccounting()
+        return web.json_response({"ok": True})
+
+
+async def start_fake_api(config: FakeApiConfig, host: str = "127.0.0.1", port: int = 8081):
+    """Запустить сервер в текущем event loop (для бенчмарков); вернуть (api, runner)"""
+    api = FakeTelegramApi(config)
+    runner = web.AppRunner(api.build_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return api, runner
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="базовая задержка ответа")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="случайная добавка к задержке")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="глобальный лимит запросов/с (0 — без лимита)")
+    parser.add_argument("--member-status", default="member", help="статус в getChatMember")
+    parser.add_argument("--non-member-rate", type=float, default=0.0, help="доля ответов status=left")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = FakeApiConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        max_rps=args.max_rps,
+        member_status=args.member_status,
+        non_member_rate=args.non_member_rate,
+    )
+    print(f"Fake Telegram Bot API on http://{args.host}:{args.port} ({json.dumps(config.__dict__)})")
+    web.run_app(FakeTelegramApi(config).build_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""Нагрузочный тест живого розыгрыша: N зрителей WebSocket на одной Linux-машине.
+
+Поднимает backend отдельным процессом (uvicorn, SQLite во временном каталоге,
+Telegram — tools/fake_telegram_api), создаёт розыгрыш с участниками и
+подключает зрителей к /api/ws/{raffle_id} из нескольких процессов-клиентов.
+Когда все подключились, переносит end_date розыгрыша в прошлое — дальше
+его ведёт обычный check_and_start_draws → run_wheel на ускоренных часах
+(DRAW_TIME_SCALE).
+
+Часть зрителей читает медленно (--slow-fraction), часть обрывает соединение
+без close-кадра и переподключается с resume_from (--flaky-fraction).
+
+Отчёт: задержка доставки по ts события (p50/p90/p99/max), потерянные
+события (seq, не полученные ни напрямую, ни через snapshot), отказы 1013,
+отключения сервером, CPU и память процесса сервера.
+
+Запуск из каталога backend:
+
+    python -m tools.ws_loadtest --viewers 2000 --procs 4 --time-scale 0.1
+    python -m tools.ws_loadtest --viewers 10000 --procs 8 --slow-fraction 0.02 --flaky-fraction 0.05
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 1)
+
+
+# --- клиенты -----------------------------------------------------------------
+
+class ViewerStats:
+    __slots__ = (
+        "start_seq", "seqs", "snapshot_seq", "final_seq", "latencies", "connected",
+        "reconnects", "rejected", "evicted", "failures", "complete"
+    )
+
+    def __init__(self):
+        self.start_seq = None  # last_seq при первом подключении: раньше события не ждём
+        self.seqs = set()
+        self.snapshot_seq = 0
+        self.final_seq = None
+        self.latencies = []
+        self.connected = False
+        self.reconnects = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.failures = 0
+        self.complete = False
+
+
+async def viewer(url: str, stats: ViewerStats, opts: dict, on_ready, deadline: float):
+    import websockets
+
+    slow = random.random() < opts["slow_fraction"]
+    flaky = random.random() < opts["flaky_fraction"]
+    last_seq = 0
+    while not stats.complete and time.monotonic() < deadline:
+        query = f"?protocol={opts['protocol']}"
+        if stats.start_seq is not None:
+            query += f"&resume_from={last_seq}"
+        delay = 0.5 + random.random()
+        try:
+            async with websockets.connect(url + query, open_timeout=60, close_timeout=1, max_size=None) as ws:
+                received = 0
+                async for raw in ws:
+                    now_ms = time.time() * 1000
+                    message = json.loads(raw)
+                    message_type = message.get("type")
+                    if message_type == "ping":
+                        await ws.send('{"type":"pong"}')
+                        continue
+                    if message_type == "connection_established":
+                        if stats.start_seq is None:
+                            stats.start_seq = last_seq = message.get("last_seq", 0)
+                            stats.connected = True
+                            on_ready()
+                        continue
+                    if message_type == "snapshot":
+                        last_seq = stats.snapshot_seq = message["seq"]
+                        if message.get("complete"):
+                            stats.final_seq = message["seq"]
+                            stats.complete = True
+                            return
+                        continue
+
+                    seq = message.get("seq")
+                    if seq is not None and seq > last_seq:
+                        last_seq = seq
+                        stats.seqs.add(seq)
+                        if "ts" in message:
+                            stats.latencies.append(now_ms - message["ts"])
+                    if message_type == "raffle_complete":
+                        stats.final_seq = seq
+                        stats.complete = True
+                        return
+
+                    received += 1
+                    if slow:
+                        await asyncio.sleep(opts["slow_delay"])
+                    if flaky and received % opts["flaky_every"] == 0:
+                        # Обрыв сети: без close-кадра
+                        ws.transport.abort()
+                        break
+        except websockets.ConnectionClosed as e:
+            code = e.rcvd.code if e.rcvd else None
+            if code == 1013:
+                stats.rejected += 1
+                try:
+                    delay = json.loads(e.rcvd.reason)["retry_after_ms"] / 1000
+                except (ValueError, KeyError):
+                    pass
+            elif code == 1001:
+                stats.evicted += 1
+        except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake):
+            stats.failures += 1
+        if stats.complete:
+            return
+        if stats.start_seq is not None:
+            stats.reconnects += 1
+        await asyncio.sleep(delay)
+
+
+def client_process(url: str, count: int, opts: dict, ready, results, timeout: float):
+    """Один процесс-клиент: count зрителей, результат — сводка в очередь results"""
+    raise_fd_limit()
+
+    def on_ready():
+        with ready.get_lock():
+            ready.value += 1
+
+    async def run():
+        deadline = time.monotonic() + timeout
+        stats = [ViewerStats() for _ in range(count)]
+        tasks = []
+        for s in stats:
+            tasks.append(asyncio.create_task(viewer(url, s, opts, on_ready, deadline)))
+            # подключаемся волной, а не все в один тик
+            await asyncio.sleep(opts["ramp"] / max(count, 1))
+        await asyncio.wait(tasks, timeout=max(1, deadline - time.monotonic()))
+        return stats
+
+    stats = asyncio.run(run())
+    results.put([
+        {
+            "start_seq": s.start_seq, "seqs": sorted(s.seqs), "snapshot_seq": s.snapshot_seq,
+            "final_seq": s.final_seq, "latencies": [round(x, 1) for x in s.latencies],
+            "connected": s.connected, "reconnects": s.reconnects, "rejected": s.rejected,
+            "evicted": s.evicted, "failures": s.failures, "complete": s.complete,
+        }
+        for s in stats
+    ])
+
+
+# --- сервер ------------------------------------------------------------------
+
+class ProcessSampler:
+    """CPU и RSS процесса сервера по /proc"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.cpu_samples = []
+        self.peak_rss_mb = 0.0
+        self.task = None
+
+    def _cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def _rss_mb(self) -> float:
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+    async def _run(self, interval: float):
+        previous, previous_at = self._cpu_seconds(), time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                cpu, now = self._cpu_seconds(), time.monotonic()
+                self.cpu_samples.append(100 * (cpu - previous) / (now - previous_at))
+                previous, previous_at = cpu, now
+                self.peak_rss_mb = max(self.peak_rss_mb, self._rss_mb())
+            except (FileNotFoundError, ProcessLookupError):
+                return
+
+    def start(self, interval: float = 1.0):
+        self.peak_rss_mb = self._rss_mb()
+        self.task = asyncio.create_task(self._run(interval))
+
+    def report(self) -> dict:
+        if self.task is not None:
+            self.task.cancel()
+        return {
+            "cpu_avg_percent": round(sum(self.cpu_samples) / len(self.cpu_samples), 1) if self.cpu_samples else None,
+            "cpu_max_percent": round(max(self.cpu_samples), 1) if self.cpu_samples else None,
+            "rss_peak_mb": round(self.peak_rss_mb, 1),
+        }
+
+
+async def seed(participants: int, prizes: int) -> int:
+    """Розыгрыш с участниками в базе из DATABASE_URL"""
+    from app.database import async_session_maker, init_db, engine
+    from app.models import Participant, Raffle, User
+
+    await init_db()
+    async with async_session_maker() as db:
+        users = [
+            User(telegram_id=900000000 + i, username=f"viewer{i}", first_name=f"Viewer{i}", notifications_enabled=False)
+            for i in range(participants)
+        ]
+        db.add_all(users)
+        raffle = Raffle(
+            title="Load test raffle",
+            description="",
+            channels=[],
+            post_channels=[],
+            prizes={str(p): f"Prize {p}" for p in range(1, prizes + 1)},
+            end_date=datetime.utcnow() + timedelta(days=1),
+            draw_delay_minutes=1,
+            wheel_speed="fast",
+        )
+        db.add(raffle)
+        await db.flush()
+        db.add_all(Participant(raffle_id=raffle.id, user_id=u.id) for u in users)
+        await db.commit()
+        raffle_id = raffle.id
+    await engine.dispose()
+    return raffle_id
+
+
+async def start_draw(raffle_id: int):
+    """Конец приёма заявок — check_and_start_draws подхватит розыгрыш"""
+    from sqlalchemy import update
+    from app.database import async_session_maker, engine
+    from app.models import Raffle
+
+    async with async_session_maker() as db:
+        await db.execute(
+            update(Raffle).where(Raffle.id == raffle_id).values(end_date=datetime.utcnow() - timedelta(seconds=1))
+        )
+        await db.commit()
+    await engine.dispose()
+
+
+async def wait_http(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def summarize(viewers: list, sampler: dict, elapsed: float) -> dict:
+    final_seq = max((v["final_seq"] or 0 for v in viewers), default=0)
+    latencies = [x for v in viewers for x in v["latencies"]]
+    lost = 0
+    incomplete = 0
+    for v in viewers:
+        if not v["connected"]:
+            continue
+        if not v["complete"]:
+            incomplete += 1
+        expected = range(max(v["start_seq"], v["snapshot_seq"]) + 1, final_seq + 1)
+        seqs = set(v["seqs"])
+        lost += sum(1 for seq in expected if seq not in seqs)
+    return {
+        "viewers": len(viewers),
+        "connected": sum(v["connected"] for v in viewers),
+        "completed": sum(v["complete"] for v in viewers),
+        "incomplete": incomplete,
+        "events_per_draw": final_seq,
+        "events_delivered": sum(len(v["seqs"]) for v in viewers),
+        "events_lost": lost,
+        "recovered_by_snapshot": sum(1 for v in viewers if v["snapshot_seq"]),
+        "reconnects": sum(v["reconnects"] for v in viewers),
+        "rejected_1013": sum(v["rejected"] for v in viewers),
+        "evicted_by_server": sum(v["evicted"] for v in viewers),
+        "connect_failures": sum(v["failures"] for v in viewers),
+        "latency_ms": {
+            "p50": percentile(latencies, 0.5),
+            "p90": percentile(latencies, 0.9),
+            "p99": percentile(latencies, 0.99),
+            "max": round(max(latencies), 1) if latencies else None,
+        },
+        "server": sampler,
+        "seconds": round(elapsed, 1),
+    }
+
+
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="ws_loadtest_")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    raise_fd_limit()
+    raffle_id = await seed(args.participants, args.prizes)
+
+    api_port, telegram_port = args.port or free_port(), free_port()
+    env = {
+        **os.environ,
+        "DRAW_TIME_SCALE": str(args.time_scale),
+        "RAFFLE_CHECK_INTERVAL": "1",
+        "LOG_LEVEL": "WARNING",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "BOT_TOKEN": "loadtest",
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{telegram_port}",
+    }
+    for item in args.server_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "tools.fake_telegram_api", "--port", str(telegram_port)],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+            stderr=open(os.path.join(workdir, "telegram.log"), "w")
+        )
+    ]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(api_port),
+         "--ws", "websockets", "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+        stderr=open(os.path.join(workdir, "server.log"), "w")
+    )
+    processes.append(server)
+    clients = []
+    try:
+        await wait_http(telegram_port)
+        await wait_http(api_port)
+        sampler = ProcessSampler(server.pid)
+        sampler.start()
+
+        # Отсчёт draw_delay_minutes=1 и раунды fast (3 + 5 + 3 с) на ускоренных часах
+        draw_seconds = (60 + 3 + args.prizes * 11) * args.time_scale
+        timeout = args.connect_timeout + draw_seconds + 60
+        ctx = multiprocessing.get_context("spawn")
+        ready = ctx.Value("i", 0)
+        results = ctx.Queue()
+        opts = {
+            "protocol": args.protocol,
+            "slow_fraction": args.slow_fraction,
+            "slow_delay": args.slow_delay_ms / 1000,
+            "flaky_fraction": args.flaky_fraction,
+            "flaky_every": args.flaky_every,
+            "ramp": args.ramp,
+        }
+        url = f"ws://127.0.0.1:{api_port}/api/ws/{raffle_id}"
+        per_process = [args.viewers // args.procs + (1 if i < args.viewers % args.procs else 0) for i in range(args.procs)]
+        for count in per_process:
+            process = ctx.Process(target=client_process, args=(url, count, opts, ready, results, timeout))
+            process.start()
+            clients.append(process)
+
+        started = time.monotonic()
+        while ready.value < args.viewers and time.monotonic() - started < args.connect_timeout:
+            await asyncio.sleep(0.5)
+        print(f"{ready.value}/{args.viewers} viewers connected in {time.monotonic() - started:.1f}s, starting draw", file=sys.stderr)
+        await start_draw(raffle_id)
+
+        viewers = []
+        for _ in clients:
+            viewers.extend(await asyncio.to_thread(results.get, True, timeout + 30))
+        return summarize(viewers, sampler.report(), time.monotonic() - started)
+    finally:
+        for process in clients:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.keep:
+            print(f"Work dir kept: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live draw WebSocket load test")
+    parser.add_argument("--viewers", type=int, default=1000)
+    parser.add_argument("--procs", type=int, default=max(1, min(8, (os.cpu_count() or 2) // 2)), help="процессов-клиентов")
+    parser.add_argument("--participants", type=int, default=500)
+    parser.add_argument("--prizes", type=int, default=5)
+    parser.add_argument("--protocol", default="delta", choices=["full", "delta", "window"])
+    parser.add_argument("--time-scale", type=float, default=0.1, help="DRAW_TIME_SCALE сервера")
+    parser.add_argument("--ramp", type=float, default=5.0, help="за сколько секунд подключаются зрители одного процесса")
+    parser.add_argument("--connect-timeout", type=float, default=120.0)
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="доля медленных читателей")
+    parser.add_argument("--slow-delay-ms", type=float, default=500.0, help="пауза медленного читателя на сообщение")
+    parser.add_argument("--flaky-fraction", type=float, default=0.0, help="доля зрителей с обрывами связи")
+    parser.add_argument("--flaky-every", type=int, default=4, help="обрыв после каждых N сообщений")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="переменные окружения сервера, например WS_ACCEPT_RATE=1000")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="не удалять каталог с базой и server.log")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,8 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, \
                          ReplyKeyboardMarkup, KeyboardButton
 from aiogram.exceptions import TelegramBadRequest
@@ -36,6 +38,8 @@ BOT_TOKEN  = os.getenv("BOT_TOKEN", "")
 WEBAPP_URL = os.getenv("WEBAPP_URL", "https://raffle-app-qtma.onrender.com")
 API_URL    = os.getenv("API_URL",   "https://raffle-api-y3im.onrender.com")
 ADMIN_IDS  = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x]
+# Базовый URL Bot API (например, локальный fake-сервер для нагрузочных тестов)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
 
 # ────────────────────────────────
 # aiogram setup
@@ -43,7 +47,13 @@ ADMIN_IDS  = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x]
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-bot = Bot(token=BOT_TOKEN)
+if TELEGRAM_API_URL:
+    bot = Bot(
+        token=BOT_TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+    )
+else:
+    bot = Bot(token=BOT_TOKEN)
 dp  = Dispatcher(storage=MemoryStorage())
 
 # ────────────────────────────────
@@ -58,10 +68,14 @@ class RaffleStates(StatesGroup):
     waiting_prize_details = State()
     waiting_end_datetime  = State()
     waiting_speed        = State()
+    waiting_audience     = State()
 
 # ────────────────────────────────
 # ИСПРАВЛЕННЫЙ класс APIClient
 # ────────────────────────────────
+class APIRejected(Exception):
+    """Backend отклонил запрос (4xx): повтор с теми же данными не поможет"""
+
 class APIClient:
     """Клиент, подписывающий запросы как Telegram Web‑App"""
 
@@ -85,61 +99,16 @@ class APIClient:
                 "end_date": raffle_data["end_date"].isoformat(),
                 "draw_delay_minutes": 5,
                 "wheel_speed": raffle_data.get("wheel_speed", "fast"),
+                "audience": raffle_data.get("audience"),
             }
 
-            # 2. формируем initData администратора
-            auth_date = int(time.time())
-            
-            # ВАЖНО: id должен быть строкой в JSON
-            admin_data = {
-                "id": str(ADMIN_IDS[0]),     # Преобразуем в строку!
-                "first_name": "Admin",
-                "username": "admin",
-            }
-
-            # 2‑a JSON без пробелов
-            user_json = json.dumps(admin_data, separators=(",", ":"), ensure_ascii=False)
-            
-            # 2‑b URL‑кодируем JSON
-            encoded_user = urllib.parse.quote(user_json)
-            
-            # 2‑c формируем параметры для подписи
-            params = {
-                "auth_date": str(auth_date),
-                "user": user_json  # Используем НЕ закодированный JSON для подписи
-            }
-            
-            # 2‑d создаем строку для подписи
-            data_check_arr = []
-            for key in sorted(params.keys()):
-                data_check_arr.append(f"{key}={params[key]}")
-            data_check_string = "\n".join(data_check_arr)
-            
-            # 2‑e вычисляем hash
-            secret_key = hmac.new(
-                b"WebAppData",
-                BOT_TOKEN.encode(),
-                hashlib.sha256
-            ).digest()
-            
-            hash_value = hmac.new(
-                secret_key,
-                data_check_string.encode(),
-                hashlib.sha256
-            ).hexdigest()
-            
-            # 2‑f итоговый initData (с URL-кодированным user)
-            init_data = f"user={encoded_user}&auth_date={auth_date}&hash={hash_value}"
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {init_data}",
-            }
+            # 2. initData администратора
+            headers = self._admin_headers()
 
             # 3. сам POST
             try:
                 logger.info(f"Creating raffle with admin_id: {ADMIN_IDS[0]}")
-                logger.debug(f"Init data: {init_data[:50]}...")
+                logger.debug(f"Init data: {headers['Authorization'][len('Bearer '):][:50]}...")
                 
                 async with session.post(url, json=api_data, headers=headers, ssl=False) as resp:
                     resp_text = await resp.text()
@@ -154,6 +123,68 @@ class APIClient:
                 raise Exception(f"Ошибка сети: {exc}") from exc
     # ──────────────────────────────────────────────────────────
     
+    def _admin_headers(self) -> Dict[str, str]:
+        """Заголовки с initData администратора для /api/admin/*"""
+        auth_date = int(time.time())
+        
+        # ВАЖНО: id должен быть строкой в JSON
+        admin_data = {
+            "id": str(ADMIN_IDS[0]),     # Преобразуем в строку!
+            "first_name": "Admin",
+            "username": "admin",
+        }
+
+        # 2‑a JSON без пробелов
+        user_json = json.dumps(admin_data, separators=(",", ":"), ensure_ascii=False)
+        
+        # 2‑b URL‑кодируем JSON
+        encoded_user = urllib.parse.quote(user_json)
+        
+        # 2‑c формируем параметры для подписи
+        params = {
+            "auth_date": str(auth_date),
+            "user": user_json  # Используем НЕ закодированный JSON для подписи
+        }
+        
+        # 2‑d создаем строку для подписи
+        data_check_arr = []
+        for key in sorted(params.keys()):
+            data_check_arr.append(f"{key}={params[key]}")
+        data_check_string = "\n".join(data_check_arr)
+        
+        # 2‑e вычисляем hash
+        secret_key = hmac.new(
+            b"WebAppData",
+            BOT_TOKEN.encode(),
+            hashlib.sha256
+        ).digest()
+        
+        hash_value = hmac.new(
+            secret_key,
+            data_check_string.encode(),
+            hashlib.sha256
+        ).hexdigest()
+        
+        # 2‑f итоговый initData (с URL-кодированным user)
+        init_data = f"user={encoded_user}&auth_date={auth_date}&hash={hash_value}"
+        
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {init_data}",
+        }
+
+    async def push_channel_members(self, updates: List[Dict[str, Any]]) -> None:
+        """POST /api/admin/channel-members — пачка chat_member обновлений"""
+        async with aiohttp.ClientSession() as session:
+            url = f"{self.api_url}/api/admin/channel-members"
+            async with session.post(url, json=updates, headers=self._admin_headers(), ssl=False) as resp:
+                if resp.status != 200:
+                    error = f"API error {resp.status}: {await resp.text()}"
+                    # 408/429 — временные, остальные 4xx (401, 422) не пройдут и при повторе
+                    if 400 <= resp.status < 500 and resp.status not in (408, 429):
+                        raise APIRejected(error)
+                    raise Exception(error)
+
     async def get_active_raffles(self) -> List[dict]:
         """Получение активных розыгрышей из API"""
         async with aiohttp.ClientSession() as session:
@@ -887,6 +918,25 @@ async def process_end_datetime(message: types.Message, state: FSMContext):
             "Например: 25.12.2024 18:00"
         )
 
+# Сегменты аудитории для анонса
+AUDIENCE_ALL       = "👥 Всем"
+AUDIENCE_ACTIVE    = "🔥 Активным за 30 дней"
+AUDIENCE_NEVER_WON = "🍀 Ещё не выигрывали"
+
+def parse_audience(text: str):
+    """Текст кнопки/сообщения → сегмент аудитории для API (None — всем)"""
+    text = (text or "").strip()
+    if text == AUDIENCE_ALL:
+        return None
+    if text == AUDIENCE_ACTIVE:
+        return {"type": "active_days", "days": 30}
+    if text == AUDIENCE_NEVER_WON:
+        return {"type": "never_won"}
+    parts = text.split()
+    if len(parts) == 2 and parts[0].lower() == "участники" and parts[1].isdigit():
+        return {"type": "raffle_participants", "raffle_id": int(parts[1])}
+    raise ValueError(text)
+
 @dp.message(RaffleStates.waiting_speed)
 async def process_speed(message: types.Message, state: FSMContext):
     speed_map = {"Быстро": "fast", "Средняя": "medium", "Медленно": "slow"}
@@ -895,8 +945,33 @@ async def process_speed(message: types.Message, state: FSMContext):
         await message.answer("Пожалуйста, выберите скорость из предложенных кнопок.")
         return
     
+    await state.update_data(wheel_speed=speed, wheel_speed_text=message.text)
+    await state.set_state(RaffleStates.waiting_audience)
+    kb = ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text=AUDIENCE_ALL)],
+            [KeyboardButton(text=AUDIENCE_ACTIVE)],
+            [KeyboardButton(text=AUDIENCE_NEVER_WON)],
+        ],
+        resize_keyboard=True
+    )
+    await message.answer(
+        "Кому отправить анонс?\n\n"
+        "Выберите сегмент или напишите «участники <id розыгрыша>», "
+        "чтобы уведомить участников прошлого розыгрыша.",
+        reply_markup=kb
+    )
+
+@dp.message(RaffleStates.waiting_audience)
+async def process_audience(message: types.Message, state: FSMContext):
+    try:
+        audience = parse_audience(message.text)
+    except ValueError:
+        await message.answer("Пожалуйста, выберите сегмент из предложенных кнопок.")
+        return
+    
     data = await state.get_data()
-    data["wheel_speed"] = speed
+    data["audience"] = audience
     loading_msg = await message.answer("⏳ Создаю розыгрыш...")
     
     # Создаем задачу в фоне
@@ -915,7 +990,8 @@ async def create_raffle_background(message: types.Message, state: FSMContext, da
             f"📋 Название: {data['title']}\n"
             f"📅 Завершится: {data['end_date'].strftime('%d.%m.%Y в %H:%M')} (МСК)\n"
             f"🏆 Призовых мест: {data['prizes_count']}\n"
-            f"⚡ Скорость колеса: {message.text}\n\n"
+            f"⚡ Скорость колеса: {data['wheel_speed_text']}\n"
+            f"📣 Аудитория: {message.text}\n\n"
             "⏰ Результаты будут подведены автоматически!",
             reply_markup=keyboard
         )
@@ -973,12 +1049,55 @@ async def notify_raffle_live(raffle_id: int):
         except Exception as e:
             logger.error(f"Ошибка отправки уведомления пользователю {user_id}: {e}")
 
+# ────────────────────────────────
+# Индекс подписок: chat_member updates → backend
+# ────────────────────────────────
+MEMBER_FLUSH_INTERVAL = float(os.getenv("MEMBER_FLUSH_INTERVAL", "2"))
+MEMBER_QUEUE_LIMIT    = 10000
+member_updates: List[Dict[str, Any]] = []
+
+@dp.chat_member()
+async def on_chat_member(update: types.ChatMemberUpdated):
+    """Бот — админ обязательных каналов, поэтому видит вступления и выходы"""
+    if not update.chat.username or not ADMIN_IDS:
+        # без администратора backend не принимает обновления — не копим их
+        return
+    status = update.new_chat_member.status
+    member_updates.append({
+        "channel": update.chat.username,
+        "telegram_id": update.new_chat_member.user.id,
+        "status": getattr(status, "value", status),
+        "updated_at": update.date.isoformat(),
+    })
+    # Backend недоступен долго — храним только последние обновления
+    del member_updates[:-MEMBER_QUEUE_LIMIT]
+
+async def flush_member_updates():
+    """Периодически отправляем накопленные обновления в backend"""
+    while True:
+        await asyncio.sleep(MEMBER_FLUSH_INTERVAL)
+        if not member_updates:
+            continue
+        batch = member_updates[:]
+        member_updates.clear()
+        try:
+            await api_client.push_channel_members(batch)
+        except APIRejected as e:
+            logger.error(f"Dropping {len(batch)} channel member updates: {e}")
+        except Exception as e:
+            logger.error(f"Error pushing channel members: {e}")
+            # Возвращаем в очередь перед новыми; как и в on_chat_member, храним самые свежие
+            member_updates[:0] = batch
+            del member_updates[:-MEMBER_QUEUE_LIMIT]
+
 async def main():
     """Основная функция запуска бота"""
     logger.info("Запуск бота...")
     
-    # Запускаем polling
-    await dp.start_polling(bot)
+    asyncio.create_task(flush_member_updates())
+    
+    # Запускаем polling; chat_member приходит только если явно запрошен
+    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -45,6 +45,7 @@ const SlotMachineComponent = ({
   wheelSpeed = 'fast',
   targetWinnerId,
   roundSeq,  // НОВОЕ: добавлен roundSeq
+  totalCount,  // число оставшихся участников, если participants — только окно
 }) => {
   // безопасный список участников
   const validParticipants = Array.isArray(participants) ? participants : [];
@@ -490,7 +491,7 @@ const SlotMachineComponent = ({
           {isSpinning ? '🎰 Выбираем победителя...' : '⏳ Ожидание розыгрыша...'}
         </p>
         {participants.length > 0 && (
-          <p className="text-xs opacity-75">Участников: {participants.length}</p>
+          <p className="text-xs opacity-75">Участников: {totalCount ?? participants.length}</p>
         )}
       </div>
     </div>
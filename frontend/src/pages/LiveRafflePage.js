@@ -4,6 +4,12 @@ import { ArrowLeftIcon } from '@heroicons/react/24/outline';
 import api from '../services/api';
 import SlotMachineComponent from '../components/SlotMachineComponent';
 import { toast } from 'react-hot-toast';
+import { rosterMatches, removeWinner, decodeColumnar } from '../utils/drawProtocol';
+
+// delta — весь список один раз, window — только окно имён для слот-машины
+const DRAW_PROTOCOL = process.env.REACT_APP_DRAW_PROTOCOL || 'delta';
+// json или columnar (списки участников колонками, меньше байт на кадр)
+const DRAW_ENCODING = process.env.REACT_APP_DRAW_ENCODING || 'json';
 
 function LiveRafflePage() {
   const { id } = useParams();
@@ -20,14 +26,30 @@ function LiveRafflePage() {
   const [isSpinning, setIsSpinning] = useState(false);
   const [socket, setSocket] = useState(null);
   const [countdown, setCountdown] = useState(null);
+  const [countdownDeadline, setCountdownDeadline] = useState(null);
   const [loading, setLoading] = useState(true);
   const [connectionStatus, setConnectionStatus] = useState('connecting');
+  const [viewers, setViewers] = useState(null);
 
   // КРИТИЧЕСКИ ВАЖНО: отслеживание round_seq и очередь событий
   const lastProcessedRoundRef = useRef(0);
   const eventQueueRef = useRef([]);
   const isProcessingRef = useRef(false);
   const processedWinnersRef = useRef(new Set());
+  // seq последнего обработанного события — для resume_from при переподключении
+  const lastSeqRef = useRef(0);
+  const completedRef = useRef(false);
+  // Разница часов сервера и клиента (мс) для локального обратного отсчёта
+  const clockOffsetRef = useRef(0);
+  // Текущий раунд для обработчиков событий: в замыканиях state может быть устаревшим
+  const currentRoundRef = useRef(null);
+
+  const updateCurrentRound = (round) => {
+    currentRoundRef.current = round;
+    setCurrentRound(round);
+  };
+  // delta-протокол: упорядоченный список оставшихся участников розыгрыша
+  const rosterRef = useRef(null);
 
   // загрузка деталей розыгрыша
   useEffect(() => {
@@ -68,6 +90,33 @@ function LiveRafflePage() {
     loadData();
   }, [id]);
 
+  // Список участников розыгрыша с сервера (при подключении в середине или рассинхронизации)
+  const loadRoster = async () => {
+    const res = await api.get(`/raffles/${id}/roster`);
+    rosterRef.current = res.data.roster;
+    return res.data.roster;
+  };
+
+  // delta-протокол: восстанавливаем список раунда локально и сверяем с сервером
+  const resolveRoundParticipants = async (data) => {
+    if (await rosterMatches(rosterRef.current, data.remaining_count, data.roster_hash)) {
+      return rosterRef.current;
+    }
+    console.warn('Local roster out of sync, reloading from server');
+    try {
+      const roster = await loadRoster();
+      if (await rosterMatches(roster, data.remaining_count, data.roster_hash)) {
+        return roster;
+      }
+    } catch (e) {
+      console.error(e);
+    }
+    return [];
+  };
+
+  // Последняя версия обработчика очереди для onmessage (сокет живёт дольше рендера)
+  const processEventQueueRef = useRef(null);
+
   // НОВОЕ: Последовательная обработка событий из очереди
   const processEventQueue = async () => {
     if (isProcessingRef.current || eventQueueRef.current.length === 0) {
@@ -79,13 +128,20 @@ function LiveRafflePage() {
     while (eventQueueRef.current.length > 0) {
       const event = eventQueueRef.current.shift();
       
-      // Пропускаем устаревшие события
-      if (event.round_seq && event.round_seq <= lastProcessedRoundRef.current) {
-        console.log(`Skipping outdated event with round_seq ${event.round_seq}`);
+      // Пропускаем уже обработанные события (после переподключения сервер
+      // присылает всё, что идёт после resume_from, по порядку seq)
+      if (event.seq && event.seq <= lastSeqRef.current && event.type !== 'raffle_starting' && event.type !== 'snapshot') {
+        console.log(`Skipping already processed event with seq ${event.seq}`);
         continue;
       }
 
       await processEvent(event);
+      if (event.type === 'snapshot') {
+        // Снимок задаёт точку отсчёта заново: журнал сервера мог начаться с нуля
+        lastSeqRef.current = event.seq || 0;
+      } else if (event.seq) {
+        lastSeqRef.current = event.seq;
+      }
       
       // Ждем завершения анимации если она запущена
       if (event.type === 'slot_start') {
@@ -98,6 +154,7 @@ function LiveRafflePage() {
     
     isProcessingRef.current = false;
   };
+  processEventQueueRef.current = processEventQueue;
 
   // Обработка одного события
   const processEvent = async (data) => {
@@ -108,10 +165,28 @@ function LiveRafflePage() {
         if (data.raffle.is_completed) {
           setConnectionStatus('completed');
         }
-        // Синхронизируем round_seq при подключении
-        if (data.round_seq !== undefined) {
+        // Синхронизируем round_seq при первом подключении
+        if (data.round_seq !== undefined && !lastSeqRef.current) {
           lastProcessedRoundRef.current = data.round_seq;
         }
+        // При первом подключении продолжаем с текущего seq; при переподключении
+        // за connection_established идут пропущенные события
+        if (!lastSeqRef.current && data.last_seq) {
+          lastSeqRef.current = data.last_seq;
+        } else if (data.last_seq !== undefined && data.last_seq < lastSeqRef.current) {
+          // Журнал сервера начат заново (рестарт воркера) — иначе новые события отбросятся как старые
+          lastSeqRef.current = data.last_seq;
+        }
+        // Подключились во время розыгрыша — список раунда берём с сервера.
+        // При переподключении список уже есть: пропущенные события придут следом,
+        // а расхождение поймает сверка хеша в resolveRoundParticipants
+        if (data.raffle.draw_started && !data.raffle.is_completed && !rosterRef.current?.length) {
+          try {
+            await loadRoster();
+          } catch (e) {
+            console.error(e);
+          }
+        }
         break;
 
       case 'raffle_starting':
@@ -119,13 +194,19 @@ function LiveRafflePage() {
         // Сбрасываем состояние при начале нового розыгрыша
         lastProcessedRoundRef.current = 0;
         processedWinnersRef.current.clear();
-        eventQueueRef.current = [];
+        if (Array.isArray(data.roster)) {
+          rosterRef.current = data.roster;
+        }
         break;
 
       case 'slot_start': {
         // КРИТИЧЕСКИ ВАЖНО: используем ТОЛЬКО участников из события
-        const serverParticipants = Array.isArray(data.participants) ? data.participants : [];
-        const participantIds = data.participant_ids || [];
+        // (delta-протокол: список, сверенный по remaining_count и roster_hash)
+        // (window-протокол: только окно имён вокруг победителя)
+        const serverParticipants = Array.isArray(data.participants)
+          ? data.participants
+          : await resolveRoundParticipants(data);
+        const participantIds = data.participant_ids || serverParticipants.map(p => p.id);
         
         console.log('=== SLOT START EVENT ===');
         console.log('Round seq:', data.round_seq);
@@ -154,7 +235,7 @@ function LiveRafflePage() {
         }
 
         // Обновляем состояние текущего раунда
-        setCurrentRound({
+        updateCurrentRound({
           position: data.position,
           prize: data.prize,
           participants: serverParticipants, // ТОЛЬКО от сервера!
@@ -162,6 +243,7 @@ function LiveRafflePage() {
           predeterminedWinnerId: winnerId,
           predeterminedWinner: data.predetermined_winner,
           predeterminedWinnerIndex: data.predetermined_winner_index,
+          remainingCount: data.remaining_count ?? serverParticipants.length,
           round_seq: data.round_seq
         });
 
@@ -182,13 +264,17 @@ function LiveRafflePage() {
         }
         processedWinnersRef.current.add(winnerKey);
 
+        // delta-протокол: победитель выбывает из локального списка
+        rosterRef.current = removeWinner(rosterRef.current, data.winner_id || data.winner.id, data.winner_index);
+
         console.log('=== WINNER CONFIRMED ===');
         console.log('Round seq:', data.round_seq);
         console.log('Position:', data.position);
         console.log('Winner ID:', data.winner_id || data.winner.id);
 
         // Проверяем что это событие для текущего раунда
-        if (currentRound && currentRound.round_seq === data.round_seq) {
+        const activeRound = currentRoundRef.current;
+        if (activeRound && activeRound.round_seq === data.round_seq) {
           setWinners((prev) => {
             const updated = [...prev];
             const idx = updated.findIndex((w) => w.position === data.position);
@@ -212,24 +298,49 @@ function LiveRafflePage() {
           });
           
           setIsSpinning(false);
-          setCurrentRound(null); // Очищаем текущий раунд
+          updateCurrentRound(null); // Очищаем текущий раунд
           
           toast.success(`🎉 Победитель ${data.position} места: @${data.winner.username || data.winner.first_name}!`);
         } else {
-          console.warn(`Received winner_confirmed for round ${data.round_seq} but current round is ${currentRound?.round_seq}`);
+          console.warn(`Received winner_confirmed for round ${data.round_seq} but current round is ${activeRound?.round_seq}`);
+        }
+        break;
+      }
+
+      case 'snapshot': {
+        // Пропущено больше, чем хранит журнал сервера — восстанавливаем состояние целиком
+        const snapshotWinners = data.winners || [];
+        const winnerIds = new Set(snapshotWinners.map((w) => String(w.winner_id || w.winner?.id)));
+        processedWinnersRef.current.clear();
+        setWinners(snapshotWinners);
+        setCurrentParticipants((prev) => prev.filter((p) => !winnerIds.has(String(p.id))));
+        if (data.complete) {
+          await processEvent(data.complete);
+        } else if (data.current_round) {
+          await processEvent(data.current_round);
+        } else {
+          updateCurrentRound(null);
+          setIsSpinning(false);
         }
         break;
       }
 
       case 'raffle_complete':
+        completedRef.current = true;
         setWinners(data.winners);
         setConnectionStatus('completed');
-        setCurrentRound(null);
+        updateCurrentRound(null);
         setIsSpinning(false);
         toast.success('🎊 Розыгрыш завершен!');
         break;
 
+      case 'countdown_started':
       case 'countdown':
+        if (data.deadline_ms) {
+          // Секунды считаем сами по дедлайну, сервер только иногда синхронизирует
+          clockOffsetRef.current = data.server_time_ms - Date.now();
+          setCountdownDeadline(data.seconds > 0 ? data.deadline_ms : null);
+        }
         setCountdown(data.seconds);
         break;
 
@@ -244,44 +355,104 @@ function LiveRafflePage() {
     }
   };
 
-  // подключение WebSocket
+  // подключение WebSocket; при обрыве переподключаемся с resume_from
   useEffect(() => {
-    const wsUrl = `${process.env.REACT_APP_WS_URL || 'ws://localhost:8000'}/api/ws/${id}`;
-    const ws = new WebSocket(wsUrl);
-    setConnectionStatus('connecting');
-
-    ws.onopen = () => {
-      setConnectionStatus('connected');
-      const pingInterval = setInterval(() => {
-        if (ws.readyState === WebSocket.OPEN) {
-          ws.send(JSON.stringify({ type: 'ping' }));
+    let ws = null;
+    let reconnectTimer = null;
+    let attempt = 0;
+    let closedByUnmount = false;
+
+    const connect = () => {
+      const params = new URLSearchParams({ protocol: DRAW_PROTOCOL, encoding: DRAW_ENCODING });
+      if (lastSeqRef.current > 0) {
+        params.set('resume_from', lastSeqRef.current);
+      }
+      const wsUrl = `${process.env.REACT_APP_WS_URL || 'ws://localhost:8000'}/api/ws/${id}?${params}`;
+      ws = new WebSocket(wsUrl);
+      setConnectionStatus('connecting');
+
+      ws.onopen = () => {
+        attempt = 0;
+        setConnectionStatus('connected');
+        const pingInterval = setInterval(() => {
+          if (ws.readyState === WebSocket.OPEN) {
+            ws.send(JSON.stringify({ type: 'ping' }));
+          }
+        }, 30000);
+        ws.pingInterval = pingInterval;
+      };
+
+      ws.onmessage = (event) => {
+        const data = decodeColumnar(JSON.parse(event.data));
+
+        // Heartbeat сервера: отвечаем сразу, мимо очереди событий
+        if (data.type === 'ping') {
+          ws.send(JSON.stringify({ type: 'pong' }));
+          return;
+        }
+        // Число зрителей не должно ждать окончания анимации раунда
+        if (data.type === 'viewer_count') {
+          setViewers(data.count);
+          return;
+        }
+        if (data.type === 'connection_established' && data.viewers !== undefined) {
+          setViewers(data.viewers);
         }
-      }, 30000);
-      ws.pingInterval = pingInterval;
-    };
 
-    ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-      
-      // Добавляем событие в очередь
-      eventQueueRef.current.push(data);
-      
-      // Запускаем обработку очереди
-      processEventQueue();
-    };
+        // Добавляем событие в очередь
+        eventQueueRef.current.push(data);
 
-    ws.onerror = () => setConnectionStatus('error');
-    ws.onclose = () => {
-      if (ws.pingInterval) clearInterval(ws.pingInterval);
-      setConnectionStatus('error');
+        // Запускаем обработку очереди
+        processEventQueueRef.current();
+      };
+
+      ws.onerror = () => setConnectionStatus('error');
+      ws.onclose = (event) => {
+        if (ws.pingInterval) clearInterval(ws.pingInterval);
+        if (closedByUnmount || completedRef.current) return;
+        setConnectionStatus('error');
+        // 4404 — розыгрыша нет, переподключение не поможет
+        if (event.code === 4404) return;
+        // Экспоненциальная задержка с разбросом, чтобы зрители не переподключались разом
+        let delay = Math.min(30000, 1000 * 2 ** attempt) * (0.5 + Math.random());
+        if (event.code === 1013) {
+          // Сервер перегружен и сам подсказал, когда приходить (уже со случайным разбросом)
+          try {
+            const hint = JSON.parse(event.reason);
+            if (hint.retry_after_ms > 0) delay = hint.retry_after_ms;
+          } catch (e) {
+            // reason без подсказки — остаёмся на экспоненциальной задержке
+          }
+        }
+        attempt += 1;
+        reconnectTimer = setTimeout(connect, delay);
+      };
+      setSocket(ws);
     };
-    setSocket(ws);
+
+    connect();
 
     return () => {
-      if (ws.pingInterval) clearInterval(ws.pingInterval);
-      ws.close();
+      closedByUnmount = true;
+      clearTimeout(reconnectTimer);
+      if (ws) {
+        if (ws.pingInterval) clearInterval(ws.pingInterval);
+        ws.close();
+      }
     };
-  }, [id, isSpinning]); // Добавил isSpinning в зависимости
+  }, [id]);
+
+  // Локальный обратный отсчёт до дедлайна
+  useEffect(() => {
+    if (!countdownDeadline) return undefined;
+    const tick = () => {
+      const serverNow = Date.now() + clockOffsetRef.current;
+      setCountdown(Math.max(0, Math.ceil((countdownDeadline - serverNow) / 1000)));
+    };
+    tick();
+    const timer = setInterval(tick, 1000);
+    return () => clearInterval(timer);
+  }, [countdownDeadline]);
 
   const formatCountdown = (seconds) => {
     const minutes = Math.floor(seconds / 60);
@@ -323,8 +494,11 @@ function LiveRafflePage() {
             <ArrowLeftIcon className="w-5 h-5" />
           </button>
           <h1 className="text-2xl font-semibold text-white truncate">{raffle?.title}</h1>
+          {viewers > 0 && (
+            <span className="ml-auto text-sm text-white/80 whitespace-nowrap">👀 {viewers}</span>
+          )}
           <div
-            className="ml-auto text-sm font-medium px-3 py-1 rounded-full"
+            className={`${viewers > 0 ? '' : 'ml-auto '}text-sm font-medium px-3 py-1 rounded-full`}
             style={{
               backgroundColor:
                 connectionStatus === 'connected'
@@ -360,6 +534,7 @@ function LiveRafflePage() {
           {slotParticipants.length > 0 ? (
             <SlotMachineComponent
               participants={slotParticipants}
+              totalCount={currentRound?.remainingCount}
               isSpinning={isSpinning}
               onComplete={(winner) => {
                 console.log('Слот-машина остановилась, победитель:', winner);
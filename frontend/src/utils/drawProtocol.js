@@ -0,0 +1,58 @@
+/**
+ * Delta draw protocol helpers (backend: app/services/draw_protocol.py)
+ */
+
+/**
+ * Short roster hash: sha256 of comma-joined ids, first 16 hex chars.
+ * Returns null where WebCrypto is unavailable (non-secure context).
+ */
+export const rosterHash = async (ids) => {
+  if (!window.crypto?.subtle) return null;
+  const data = new TextEncoder().encode(ids.join(','));
+  const digest = await window.crypto.subtle.digest('SHA-256', data);
+  return Array.from(new Uint8Array(digest))
+    .map((b) => b.toString(16).padStart(2, '0'))
+    .join('')
+    .slice(0, 16);
+};
+
+/**
+ * Check that the local roster matches the server state of the round
+ */
+export const rosterMatches = async (roster, remainingCount, expectedHash) => {
+  if (!Array.isArray(roster) || roster.length !== remainingCount) return false;
+  if (!expectedHash) return true;
+  const hash = await rosterHash(roster.map((p) => p.id));
+  return hash === null || hash === expectedHash;
+};
+
+/**
+ * Remove the confirmed winner: by index when it points at the same id, otherwise by id
+ */
+export const removeWinner = (roster, winnerId, winnerIndex) => {
+  if (!Array.isArray(roster)) return roster;
+  if (winnerIndex !== undefined && String(roster[winnerIndex]?.id) === String(winnerId)) {
+    return [...roster.slice(0, winnerIndex), ...roster.slice(winnerIndex + 1)];
+  }
+  return roster.filter((p) => String(p.id) !== String(winnerId));
+};
+
+/**
+ * Expand columnar participant lists (?encoding=columnar) back into objects
+ */
+export const decodeColumnar = (message) => {
+  ['participants', 'roster'].forEach((field) => {
+    const value = message[field];
+    if (value && value.columns) {
+      const columns = Object.keys(value.columns);
+      const count = value.columns.id ? value.columns.id.length : 0;
+      message[field] = Array.from({ length: count }, (_, i) =>
+        Object.fromEntries(columns.map((column) => [column, value.columns[column][i]]))
+      );
+      if (field === 'participants' && !message.participant_ids) {
+        message.participant_ids = value.columns.id;
+      }
+    }
+  });
+  return message;
+};